@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,6 +22,10 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Code shared by the services (the "shared" package) lives next to them.
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.append(str(BASE_DIR.parent))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -52,7 +58,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "routing.tracing.TracingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "routing.compression.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -137,7 +145,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # REST Framework Configuration
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "routing.authentication.EdgeJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -158,14 +166,242 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Verified access tokens kept in memory so repeat requests skip the signature check
+GATEWAY_JWT_CACHE_SIZE = int(os.getenv("GATEWAY_JWT_CACHE_SIZE", "10000"))
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:8000").split(",")
 CORS_ALLOW_CREDENTIALS = True
 
-# Service URLs for routing
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8001")
-PRODUCT_SERVICE_URL = os.getenv("PRODUCT_SERVICE_URL", "http://localhost:8002")
-ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://localhost:8003")
+# Service instances for routing. Each variable takes one base URL or a
+# comma-separated list of instances to balance requests across.
+UPSTREAM_INSTANCES = {
+    "user": os.getenv("USER_SERVICE_URL", "http://localhost:8001").split(","),
+    "product": os.getenv("PRODUCT_SERVICE_URL", "http://localhost:8002").split(","),
+    "order": os.getenv("ORDER_SERVICE_URL", "http://localhost:8003").split(","),
+}
+
+# How an instance is picked ("p2c" or "least_outstanding"), and passive
+# health checking: an instance is ejected after EJECT_AFTER consecutive
+# failures, for EJECT_SECONDS doubling on each repeat up to MAX_EJECT_SECONDS
+GATEWAY_LOAD_BALANCER = {
+    "strategy": os.getenv("LOAD_BALANCER_STRATEGY", "p2c"),
+    "eject_after": int(os.getenv("LOAD_BALANCER_EJECT_AFTER", "5")),
+    "eject_seconds": float(os.getenv("LOAD_BALANCER_EJECT_SECONDS", "30")),
+    "max_eject_seconds": float(os.getenv("LOAD_BALANCER_MAX_EJECT_SECONDS", "300")),
+}
+
+# Upstream connection pools (one keep-alive pool per service, per process)
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "20"))
+
+# Upper bound on concurrent upstream connections per service for the async proxy
+UPSTREAM_ASYNC_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_ASYNC_MAX_CONNECTIONS", "1000"))
+
+# Serve proxied routes with the non-blocking AsyncProxyView (run under ASGI)
+GATEWAY_ASYNC_PROXY = os.getenv("GATEWAY_ASYNC_PROXY", "False") == "True"
+
+# (connect, read) timeouts in seconds for each upstream service
+UPSTREAM_DEFAULT_TIMEOUT = (
+    float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3")),
+    float(os.getenv("UPSTREAM_READ_TIMEOUT", "30")),
+)
+UPSTREAM_TIMEOUTS = {
+    "user": (
+        float(os.getenv("USER_SERVICE_CONNECT_TIMEOUT", UPSTREAM_DEFAULT_TIMEOUT[0])),
+        float(os.getenv("USER_SERVICE_READ_TIMEOUT", UPSTREAM_DEFAULT_TIMEOUT[1])),
+    ),
+    "product": (
+        float(os.getenv("PRODUCT_SERVICE_CONNECT_TIMEOUT", UPSTREAM_DEFAULT_TIMEOUT[0])),
+        float(os.getenv("PRODUCT_SERVICE_READ_TIMEOUT", UPSTREAM_DEFAULT_TIMEOUT[1])),
+    ),
+    "order": (
+        float(os.getenv("ORDER_SERVICE_CONNECT_TIMEOUT", UPSTREAM_DEFAULT_TIMEOUT[0])),
+        float(os.getenv("ORDER_SERVICE_READ_TIMEOUT", UPSTREAM_DEFAULT_TIMEOUT[1])),
+    ),
+}
+
+# Proxied routes, compiled into a prefix trie at startup by routing.routes.
+# A request to /<prefix>/<rest> (or an alias) is forwarded to /api/<rest> on
+# `upstream`, a key of UPSTREAM_INSTANCES. Optional per-route policies:
+# "timeout" (connect, read) overriding UPSTREAM_TIMEOUTS, "auth_required",
+# "cacheable", "invalidates" (collections whose cached entries any write
+# through the route drops, for resources also served under another path),
+# "bulk_writes" (paths whose writes may change any of the route's resources,
+# so they drop every cached entry of the route) and "rate_limit" (rate,
+# burst) overriding GATEWAY_RATE_LIMITS.
+# GATEWAY_ROUTES_FILE names a JSON list of the same shape that replaces these;
+# a route there may list "instances" for an upstream not configured above.
+GATEWAY_ROUTES = [
+    {"name": "user", "prefix": "user", "upstream": "user"},
+    {
+        "name": "product",
+        "prefix": "product",
+        "aliases": ["products"],
+        "upstream": "product",
+        "cacheable": True,
+        # Products are also cached by primary key, under product/id/<pk>.
+        "invalidates": ["id"],
+        # An import upserts any number of products.
+        "bulk_writes": ["import"],
+    },
+    {"name": "order", "prefix": "order", "upstream": "order", "auth_required": True},
+]
+if os.getenv("GATEWAY_ROUTES_FILE"):
+    with open(os.getenv("GATEWAY_ROUTES_FILE")) as routes_file:
+        GATEWAY_ROUTES = json.load(routes_file)
+    for route in GATEWAY_ROUTES:
+        if route.get("instances"):
+            UPSTREAM_INSTANCES.setdefault(route["upstream"], route["instances"])
+
+# Threads shared by endpoints that call several upstreams concurrently
+GATEWAY_FANOUT_WORKERS = int(os.getenv("GATEWAY_FANOUT_WORKERS", "32"))
+
+# Per-upstream deadlines (seconds) for the enriched cart endpoint
+GATEWAY_AGGREGATE_TIMEOUTS = {
+    "order": float(os.getenv("AGGREGATE_ORDER_TIMEOUT", "5")),
+    "product": float(os.getenv("AGGREGATE_PRODUCT_TIMEOUT", "2")),
+}
+
+# Limits for the /batch endpoint: sub-requests per batch, and how many of
+# them run at the same time
+GATEWAY_BATCH = {
+    "MAX_SIZE": int(os.getenv("GATEWAY_BATCH_MAX_SIZE", "20")),
+    "MAX_CONCURRENCY": int(os.getenv("GATEWAY_BATCH_MAX_CONCURRENCY", "8")),
+}
+
+# Per-identity token buckets (JWT subject, else client IP) for each proxied
+# service, as "rate:burst" in requests per second. The default backend keeps
+# buckets in process memory; "routing.ratelimit.CacheTokenBuckets" shares
+# them between workers through a Django cache alias.
+GATEWAY_RATE_LIMITS = {
+    "ENABLED": os.getenv("RATE_LIMIT_ENABLED", "True") == "True",
+    "BACKEND": os.getenv("RATE_LIMIT_BACKEND", "routing.ratelimit.LocalTokenBuckets"),
+    "DEFAULT": tuple(float(x) for x in os.getenv("RATE_LIMIT_DEFAULT", "20:40").split(":")),
+    "ROUTES": {
+        "user": tuple(float(x) for x in os.getenv("RATE_LIMIT_USER", "10:20").split(":")),
+        "product": tuple(float(x) for x in os.getenv("RATE_LIMIT_PRODUCT", "50:100").split(":")),
+        "order": tuple(float(x) for x in os.getenv("RATE_LIMIT_ORDER", "20:40").split(":")),
+    },
+}
+
+# Use the first X-Forwarded-For hop as the client IP (only behind a trusted proxy)
+GATEWAY_TRUST_X_FORWARDED_FOR = os.getenv("GATEWAY_TRUST_X_FORWARDED_FOR", "False") == "True"
+
+# Gateway-wide cap on concurrent upstream calls; excess calls queue briefly,
+# then are shed with 503
+GATEWAY_ADMISSION = {
+    "MAX_CONCURRENCY": int(os.getenv("ADMISSION_MAX_CONCURRENCY", "256")),
+    "MAX_QUEUE": int(os.getenv("ADMISSION_MAX_QUEUE", "512")),
+    "QUEUE_TIMEOUT": float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2")),
+}
+
+# Per-upstream circuit breaker: opens when the share of failed (5xx, connect
+# error, timeout) or slow calls in the rolling window crosses its threshold,
+# fails fast with 503 + Retry-After, then half-opens with a few probe requests.
+GATEWAY_CIRCUIT_BREAKER = {
+    "window": float(os.getenv("CIRCUIT_BREAKER_WINDOW", "30")),
+    "min_requests": int(os.getenv("CIRCUIT_BREAKER_MIN_REQUESTS", "20")),
+    "error_threshold": float(os.getenv("CIRCUIT_BREAKER_ERROR_THRESHOLD", "0.5")),
+    "slow_call_seconds": float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", "5")),
+    "slow_call_threshold": float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_THRESHOLD", "0.8")),
+    "open_seconds": float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", "15")),
+    "half_open_probes": int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "3")),
+}
+
+# Idempotent calls (GET, HEAD, OPTIONS) to SERVICES get a hedged duplicate on
+# another instance once they have run past the service's recent PERCENTILE
+# latency; the first response wins. WORKERS bounds the threads the sync proxy
+# uses to race the two attempts.
+GATEWAY_HEDGING = {
+    "ENABLED": os.getenv("HEDGING_ENABLED", "True") == "True",
+    "SERVICES": os.getenv("HEDGING_SERVICES", "user,product").split(","),
+    "PERCENTILE": float(os.getenv("HEDGING_PERCENTILE", "0.95")),
+    "MIN_SAMPLES": int(os.getenv("HEDGING_MIN_SAMPLES", "100")),
+    "MIN_DELAY": float(os.getenv("HEDGING_MIN_DELAY", "0.01")),
+    "WORKERS": int(os.getenv("HEDGING_WORKERS", "64")),
+}
+
+# Idempotent calls that fail to connect are retried on another instance up to
+# MAX_RETRIES times. Retries and hedges together are capped per upstream at
+# RATIO of the requests sent in the last 10 seconds, plus MIN_PER_SECOND.
+GATEWAY_RETRY_BUDGET = {
+    "RATIO": float(os.getenv("RETRY_BUDGET_RATIO", "0.1")),
+    "MIN_PER_SECOND": float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1")),
+    "MAX_RETRIES": int(os.getenv("RETRY_MAX_RETRIES", "2")),
+}
+
+# Concurrent calls allowed per upstream before the gateway sheds with 503
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "100"))
+
+# Gateway response cache for anonymous catalog GETs. The default backend is
+# local to each process; "routing.cache.DjangoCacheBackend" shares entries
+# between workers through the Django cache alias named in OPTIONS.
+GATEWAY_CACHE = {
+    "BACKEND": os.getenv("GATEWAY_CACHE_BACKEND", "routing.cache.LocMemLRUBackend"),
+    "OPTIONS": {
+        "max_entries": int(os.getenv("GATEWAY_CACHE_MAX_ENTRIES", "1000")),
+        "max_bytes": int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    },
+    "TTL": int(os.getenv("GATEWAY_CACHE_TTL", "30")),
+    "MAX_ENTRY_BYTES": int(os.getenv("GATEWAY_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024))),
+}
+if GATEWAY_CACHE["BACKEND"] == "routing.cache.DjangoCacheBackend":
+    GATEWAY_CACHE["OPTIONS"] = {"alias": os.getenv("GATEWAY_CACHE_ALIAS", "default")}
+
+# Concurrent identical anonymous GETs (same path and query, no
+# If-None-Match / If-Modified-Since style preconditions) share one
+# upstream call; waiters give up and call upstream themselves after
+# WAIT_TIMEOUT. Only bodies up to GATEWAY_CACHE["MAX_ENTRY_BYTES"] are held in
+# memory to share; larger ones are streamed to the first caller alone.
+GATEWAY_SINGLE_FLIGHT = {
+    "ENABLED": os.getenv("GATEWAY_SINGLE_FLIGHT", "True") == "True",
+    "WAIT_TIMEOUT": float(os.getenv("GATEWAY_SINGLE_FLIGHT_WAIT_TIMEOUT", "5")),
+}
+
+# gzip/brotli for gateway responses of at least MIN_SIZE bytes. Brotli is
+# offered only when the optional "brotli" package is installed. LEVELS are
+# used when compressing per request; cache entries are compressed once at
+# the slower CACHED_LEVELS and the variants served directly on hits.
+GATEWAY_COMPRESSION = {
+    "ENABLED": os.getenv("GATEWAY_COMPRESSION", "True") == "True",
+    "MIN_SIZE": int(os.getenv("GATEWAY_COMPRESSION_MIN_SIZE", "1024")),
+    "LEVELS": {
+        "gzip": int(os.getenv("GATEWAY_GZIP_LEVEL", "6")),
+        "br": int(os.getenv("GATEWAY_BROTLI_QUALITY", "4")),
+    },
+    "CACHED_LEVELS": {
+        "gzip": int(os.getenv("GATEWAY_CACHED_GZIP_LEVEL", "9")),
+        "br": int(os.getenv("GATEWAY_CACHED_BROTLI_QUALITY", "9")),
+    },
+}
+
+# Request tracing. A W3C traceparent from the caller is continued with its
+# sampling decision; other requests start a new trace sampled at SAMPLE_RATE.
+# The traceparent is passed on to every upstream call. Spans go to an
+# in-memory ring buffer (read it at /traces/) or, with
+# "shared.utils.tracing.JsonlSink", to a rotating JSON lines file.
+TRACING = {
+    "SERVICE_NAME": "api-gateway",
+    "SAMPLE_RATE": float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+    "SINK": os.getenv("TRACE_SINK", "shared.utils.tracing.RingBufferSink"),
+    "OPTIONS": {"size": int(os.getenv("TRACE_RING_SIZE", "10000"))},
+}
+if TRACING["SINK"] == "shared.utils.tracing.JsonlSink":
+    TRACING["OPTIONS"] = {
+        "path": os.getenv("TRACE_JSONL_PATH", str(BASE_DIR / "traces.jsonl")),
+        "max_bytes": int(os.getenv("TRACE_JSONL_MAX_BYTES", str(50 * 1024 * 1024))),
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+if os.getenv("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
 
 # DRF Spectacular Settings
 SPECTACULAR_SETTINGS = {
@@ -0,0 +1,74 @@
+"""
+Show how the gateway spreads traffic over instances of different speeds.
+
+Starts one stub upstream per --delays entry, points PRODUCT_SERVICE_URL at
+all of them, and sends requests through the upstream pool from a fixed
+number of worker threads, once per balancing strategy. Faster instances
+finish their calls sooner, so they should end up with most of the traffic.
+
+    python benchmarks/balancer_benchmark.py --requests 2000 --delays 0.01,0.05,0.2 --workers 16
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from proxy_benchmark import start_stub_upstream  # noqa: E402
+
+
+def run(strategy, instances, total, workers):
+    from django.conf import settings
+
+    from routing.balancer import upstream_balancers
+    from routing.upstream import upstream_pool
+
+    settings.GATEWAY_LOAD_BALANCER["strategy"] = strategy
+    upstream_balancers._balancers.clear()
+
+    def call(_):
+        started = time.perf_counter()
+        upstream_pool.request("product", "GET", "/api/product/").close()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = sorted(pool.map(call, range(total)))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{strategy}: {total / elapsed:.1f} req/s  p50 {statistics.median(latencies) * 1000:.1f} ms  "
+        f"p99 {latencies[int(total * 0.99) - 1] * 1000:.1f} ms"
+    )
+    stats = upstream_balancers.get("product").stats()
+    for url, delay in instances:
+        share = stats[url]["requests"] / total
+        print(f"  {delay * 1000:6.0f} ms instance: {stats[url]['requests']:6d} requests ({share:6.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--delays", default="0.01,0.05,0.2", help="comma-separated stub delays in seconds")
+    parser.add_argument("--workers", type=int, default=16, help="concurrent client threads")
+    args = parser.parse_args()
+
+    instances = [(start_stub_upstream(float(delay)), float(delay)) for delay in args.delays.split(",")]
+    os.environ["PRODUCT_SERVICE_URL"] = ",".join(url for url, _ in instances)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_gateway.settings")
+
+    import django
+
+    django.setup()
+    print(f"{args.requests} requests, {args.workers} workers, {len(instances)} instances")
+    for strategy in ("p2c", "least_outstanding"):
+        run(strategy, instances, args.requests, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Bytes on the wire and CPU per response for a product listing, uncompressed,
+compressed per request, and served from a cache entry's stored variants.
+
+    python benchmarks/compression_benchmark.py --products 500 --iterations 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def product_listing(count):
+    return json.dumps([
+        {
+            "id": i,
+            "name": f"Product {i}",
+            "slug": f"product-{i}",
+            "description": f"Description of product {i}, with enough text to look like a real catalog entry.",
+            "price": f"{(i % 200) + 0.99:.2f}",
+            "stock": i % 50,
+            "category": {"id": i % 12, "name": f"Category {i % 12}", "slug": f"category-{i % 12}"},
+            "is_active": True,
+            "created_at": "2025-01-01T00:00:00Z",
+            "updated_at": "2025-01-01T00:00:00Z",
+        }
+        for i in range(count)
+    ]).encode()
+
+
+def measure(label, make_response, iterations):
+    started = time.process_time()
+    for _ in range(iterations):
+        response = make_response()
+    cpu = (time.process_time() - started) / iterations
+    encoding = response.get("Content-Encoding", "identity")
+    print(f"{label:>26}: {len(response.content):9d} bytes ({encoding:>8})  {cpu * 1e6:9.1f} us CPU/response")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_gateway.settings")
+    import django
+
+    django.setup()
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from routing.cache import BufferedResponse
+    from routing.compression import compress_response, compress_variants, supported_encodings
+
+    body = product_listing(args.products)
+    headers = {"Content-Type": "application/json"}
+    factory = RequestFactory()
+    print(f"{args.products} products, {len(body)} bytes uncompressed, iterations {args.iterations}")
+
+    def plain():
+        return HttpResponse(body, content_type="application/json")
+
+    measure("uncompressed", plain, args.iterations)
+    for encoding in supported_encodings():
+        request = factory.get("/products/product/", HTTP_ACCEPT_ENCODING=encoding)
+        measure(f"per request, {encoding}", lambda: compress_response(request, plain()), args.iterations)
+
+    entry = BufferedResponse(200, headers, body, compress_variants(body))
+    for encoding in supported_encodings():
+        measure(
+            f"cache hit, {encoding}",
+            lambda: entry.as_response(cache_status="HIT", accept_encoding=encoding),
+            args.iterations,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Compare the blocking ProxyView with AsyncProxyView against a slow stub upstream.
+
+The sync path is driven by a fixed pool of worker threads (what a threaded
+WSGI server gives you); the async path runs every request on one event loop
+(what an ASGI server gives you). Latency is measured from submission, so time
+spent queued for a free worker counts.
+
+    python benchmarks/proxy_benchmark.py --requests 2000 --delay 0.2 --workers 32
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BODY = b'[{"id": 1, "name": "Widget", "price": "9.99"}]'
+
+
+async def _handle_stub(reader, writer, delay):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            await asyncio.sleep(delay)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(BODY)}\r\n\r\n".encode()
+                + BODY
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+def start_stub_upstream(delay):
+    """Run a keep-alive HTTP stub that answers every request after `delay` seconds."""
+    ready = threading.Event()
+    address = {}
+
+    async def serve():
+        server = await asyncio.start_server(
+            lambda r, w: _handle_stub(r, w, delay), "127.0.0.1", 0, backlog=4096
+        )
+        address["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    ready.wait()
+    return f"http://127.0.0.1:{address['port']}"
+
+
+def summarize(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{label:>5}: {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms"
+    )
+
+
+def product_route():
+    from routing.routes import load_routes
+
+    return load_routes().match("products/product/")[0]
+
+
+def run_sync(factory, total, workers):
+    from routing.views import ProxyView
+
+    view = ProxyView.as_view()
+    route = product_route()
+
+    def call(submitted):
+        response = view(factory.get("/products/product/"), path="product/", route=route)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        response.close()
+        return time.perf_counter() - submitted
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(call, time.perf_counter()) for _ in range(total)]
+        latencies = [future.result() for future in futures]
+    summarize("sync", latencies, time.perf_counter() - started)
+
+
+def run_async(factory, total):
+    from routing.views import AsyncProxyView
+
+    view = AsyncProxyView.as_view()
+    route = product_route()
+
+    async def call():
+        submitted = time.perf_counter()
+        response = await view(factory.get("/products/product/"), path="product/", route=route)
+        if response.streaming:
+            async for _ in response.streaming_content:
+                pass
+        return time.perf_counter() - submitted
+
+    async def main():
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(call() for _ in range(total)))
+        summarize("async", latencies, time.perf_counter() - started)
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--delay", type=float, default=0.2, help="upstream response delay in seconds")
+    parser.add_argument("--workers", type=int, default=32, help="worker threads for the sync path")
+    args = parser.parse_args()
+
+    os.environ["PRODUCT_SERVICE_URL"] = start_stub_upstream(args.delay)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_gateway.settings")
+
+    import django
+
+    django.setup()
+    from django.test import RequestFactory
+
+    factory = RequestFactory()
+    print(f"{args.requests} requests, upstream delay {args.delay * 1000:.0f} ms, {args.workers} sync workers")
+    run_sync(factory, args.requests, args.workers)
+    run_async(factory, args.requests)
+
+
+if __name__ == "__main__":
+    main()
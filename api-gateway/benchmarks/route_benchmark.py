@@ -0,0 +1,95 @@
+"""
+Per-request cost of matching a proxied path to its route and validating it,
+with the route table compared against one regex per route tried in order
+(how the gateway matched before the table). --routes adds synthetic routes
+so the cost can be seen as the configuration grows.
+
+    python benchmarks/route_benchmark.py --routes 3,30,300 --iterations 200000
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def legacy_is_safe_path(path):
+    if not path:
+        return True
+    if '..' in path or path.startswith('/'):
+        return False
+    if any(prefix in path.lower() for prefix in ['http://', 'https://', 'ftp://']):
+        return False
+    if not re.match(r'^[a-zA-Z0-9/_.-]+$', path):
+        return False
+    return True
+
+
+def measure(label, match, paths, iterations):
+    rounds = max(1, iterations // len(paths))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            match(path)
+    elapsed = (time.perf_counter() - started) / (rounds * len(paths))
+    print(f"{label:>22}: {elapsed * 1e9:8.0f} ns/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", default="3,30,300", help="comma-separated route counts to try")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_gateway.settings")
+    import django
+
+    django.setup()
+    from django.conf import settings
+
+    from routing.routes import Route, RouteTable
+    from routing.views import ProxyMixin
+
+    is_safe_path = ProxyMixin()._is_safe_path
+    builtin = [Route.from_config(config) for config in settings.GATEWAY_ROUTES]
+    paths = [
+        "user/login/",
+        "products/product/",
+        "products/product/id/42/",
+        "order/items/7",
+        "order/checkout",
+    ]
+
+    for count in (int(n) for n in args.routes.split(",")):
+        routes = builtin + [
+            Route(f"service{i}", [f"service{i}"], "product") for i in range(max(0, count - len(builtin)))
+        ]
+        # The synthetic routes go first, as the worst case for a linear scan.
+        patterns = [
+            (re.compile(rf"^(?:{'|'.join(re.escape(p) for p in route.prefixes)})/(?P<path>.*)$"), route)
+            for route in reversed(routes)
+        ]
+        table = RouteTable(routes)
+
+        def legacy(path):
+            for pattern, route in patterns:
+                match = pattern.match(path)
+                if match:
+                    return route, legacy_is_safe_path(match["path"])
+            return None
+
+        def compiled(path):
+            route, rest = table.match(path)
+            return route, is_safe_path(rest)
+
+        print(f"{len(routes)} routes")
+        measure("regex per route", legacy, paths, args.iterations)
+        measure("route table", compiled, paths, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
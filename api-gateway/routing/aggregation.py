@@ -0,0 +1,101 @@
+import logging
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import requests
+from django.conf import settings
+
+from .breaker import UpstreamUnavailable
+from .fanout import fanout_submit
+from .upstream import upstream_pool
+
+logger = logging.getLogger(__name__)
+
+ERROR_STATUS = {
+    "unavailable": 503,
+    "timeout": 504,
+    "bad_response": 502,
+}
+
+
+def fetch_json(service, path, headers, timeout):
+    """
+    GET a JSON document from an upstream within `timeout` seconds.
+    Returns (status_code, data, error) where error is None on success.
+    """
+    connect_timeout, _ = upstream_pool.timeout(service)
+    try:
+        response = upstream_pool.request(service, 'GET', path, headers=headers, timeout=(connect_timeout, timeout))
+    except UpstreamUnavailable:
+        return None, None, "unavailable"
+    except requests.exceptions.ConnectionError:
+        return None, None, "unavailable"
+    except requests.exceptions.Timeout:
+        return None, None, "timeout"
+
+    try:
+        data = response.json() if response.content else {}
+    except ValueError:
+        logger.error(f"Invalid JSON from {service} {path}")
+        return response.status_code, None, "bad_response"
+    return response.status_code, data, None
+
+
+def fetch_products(product_ids):
+    """
+    Fetch products by id concurrently. Every request shares one deadline, so
+    the whole fan-out takes about as long as the slowest product. Returns a
+    dict of product id to (data, error).
+    """
+    timeout = settings.GATEWAY_AGGREGATE_TIMEOUTS["product"]
+    futures = {
+        product_id: fanout_submit(
+            fetch_json, "product", f"/api/product/id/{product_id}", {}, timeout
+        )
+        for product_id in product_ids
+    }
+
+    deadline = time.monotonic() + timeout
+    products = {}
+    for product_id, future in futures.items():
+        try:
+            status_code, data, error = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeout:
+            products[product_id] = (None, "timeout")
+            continue
+        if error is None and status_code == 404:
+            error = "not_found"
+        elif error is None and status_code != 200:
+            error = "upstream_error"
+        products[product_id] = (data if error is None else None, error)
+    return products
+
+
+def enriched_cart(authorization):
+    """
+    Fetch the caller's cart and attach catalog details to each line item.
+    Items whose product could not be fetched get product = None and a
+    product_error code, and the cart is marked partial.
+    Returns (status_code, data).
+    """
+    status_code, cart, error = fetch_json(
+        "order",
+        "/api/order/",
+        {"Authorization": authorization},
+        settings.GATEWAY_AGGREGATE_TIMEOUTS["order"],
+    )
+    if error is not None:
+        return ERROR_STATUS[error], {"error": f"Order service {error.replace('_', ' ')}"}
+    if status_code != 200 or "items" not in cart:
+        return status_code, cart
+
+    products = fetch_products({item["product_id"] for item in cart["items"]})
+    partial = False
+    for item in cart["items"]:
+        product, error = products[item["product_id"]]
+        item["product"] = product
+        if error is not None:
+            item["product_error"] = error
+            partial = True
+    cart["partial"] = partial
+    return 200, cart
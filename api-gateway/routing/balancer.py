@@ -0,0 +1,137 @@
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Instance:
+    """One backend instance of a service and the counters used to pick it."""
+    __slots__ = (
+        "url", "outstanding", "latency", "requests", "failures",
+        "consecutive_failures", "ejected_until", "times_ejected",
+    )
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.latency = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.times_ejected = 0
+
+    def as_dict(self, now):
+        return {
+            "outstanding": self.outstanding,
+            "latency_ewma_ms": round(self.latency * 1000, 1),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.ejected_until > now,
+            "times_ejected": self.times_ejected,
+        }
+
+
+class LoadBalancer:
+    """
+    Picks an instance of one service per request. "least_outstanding" takes
+    the instance with the fewest in-flight calls; "p2c" compares two random
+    instances and takes the less loaded one. Ties go to the lower latency
+    average, so under light load traffic still leans toward fast instances.
+
+    Instances are health-checked passively: after `eject_after` consecutive
+    failures (5xx, connect error or timeout) an instance is left out for
+    `eject_seconds`, doubling on each repeat ejection up to
+    `max_eject_seconds`. If every instance is ejected, all of them are used
+    rather than failing the request at the gateway.
+    """
+    LATENCY_DECAY = 0.2
+
+    def __init__(self, service, urls, strategy="p2c", eject_after=5, eject_seconds=30, max_eject_seconds=300):
+        self.service = service
+        self.instances = [Instance(url.strip()) for url in urls if url.strip()]
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(instance):
+        return instance.outstanding, instance.latency
+
+    def _choose(self, now, exclude):
+        candidates = [instance for instance in self.instances if instance.ejected_until <= now]
+        if not candidates:
+            candidates = self.instances
+        if exclude:
+            candidates = [instance for instance in candidates if instance.url not in exclude] or candidates
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == "least_outstanding":
+            return min(random.sample(candidates, len(candidates)), key=self._load)
+        return min(random.sample(candidates, 2), key=self._load)
+
+    def acquire(self, exclude=()):
+        """Pick an instance, avoiding the URLs in `exclude` when any other is available."""
+        with self._lock:
+            instance = self._choose(time.monotonic(), exclude)
+            instance.outstanding += 1
+            instance.requests += 1
+            return instance
+
+    def release(self, instance, failed, latency):
+        with self._lock:
+            instance.outstanding -= 1
+            if not instance.latency:
+                instance.latency = latency
+            else:
+                instance.latency += self.LATENCY_DECAY * (latency - instance.latency)
+            if not failed:
+                instance.consecutive_failures = 0
+                instance.times_ejected = 0
+                return
+            instance.failures += 1
+            instance.consecutive_failures += 1
+            now = time.monotonic()
+            if instance.consecutive_failures >= self.eject_after and instance.ejected_until <= now:
+                instance.times_ejected += 1
+                duration = min(self.max_eject_seconds, self.eject_seconds * 2 ** (instance.times_ejected - 1))
+                instance.ejected_until = now + duration
+                # A re-admitted instance is ejected again on its first failure.
+                instance.consecutive_failures = self.eject_after - 1
+                logger.warning(f"Ejected {self.service} instance {instance.url} for {duration:.0f}s")
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {instance.url: instance.as_dict(now) for instance in self.instances}
+
+
+class UpstreamBalancers:
+    """Per-process registry of load balancers, one per upstream service."""
+
+    def __init__(self):
+        self._balancers = {}
+        self._lock = threading.Lock()
+
+    def get(self, service):
+        balancer = self._balancers.get(service)
+        if balancer is None:
+            with self._lock:
+                balancer = self._balancers.get(service)
+                if balancer is None:
+                    balancer = self._balancers[service] = LoadBalancer(
+                        service, settings.UPSTREAM_INSTANCES[service], **settings.GATEWAY_LOAD_BALANCER
+                    )
+        return balancer
+
+    def stats(self):
+        return {service: balancer.stats() for service, balancer in list(self._balancers.items())}
+
+
+upstream_balancers = UpstreamBalancers()
@@ -0,0 +1,129 @@
+import io
+import json
+import threading
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, resolve
+
+from .fanout import fanout_run, fanout_submit
+
+# Metadata copied from the batch request onto every sub-request.
+INHERITED_META = (
+    'HTTP_AUTHORIZATION',
+    'REMOTE_ADDR',
+    'HTTP_X_FORWARDED_FOR',
+    'SERVER_NAME',
+    'SERVER_PORT',
+    'wsgi.url_scheme',
+)
+
+
+class BatchItemError(ValueError):
+    pass
+
+
+def validate_items(items, methods, max_size):
+    if not isinstance(items, list) or not items:
+        raise BatchItemError("requests must be a non-empty list")
+    if len(items) > max_size:
+        raise BatchItemError(f"A batch may contain at most {max_size} requests")
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise BatchItemError(f"requests[{index}] must be an object with a path")
+        if str(item.get('method', 'GET')).upper() not in methods:
+            raise BatchItemError(f"requests[{index}] has an unsupported method")
+
+
+def _build_request(parent, item):
+    method = str(item.get('method', 'GET')).upper()
+    url = urlsplit(item['path'])
+    body = item.get('body')
+    if body is None:
+        payload = b''
+    elif isinstance(body, str):
+        payload = body.encode()
+    else:
+        payload = json.dumps(body).encode()
+
+    environ = {key: parent.META[key] for key in INHERITED_META if key in parent.META}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': '/' + url.path.lstrip('/'),
+        'QUERY_STRING': url.query,
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+    })
+    environ.setdefault('SERVER_NAME', 'gateway')
+    environ.setdefault('SERVER_PORT', '80')
+    environ.setdefault('wsgi.url_scheme', 'http')
+    if payload:
+        environ['CONTENT_TYPE'] = 'application/json' if not isinstance(body, str) else 'text/plain'
+    return WSGIRequest(environ)
+
+
+def _result(response, body):
+    content_type = response.get('Content-Type', '')
+    if body and 'json' in content_type:
+        try:
+            body = json.loads(body)
+        except ValueError:
+            body = body.decode(errors='replace')
+    else:
+        body = body.decode(errors='replace') if body else None
+    return {"status": response.status_code, "content_type": content_type or None, "body": body}
+
+
+def _call_sync(view, request, kwargs):
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    body = b''.join(response) if response.streaming else response.content
+    response.close()
+    return _result(response, body)
+
+
+async def _call_async(view, request, kwargs):
+    response = await view(request, **kwargs)
+    if response.streaming:
+        body = b''.join([chunk async for chunk in response.streaming_content])
+    else:
+        body = response.content
+    return _result(response, body)
+
+
+def execute(parent, item, proxy_class):
+    """Run one sub-request through the proxy view its path resolves to."""
+    request = _build_request(parent, item)
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        match = None
+    view_class = getattr(match.func, 'view_class', None) if match else None
+    if view_class is None or not issubclass(view_class, proxy_class):
+        return {"status": 404, "content_type": "application/json", "body": {"error": "Unknown route"}}
+
+    if view_class.view_is_async:
+        return fanout_run(_call_async(match.func, request, match.kwargs))
+    return _call_sync(match.func, request, match.kwargs)
+
+
+def run_batch(parent, items, proxy_class, max_concurrency):
+    """
+    Execute sub-requests concurrently, at most max_concurrency at a time, and
+    return their results in request order.
+    """
+    gate = threading.Semaphore(max_concurrency)
+
+    def run(item):
+        try:
+            return execute(parent, item, proxy_class)
+        finally:
+            gate.release()
+
+    futures = []
+    for item in items:
+        gate.acquire()
+        futures.append(fanout_submit(run, item))
+    return [future.result() for future in futures]
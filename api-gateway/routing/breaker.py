@@ -0,0 +1,216 @@
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream the gateway already knows it should not call."""
+
+    def __init__(self, service, retry_after):
+        super().__init__(f"{service} is unavailable")
+        self.service = service
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class BulkheadFullError(UpstreamUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for one upstream. The circuit opens when,
+    over the last `window` seconds and at least `min_requests` calls, the share
+    of failed or slow calls crosses its threshold. After `open_seconds` it lets
+    `half_open_probes` requests through; if they all succeed it closes again,
+    otherwise it reopens.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, window=30, min_requests=20, error_threshold=0.5,
+                 slow_call_seconds=5, slow_call_threshold=0.8, open_seconds=15, half_open_probes=3):
+        self.name = name
+        self.window = window
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._outcomes = deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        horizon = now - self.window
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            _, failed, slow = self._outcomes.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _trip(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self._outcomes.clear()
+        self._failures = self._slow = 0
+
+    def before_call(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.open_seconds - now
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = self.HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 1)
+                self._probes_in_flight += 1
+
+    def record(self, failed, latency):
+        with self._lock:
+            now = time.monotonic()
+            slow = latency >= self.slow_call_seconds
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight -= 1
+                if failed or slow:
+                    self._trip(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self.state = self.CLOSED
+                        self.opened_at = None
+                return
+            if self.state == self.OPEN:
+                return
+
+            self._outcomes.append((now, failed, slow))
+            self._failures += failed
+            self._slow += slow
+            self._prune(now)
+            total = len(self._outcomes)
+            if total >= self.min_requests and (
+                self._failures / total >= self.error_threshold
+                or self._slow / total >= self.slow_call_threshold
+            ):
+                self._trip(now)
+
+    def cancel(self):
+        """Forget a call let through by before_call that was never made."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight -= 1
+
+    def as_dict(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            total = len(self._outcomes)
+            state = {
+                "state": self.state,
+                "window_requests": total,
+                "error_rate": round(self._failures / total, 4) if total else 0.0,
+                "slow_rate": round(self._slow / total, 4) if total else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+            if self.state == self.OPEN:
+                state["retry_after"] = max(0, math.ceil(self.opened_at + self.open_seconds - time.monotonic()))
+            return state
+
+
+class Bulkhead:
+    """Caps concurrent calls to one upstream so it cannot take every gateway worker."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class UpstreamHealth:
+    """Per-process registry of circuit breakers and bulkheads, one of each per upstream."""
+
+    def __init__(self):
+        self._breakers = {}
+        self._bulkheads = {}
+        self._lock = threading.Lock()
+
+    def _get(self, service):
+        breaker = self._breakers.get(service)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(service)
+                if breaker is None:
+                    self._bulkheads[service] = Bulkhead(settings.UPSTREAM_MAX_CONCURRENCY)
+                    breaker = self._breakers[service] = CircuitBreaker(service, **settings.GATEWAY_CIRCUIT_BREAKER)
+        return breaker, self._bulkheads[service]
+
+    def admit(self, service):
+        """Reserve a slot for one upstream call, or raise UpstreamUnavailable."""
+        breaker, bulkhead = self._get(service)
+        if not bulkhead.try_acquire():
+            raise BulkheadFullError(service, 1)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            bulkhead.release()
+            raise
+
+    def release(self, service, failed=None, latency=None):
+        """Free the slot taken by admit(); without an outcome, the call was never made and is not recorded."""
+        breaker, bulkhead = self._get(service)
+        bulkhead.release()
+        if failed is None:
+            breaker.cancel()
+        else:
+            breaker.record(failed, latency)
+
+    def is_open(self):
+        return any(breaker.state == CircuitBreaker.OPEN for breaker in list(self._breakers.values()))
+
+    def stats(self):
+        return {
+            service: {
+                **breaker.as_dict(),
+                "in_flight": self._bulkheads[service].in_flight,
+                "concurrency_limit": self._bulkheads[service].limit,
+                "bulkhead_rejected": self._bulkheads[service].rejected,
+            }
+            for service, breaker in list(self._breakers.items())
+        }
+
+
+upstream_health = UpstreamHealth()
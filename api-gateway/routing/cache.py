@@ -0,0 +1,264 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+
+from .compression import compress_variants, is_compressible, mark_encoded, negotiate
+from .streaming import PASSTHROUGH_RESPONSE_HEADERS
+
+
+class BufferedResponse:
+    """
+    An upstream response read fully into memory, body as raw bytes. Used for
+    cache entries and for results shared between coalesced requests. Cache
+    entries also keep compressed variants of the body, keyed by encoding.
+    """
+    __slots__ = ("status", "headers", "body", "variants")
+
+    def __init__(self, status, headers, body, variants=None):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.variants = variants or {}
+
+    @classmethod
+    def from_upstream(cls, status, headers, body):
+        return cls(status, {name: headers[name] for name in PASSTHROUGH_RESPONSE_HEADERS if name in headers}, body)
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(variant) for variant in self.variants.values())
+
+    def __getstate__(self):
+        return (self.status, self.headers, self.body, self.variants)
+
+    def __setstate__(self, state):
+        self.status, self.headers, self.body, self.variants = state
+
+    def as_response(self, cache_status=None, accept_encoding=None):
+        encoding = negotiate(accept_encoding, self.variants) if self.variants else None
+        response = HttpResponse(self.variants[encoding] if encoding else self.body, status=self.status)
+        if "Content-Type" not in self.headers:
+            del response["Content-Type"]
+        for name, value in self.headers.items():
+            response[name] = value
+        if self.variants:
+            patch_vary_headers(response, ("Accept-Encoding",))
+        if encoding:
+            response["Content-Length"] = str(len(response.content))
+            mark_encoded(response, encoding)
+        if cache_status:
+            response["X-Cache"] = cache_status
+        return response
+
+
+class LocMemLRUBackend:
+    """
+    In-process store bounded by entry count and total body size. Expired
+    entries are dropped on read; the least recently used ones are evicted
+    when either bound is exceeded.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, size, value = item
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = value.size
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_generations(self, keys):
+        with self._lock:
+            return [self._generation(key) for key in keys]
+
+    def bump_generation(self, key):
+        with self._lock:
+            self._generations[key] = self._generation(key) + 1
+
+    def _generation(self, key):
+        # Unknown generations start from the clock, so a counter that was
+        # evicted never comes back with a value an old entry was stored under.
+        generation = self._generations.get(key)
+        if generation is None:
+            generation = self._generations[key] = time.time_ns()
+            while len(self._generations) > self.max_entries:
+                self._generations.popitem(last=False)
+        else:
+            self._generations.move_to_end(key)
+        return generation
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+
+class DjangoCacheBackend:
+    """Stores entries in a Django cache alias so several gateway workers share them."""
+
+    def __init__(self, alias="default", prefix="gateway"):
+        self.cache = caches[alias]
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.cache.get(f"{self.prefix}:{key}")
+
+    def set(self, key, value, ttl):
+        self.cache.set(f"{self.prefix}:{key}", value, ttl)
+
+    def get_generations(self, keys):
+        prefixed = [f"{self.prefix}:{key}" for key in keys]
+        found = self.cache.get_many(prefixed)
+        generations = []
+        for key in prefixed:
+            generation = found.get(key)
+            if generation is None:
+                self.cache.add(key, time.time_ns(), None)
+                generation = self.cache.get(key)
+            generations.append(generation)
+        return generations
+
+    def bump_generation(self, key):
+        key = f"{self.prefix}:{key}"
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, time.time_ns(), None)
+
+    def stats(self):
+        return {}
+
+
+class ResponseCache:
+    """
+    Caches public GET responses per service, keyed on path and normalized
+    query string. Entries are versioned by generation counters so a write to
+    a resource invalidates its own entries, the collection it belongs to and
+    anything below it without having to enumerate keys.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    config = settings.GATEWAY_CACHE
+                    self._backend = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        return self._backend
+
+    @staticmethod
+    def _resource(path):
+        return path.strip("/")
+
+    @staticmethod
+    def _parent(resource):
+        return resource.rsplit("/", 1)[0] if "/" in resource else ""
+
+    @staticmethod
+    def normalize_query(query_string):
+        params = [(key, value) for key, value in parse_qsl(query_string, keep_blank_values=True) if value != ""]
+        return urlencode(sorted(params))
+
+    def key_for(self, service, path, query_string):
+        """
+        Resolve the storage key before the upstream call, so a write that lands
+        while the response is in flight supersedes the entry it produces.
+        """
+        resource = self._resource(path)
+        generations = self.backend.get_generations([
+            f"gen:{service}:{resource}",
+            f"gen:{service}:{self._parent(resource)}/*",
+        ])
+        generation = ".".join(str(value) for value in generations)
+        return f"resp:{service}:{generation}:{resource}?{self.normalize_query(query_string)}"
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(self, key, entry):
+        config = settings.GATEWAY_CACHE
+        if len(entry.body) > config["MAX_ENTRY_BYTES"]:
+            return
+        if is_compressible(entry.headers):
+            # Compress once here so hits are served without compressing again.
+            entry.variants = compress_variants(entry.body)
+        self.backend.set(key, entry, config["TTL"])
+        self.stores += 1
+
+    def invalidate(self, service, path, collections=()):
+        """
+        Drop the entries for a written resource, its collection and anything
+        below it, and everything under `collections`, which serve the same
+        resources under other paths (product/id/<pk> for product/<slug>).
+        """
+        resource = self._resource(path)
+        scopes = [f"{collection}/*" for collection in collections]
+        for key in (resource, self._parent(resource), f"{resource}/*", *scopes):
+            self.backend.bump_generation(f"gen:{service}:{key}")
+        self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            **self.backend.stats(),
+        }
+
+
+def is_storable(status_code, headers):
+    if status_code != 200:
+        return False
+    cache_control = headers.get("Cache-Control", "").lower()
+    return "no-store" not in cache_control and "private" not in cache_control
+
+
+response_cache = ResponseCache()
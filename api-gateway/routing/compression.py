@@ -0,0 +1,179 @@
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+    "application/vnd.oai.openapi",
+    "text/",
+)
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding, available=None):
+    """
+    Pick the encoding to send for an Accept-Encoding header: brotli when the
+    client takes it and the brotli package is installed, else gzip, else None.
+    `available` narrows the choice, e.g. to the variants held by a cache entry.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in supported_encodings():
+        if available is not None and encoding not in available:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def is_compressible(headers):
+    if headers.get("Content-Encoding"):
+        return False
+    content_type = headers.get("Content-Type", "").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body, encoding, level):
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_variants(body):
+    """Every supported encoding of `body` at the higher cache levels, for storing alongside it."""
+    config = settings.GATEWAY_COMPRESSION
+    if not config["ENABLED"] or len(body) < config["MIN_SIZE"]:
+        return {}
+    return {
+        encoding: compress(body, encoding, config["CACHED_LEVELS"][encoding])
+        for encoding in supported_encodings()
+    }
+
+
+class StreamCompressor:
+    """Compresses a body chunk by chunk, flushing after each so the client is never held back."""
+
+    def __init__(self, encoding, level):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+            self._process = self._compressor.process
+            self._flush = self._compressor.flush
+            self._finish = self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._process = self._compressor.compress
+            self._flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+
+    def chunk(self, data):
+        return self._process(data) + self._flush()
+
+    def finish(self):
+        return self._finish()
+
+    def iter(self, chunks):
+        for data in chunks:
+            if data:
+                yield self.chunk(data)
+        yield self.finish()
+
+    async def aiter(self, chunks):
+        async for data in chunks:
+            if data:
+                yield self.chunk(data)
+        yield self.finish()
+
+
+def compress_response(request, response):
+    """
+    Compress a response for the client when it accepts gzip or brotli, the
+    body is a compressible type and at least MIN_SIZE bytes. Responses that
+    already carry a Content-Encoding, such as precompressed cache hits, are
+    left alone.
+    """
+    config = settings.GATEWAY_COMPRESSION
+    if not config["ENABLED"] or not is_compressible(response.headers):
+        return response
+    patch_vary_headers(response, ("Accept-Encoding",))
+
+    if response.streaming:
+        length = response.get("Content-Length")
+        if length is not None and int(length) < config["MIN_SIZE"]:
+            return response
+    elif len(response.content) < config["MIN_SIZE"]:
+        return response
+
+    encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    if encoding is None:
+        return response
+    level = config["LEVELS"][encoding]
+
+    if response.streaming:
+        compressor = StreamCompressor(encoding, level)
+        if response.is_async:
+            response.streaming_content = compressor.aiter(response.streaming_content)
+        else:
+            response.streaming_content = compressor.iter(response.streaming_content)
+        del response["Content-Length"]
+    else:
+        compressed = compress(response.content, encoding, level)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+
+    return mark_encoded(response, encoding)
+
+
+def mark_encoded(response, encoding):
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        # The compressed body is a different representation of the same resource.
+        response["ETag"] = "W/" + etag
+    response["Content-Encoding"] = encoding
+    return response
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli compression of gateway responses, for both WSGI and ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return compress_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return compress_response(request, await self.get_response(request))
@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_executor = None
+_loop = None
+_lock = threading.Lock()
+
+
+def fanout_executor():
+    """Shared thread pool for endpoints that call several upstreams at once."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.GATEWAY_FANOUT_WORKERS,
+                    thread_name_prefix="gateway-fanout",
+                )
+    return _executor
+
+
+def fanout_submit(fn, *args, **kwargs):
+    """Run fn on the fan-out pool in a copy of the caller's context, so its trace carries over."""
+    return fanout_executor().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def fanout_loop():
+    """
+    Event loop on a daemon thread, shared by sync code that runs async views.
+    Async upstream clients are bound to the loop that made them, so running
+    every such call here keeps one set of clients and their keep-alive
+    connections for the life of the process.
+    """
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gateway-fanout-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def fanout_run(coroutine):
+    """Run a coroutine on the shared loop in a copy of the caller's context, and wait for its result."""
+    context = contextvars.copy_context()
+
+    async def in_context():
+        return await asyncio.get_running_loop().create_task(coroutine, context=context)
+
+    return asyncio.run_coroutine_threadsafe(in_context(), fanout_loop()).result()
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+# Only these are ever retried or hedged; POST, PUT and DELETE go out once.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class LatencyWindow:
+    """
+    The last `size` successful call latencies for one upstream. The
+    percentile is recomputed every `refresh` samples rather than per call.
+    """
+
+    def __init__(self, size=1000, refresh=50):
+        self._samples = deque(maxlen=size)
+        self._refresh = refresh
+        self._since_refresh = 0
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+            self._since_refresh += 1
+            if self._since_refresh >= self._refresh:
+                self._sorted = sorted(self._samples)
+                self._since_refresh = 0
+
+    def percentile(self, fraction, min_samples):
+        samples = self._sorted
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class RetryBudget:
+    """
+    Caps retries and hedges for one upstream at `ratio` of the requests sent
+    in the last `window` seconds, plus `min_per_second` so a quiet service
+    can still retry. Counts are kept in one-second buckets.
+    """
+
+    def __init__(self, ratio, min_per_second, window=10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.exhausted = 0
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def _bucket(self, now):
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        while self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+        return self._buckets[-1]
+
+    def deposit(self):
+        with self._lock:
+            self._bucket(time.monotonic())[1] += 1
+
+    def try_spend(self, kind):
+        """Reserve one extra attempt of `kind` ("retries" or "hedges"), if the budget allows."""
+        with self._lock:
+            bucket = self._bucket(time.monotonic())
+            requests = sum(b[1] for b in self._buckets)
+            extra = sum(b[2] for b in self._buckets)
+            if extra >= self.min_per_second * self.window + self.ratio * requests:
+                self.exhausted += 1
+                return False
+            bucket[2] += 1
+            setattr(self, kind, getattr(self, kind) + 1)
+            return True
+
+    def as_dict(self):
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_exhausted": self.exhausted,
+        }
+
+
+class Hedging:
+    """Per-process latency windows and retry budgets, one of each per upstream."""
+
+    def __init__(self):
+        self._latencies = {}
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def _get(self, service):
+        budget = self._budgets.get(service)
+        if budget is None:
+            with self._lock:
+                budget = self._budgets.get(service)
+                if budget is None:
+                    config = settings.GATEWAY_RETRY_BUDGET
+                    self._latencies[service] = LatencyWindow()
+                    budget = self._budgets[service] = RetryBudget(config["RATIO"], config["MIN_PER_SECOND"])
+        return self._latencies[service], budget
+
+    def budget(self, service):
+        return self._get(service)[1]
+
+    def record(self, service, latency):
+        self._get(service)[0].record(latency)
+
+    def hedge_delay(self, service):
+        """Seconds to wait before hedging a call to `service`, or None to not hedge it."""
+        config = settings.GATEWAY_HEDGING
+        if not config["ENABLED"] or service not in config["SERVICES"]:
+            return None
+        delay = self._get(service)[0].percentile(config["PERCENTILE"], config["MIN_SAMPLES"])
+        if delay is None:
+            return None
+        return max(config["MIN_DELAY"], delay)
+
+    def stats(self):
+        return {
+            service: {**budget.as_dict(), "hedge_delay": self.hedge_delay(service)}
+            for service, budget in list(self._budgets.items())
+        }
+
+
+hedging = Hedging()
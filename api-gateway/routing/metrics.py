@@ -0,0 +1,226 @@
+import bisect
+import contextvars
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+_current = contextvars.ContextVar("request_timer", default=None)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observing a value is a bisect and two additions."""
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class MetricsRegistry:
+    """Histograms and counters keyed by metric name and a tuple of label pairs."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+        histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        for (name, labels), histogram in histograms:
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip((*histogram.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels((*labels, ('le', bound)))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        return lines
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def gauge_lines(prefix, per_service, label="service", **extra_labels):
+    """Flatten {service: {field: number}} stats from other components into gauges."""
+    lines = []
+    for service, fields in sorted(per_service.items()):
+        labels = format_labels((*extra_labels.items(), (label, service)))
+        for field, value in sorted(fields.items()):
+            if field == "state":
+                value = BREAKER_STATES.get(value, -1)
+            elif isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            lines.append(f"{prefix}_{field}{labels} {value}")
+    return lines
+
+
+metrics = MetricsRegistry()
+
+
+def current_timer():
+    return _current.get()
+
+
+class RequestTimer:
+    """
+    Times one proxied request: gateway time, upstream connect, time to first
+    byte and total upstream time. finish() records everything into the
+    registry and adds a Server-Timing header to the response. Entering the
+    timer makes it the current one, which the sync upstream pool reports new
+    connections to.
+    """
+    __slots__ = (
+        "route", "upstream", "started", "upstream_started", "connect_started",
+        "connect", "ttfb", "upstream_total", "cache", "_token",
+    )
+
+    def __init__(self, route, upstream):
+        self.route = route
+        self.upstream = upstream
+        self.started = time.perf_counter()
+        self.upstream_started = None
+        self.connect_started = None
+        self.connect = None
+        self.ttfb = None
+        self.upstream_total = None
+        self.cache = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+    def upstream_start(self):
+        self.upstream_started = time.perf_counter()
+
+    def headers_received(self):
+        self.ttfb = time.perf_counter() - self.upstream_started
+
+    def body_received(self):
+        self.upstream_total = time.perf_counter() - self.upstream_started
+
+    def connected(self, seconds):
+        """Connection setup time on the sync path, reported by the upstream pool."""
+        self.connect = seconds
+
+    async def trace(self, event_name, info):
+        """httpx trace hook; captures connection setup time on the async path."""
+        if event_name == "connection.connect_tcp.started":
+            self.connect_started = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self.connect_started is not None:
+                self.connect = time.perf_counter() - self.connect_started
+
+    def finish(self, response):
+        if hasattr(response, "render") and not response.is_rendered:
+            response.render()
+        elapsed = time.perf_counter() - self.started
+        route = (("route", self.route),)
+        upstream = (("upstream", self.upstream),)
+
+        metrics.inc("gateway_responses_total", (*route, ("status", response.status_code)))
+        metrics.observe("gateway_request_duration_seconds", route, elapsed)
+        if self.connect is not None:
+            metrics.observe("gateway_upstream_connect_seconds", upstream, self.connect)
+        if self.ttfb is not None:
+            metrics.observe("gateway_upstream_ttfb_seconds", upstream, self.ttfb)
+
+        timings = []
+        if self.cache:
+            timings.append(f"cache;desc={self.cache}")
+        if self.connect is not None:
+            timings.append(f"connect;dur={self.connect * 1000:.1f}")
+        if self.ttfb is not None:
+            timings.append(f"upstream-ttfb;dur={self.ttfb * 1000:.1f}")
+
+        if response.streaming:
+            if self.ttfb is not None:
+                metrics.observe("gateway_overhead_seconds", route, elapsed - self.ttfb)
+            timings.append(f"gateway;dur={elapsed * 1000:.1f}")
+            if response.is_async:
+                response.streaming_content = self._count_async(response.streaming_content)
+            else:
+                response.streaming_content = self._count(response.streaming_content)
+        else:
+            upstream_time = self.upstream_total if self.upstream_total is not None else self.ttfb
+            if upstream_time is not None:
+                metrics.observe("gateway_upstream_duration_seconds", upstream, upstream_time)
+                metrics.observe("gateway_overhead_seconds", route, elapsed - upstream_time)
+                timings.append(f"upstream;dur={upstream_time * 1000:.1f}")
+            metrics.observe("gateway_response_size_bytes", route, len(response.content), SIZE_BUCKETS)
+            timings.append(f"gateway;dur={elapsed * 1000:.1f}")
+
+        response["Server-Timing"] = ", ".join(timings)
+        return response
+
+    def _stream_done(self, size):
+        metrics.observe("gateway_response_size_bytes", (("route", self.route),), size, SIZE_BUCKETS)
+        if self.upstream_started is not None:
+            metrics.observe(
+                "gateway_upstream_duration_seconds",
+                (("upstream", self.upstream),),
+                time.perf_counter() - self.upstream_started,
+            )
+
+    def _count(self, chunks):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self._stream_done(size)
+
+    async def _count_async(self, chunks):
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self._stream_done(size)
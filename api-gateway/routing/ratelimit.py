@@ -0,0 +1,242 @@
+import asyncio
+import math
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings
+
+from .breaker import UpstreamUnavailable
+
+
+class AdmissionRejected(UpstreamUnavailable):
+    """The gateway is at its concurrency limit and the wait queue is full or timed out."""
+
+
+class LocalTokenBuckets:
+    """
+    Token buckets held in this process. Each bucket is a two-item list of
+    (tokens, last refill time) in an LRU bounded by max_keys; an evicted
+    bucket simply starts full again.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take one token. Returns 0 when allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+
+class CacheTokenBuckets:
+    """
+    Shared limiter for multi-worker deployments, stored in a Django cache.
+    Approximates a token bucket with a fixed window of burst / rate seconds
+    that admits up to `burst` requests.
+    """
+
+    def __init__(self, alias="default", prefix="ratelimit"):
+        self.cache = caches[alias]
+        self.prefix = prefix
+
+    def take(self, key, rate, burst):
+        window = burst / rate
+        now = time.time()
+        window_start = math.floor(now / window)
+        cache_key = f"{self.prefix}:{key}:{window_start}"
+        if self.cache.add(cache_key, 1, math.ceil(window) + 1):
+            return 0
+        try:
+            count = self.cache.incr(cache_key)
+        except ValueError:
+            self.cache.add(cache_key, 1, math.ceil(window) + 1)
+            return 0
+        if count <= burst:
+            return 0
+        return (window_start + 1) * window - now
+
+
+class RateLimiter:
+    """Per-identity, per-route rate limits in front of the proxies."""
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+        self.limited = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    config = settings.GATEWAY_RATE_LIMITS
+                    self._backend = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        return self._backend
+
+    def check(self, route, identity, limit=None):
+        """
+        Returns None when the request may proceed, else a Retry-After in seconds.
+        `limit` is the route's own (rate, burst); without one the route's entry
+        in GATEWAY_RATE_LIMITS ROUTES, or DEFAULT, applies.
+        """
+        config = settings.GATEWAY_RATE_LIMITS
+        if not config["ENABLED"]:
+            return None
+        rate, burst = limit or config["ROUTES"].get(route, config["DEFAULT"])
+        wait = self.backend.take(f"{route}:{identity}", rate, burst)
+        if not wait:
+            return None
+        with self._lock:
+            self.limited[route] = self.limited.get(route, 0) + 1
+        return max(1, math.ceil(wait))
+
+    def stats(self):
+        with self._lock:
+            return {"limited": dict(self.limited)}
+
+
+def client_ip(meta):
+    if settings.GATEWAY_TRUST_X_FORWARDED_FOR and meta.get('HTTP_X_FORWARDED_FOR'):
+        return meta['HTTP_X_FORWARDED_FOR'].split(',')[0].strip()
+    return meta.get('REMOTE_ADDR', '')
+
+
+def client_identity(meta, token):
+    """JWT subject for authenticated callers, client IP for everyone else."""
+    if token is not None:
+        subject = token.payload.get(api_settings.USER_ID_CLAIM)
+        if subject is not None:
+            return f"user:{subject}"
+    return f"ip:{client_ip(meta)}"
+
+
+class AdmissionController:
+    """
+    Global cap on concurrent upstream calls with a bounded wait queue. Calls
+    beyond the cap wait up to queue_timeout for a slot; when the queue is
+    already full, or the wait runs out, the call is shed with 503.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def acquire(self):
+        config = settings.GATEWAY_ADMISSION
+        with self._condition:
+            if self.in_flight >= config["MAX_CONCURRENCY"]:
+                if self.waiting >= config["MAX_QUEUE"]:
+                    self.rejected += 1
+                    raise AdmissionRejected("gateway", 1)
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: self.in_flight < config["MAX_CONCURRENCY"], config["QUEUE_TIMEOUT"]
+                    )
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected += 1
+                    raise AdmissionRejected("gateway", 1)
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "waiting": self.waiting, "rejected": self.rejected}
+
+
+class _LoopSlots:
+    __slots__ = ("condition", "in_flight", "waiting")
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+
+
+class AsyncAdmissionController(AdmissionController):
+    """
+    AdmissionController for coroutines. An asyncio.Condition only wakes
+    waiters on its own loop, so slots and the queue are counted per event
+    loop, each with the configured limits.
+    """
+
+    def __init__(self):
+        self._loops = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _slots(self):
+        loop = asyncio.get_running_loop()
+        slots = self._loops.get(loop)
+        if slots is None:
+            with self._lock:
+                slots = self._loops.setdefault(loop, _LoopSlots())
+        return slots
+
+    async def acquire(self):
+        config = settings.GATEWAY_ADMISSION
+        slots = self._slots()
+        async with slots.condition:
+            if slots.in_flight >= config["MAX_CONCURRENCY"]:
+                if slots.waiting >= config["MAX_QUEUE"]:
+                    self.rejected += 1
+                    raise AdmissionRejected("gateway", 1)
+                slots.waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        slots.condition.wait_for(lambda: slots.in_flight < config["MAX_CONCURRENCY"]),
+                        config["QUEUE_TIMEOUT"],
+                    )
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    raise AdmissionRejected("gateway", 1)
+                finally:
+                    slots.waiting -= 1
+            slots.in_flight += 1
+
+    async def release(self):
+        slots = self._slots()
+        async with slots.condition:
+            slots.in_flight -= 1
+            slots.condition.notify()
+
+    def stats(self):
+        with self._lock:
+            loops = list(self._loops.values())
+        return {
+            "in_flight": sum(slots.in_flight for slots in loops),
+            "waiting": sum(slots.waiting for slots in loops),
+            "rejected": self.rejected,
+        }
+
+
+rate_limiter = RateLimiter()
+admission = AdmissionController()
+async_admission = AsyncAdmissionController()
@@ -0,0 +1,126 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import URLPattern
+from django.urls.resolvers import RegexPattern
+
+
+class Route:
+    """One proxied prefix and the policies applied to requests under it."""
+    __slots__ = (
+        "name", "prefixes", "upstream", "timeout", "auth_required", "cacheable", "invalidates", "bulk_writes",
+        "rate_limit",
+    )
+
+    def __init__(self, name, prefixes, upstream, timeout=None, auth_required=False, cacheable=False,
+                 invalidates=(), bulk_writes=(), rate_limit=None):
+        self.name = name
+        self.prefixes = prefixes
+        self.upstream = upstream
+        self.timeout = timeout
+        self.auth_required = auth_required
+        self.cacheable = cacheable
+        self.invalidates = invalidates
+        self.bulk_writes = bulk_writes
+        self.rate_limit = rate_limit
+
+    @classmethod
+    def from_config(cls, config):
+        upstream = config["upstream"]
+        prefixes = [config["prefix"], *config.get("aliases", ())]
+        timeout = config.get("timeout")
+        rate_limit = config.get("rate_limit")
+        return cls(
+            name=config.get("name", upstream),
+            prefixes=[prefix.strip("/") for prefix in prefixes],
+            upstream=upstream,
+            timeout=tuple(float(x) for x in timeout) if timeout else None,
+            auth_required=bool(config.get("auth_required", False)),
+            cacheable=bool(config.get("cacheable", False)),
+            invalidates=tuple(path.strip("/") for path in config.get("invalidates", ())),
+            bulk_writes=frozenset(path.strip("/") for path in config.get("bulk_writes", ())),
+            rate_limit=tuple(float(x) for x in rate_limit) if rate_limit else None,
+        )
+
+    def __repr__(self):
+        return f"<Route {self.name} /{'/, /'.join(self.prefixes)}/ -> {self.upstream}>"
+
+
+class RouteTable:
+    """
+    Routes compiled into a trie keyed on path segments, so matching a request
+    costs one dict lookup per segment of its prefix however many routes are
+    configured. The longest matching prefix wins.
+    """
+
+    def __init__(self, routes=()):
+        self.routes = []
+        self._root = {}
+        for route in routes:
+            self.add(route)
+
+    def add(self, route):
+        for prefix in route.prefixes:
+            if not prefix:
+                raise ImproperlyConfigured(f"Route {route.name!r} has an empty prefix")
+            node = self._root
+            *parents, last = prefix.split("/")
+            for segment in parents:
+                node = node.setdefault(segment, [{}, None])[0]
+            entry = node.setdefault(last, [{}, None])
+            if entry[1] is not None:
+                raise ImproperlyConfigured(f"Prefix {prefix!r} is routed to both {entry[1].name!r} and {route.name!r}")
+            entry[1] = route
+        self.routes.append(route)
+
+    def match(self, path):
+        """(route, remaining path) for a path without its leading slash, or (None, None)."""
+        node = self._root
+        found = rest = None
+        while True:
+            segment, separator, path = path.partition("/")
+            if not separator:
+                return found, rest
+            entry = node.get(segment)
+            if entry is None:
+                return found, rest
+            node, route = entry
+            if route is not None:
+                found, rest = route, path
+
+
+def load_routes():
+    """Build the route table from settings.GATEWAY_ROUTES, checking every upstream is configured."""
+    table = RouteTable()
+    for config in settings.GATEWAY_ROUTES:
+        route = Route.from_config(config)
+        if route.upstream not in settings.UPSTREAM_INSTANCES:
+            raise ImproperlyConfigured(
+                f"Route {route.name!r} forwards to {route.upstream!r}, which has no UPSTREAM_INSTANCES entry"
+            )
+        table.add(route)
+    return table
+
+
+class RouteTablePattern(RegexPattern):
+    """
+    URL pattern that resolves through a RouteTable instead of a regex. The
+    equivalent regex is kept for reverse() and for describing the pattern.
+    """
+
+    def __init__(self, table, name=None):
+        prefixes = "|".join(re.escape(prefix) for route in table.routes for prefix in route.prefixes)
+        super().__init__(rf"^(?:{prefixes})/(?P<path>.*)$", name=name, is_endpoint=True)
+        self.table = table
+
+    def match(self, path):
+        route, rest = self.table.match(path)
+        if route is None:
+            return None
+        return "", (), {"path": rest, "route": route}
+
+
+def proxy_routes(table, view, name=None):
+    """A single urlpattern sending every route in `table` to `view`, with the Route as a kwarg."""
+    return URLPattern(RouteTablePattern(table, name=name), view, name=name)
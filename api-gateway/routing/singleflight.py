@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+
+# Stands in for a leader's result that only the leader can use.
+_UNSHARED = object()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one. The first caller
+    runs the function; callers arriving while it is in flight wait for its
+    result instead of repeating the work. A caller that waits longer than
+    wait_timeout gives up on the shared call and runs its own, as do waiters
+    on a result that `shareable` rejects, such as a response being streamed.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.collapsed = 0
+        self.wait_timeouts = 0
+        self.unshared = 0
+
+    def do(self, key, fn, wait_timeout, shareable=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            self.leaders += 1
+            try:
+                result = fn()
+                call.result = result if shareable is None or shareable(result) else _UNSHARED
+                return result
+            except Exception as exc:
+                call.error = exc
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if not call.done.wait(wait_timeout):
+            self.wait_timeouts += 1
+            return fn()
+        if call.result is _UNSHARED:
+            self.unshared += 1
+            return fn()
+        self.collapsed += 1
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        return {
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "wait_timeouts": self.wait_timeouts,
+            "unshared": self.unshared,
+        }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines. Calls are only shared within one event loop."""
+
+    async def do(self, key, fn, wait_timeout, shareable=None):
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        future = self._calls.get(key)
+
+        if future is None:
+            future = self._calls[key] = loop.create_future()
+            self.leaders += 1
+            try:
+                result = await fn()
+                future.set_result(result if shareable is None or shareable(result) else _UNSHARED)
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as exc:
+                future.set_exception(exc)
+                raise
+            finally:
+                del self._calls[key]
+                if future.done() and not future.cancelled():
+                    # Mark the outcome as retrieved even if nobody was waiting on it.
+                    future.exception()
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), wait_timeout)
+        except asyncio.TimeoutError:
+            self.wait_timeouts += 1
+            return await fn()
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            return await fn()
+        if result is _UNSHARED:
+            self.unshared += 1
+            return await fn()
+        self.collapsed += 1
+        return result
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
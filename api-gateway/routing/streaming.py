@@ -0,0 +1,184 @@
+from django.http import StreamingHttpResponse
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Response headers that describe the body and must survive the hop unchanged.
+PASSTHROUGH_RESPONSE_HEADERS = (
+    'Content-Type',
+    'Content-Encoding',
+    'Content-Length',
+    'Content-Language',
+    'Cache-Control',
+    'Location',
+    'Retry-After',
+    'Vary',
+    'ETag',
+    'Last-Modified',
+)
+
+# Request preconditions forwarded upstream, as (WSGI META key, header name).
+CONDITIONAL_REQUEST_HEADERS = (
+    ('HTTP_IF_NONE_MATCH', 'If-None-Match'),
+    ('HTTP_IF_MODIFIED_SINCE', 'If-Modified-Since'),
+    ('HTTP_IF_MATCH', 'If-Match'),
+    ('HTTP_IF_UNMODIFIED_SINCE', 'If-Unmodified-Since'),
+)
+
+
+def content_length(meta):
+    try:
+        return int(meta.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return 0
+
+
+def is_chunked(meta):
+    return 'chunked' in meta.get('HTTP_TRANSFER_ENCODING', '').lower()
+
+
+def body_headers(meta):
+    """Headers describing an incoming request body, to forward along with it."""
+    headers = {}
+    if meta.get('CONTENT_TYPE'):
+        headers['Content-Type'] = meta['CONTENT_TYPE']
+    if meta.get('HTTP_CONTENT_ENCODING'):
+        headers['Content-Encoding'] = meta['HTTP_CONTENT_ENCODING']
+    return headers
+
+
+def conditional_headers(meta):
+    return {name: meta[key] for key, name in CONDITIONAL_REQUEST_HEADERS if meta.get(key)}
+
+
+class RequestBodyStream:
+    """
+    File-like view of an incoming request body with a known length. Passing
+    it to requests sends the body in chunks with a Content-Length header
+    instead of reading it into memory first.
+    """
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if self.stream is None:
+            return b''
+        return self.stream.read(size)
+
+    def __iter__(self):
+        while chunk := self.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+
+def iter_unsized_body(meta):
+    """
+    Yield a request body sent without a Content-Length. The WSGI server must
+    have decoded the chunked framing and marked the input as terminated, as
+    gunicorn does; otherwise reading it could block past the body's end.
+    """
+    stream = meta['wsgi.input']
+    while chunk := stream.read(STREAM_CHUNK_SIZE):
+        yield chunk
+
+
+async def aiter_request_body(request):
+    while chunk := request.read(STREAM_CHUNK_SIZE):
+        yield chunk
+
+
+def _iter_raw(upstream, head=(), raw=None):
+    # `head` holds chunks already taken from `raw`, a partly read stream.
+    try:
+        yield from head
+        yield from raw if raw is not None else upstream.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+    finally:
+        upstream.close()
+
+
+async def _aiter_raw(upstream, head=(), raw=None):
+    try:
+        for chunk in head:
+            yield chunk
+        async for chunk in raw if raw is not None else upstream.aiter_raw(STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+
+def _declared_length(upstream):
+    value = upstream.headers.get('Content-Length', '')
+    return int(value) if value.isdigit() else None
+
+
+def buffer_raw(upstream, limit):
+    """
+    Read a streamed requests response into memory, without undoing its
+    Content-Encoding, if its raw body is at most `limit` bytes. Returns
+    (body, None), or for a larger body (None, chunks), where chunks yields
+    all of it: what was read before the limit was passed, then the rest as
+    it arrives.
+    """
+    declared = _declared_length(upstream)
+    if declared is not None and declared > limit:
+        return None, _iter_raw(upstream)
+    raw = upstream.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+    head = []
+    size = 0
+    try:
+        for chunk in raw:
+            head.append(chunk)
+            size += len(chunk)
+            if size > limit:
+                return None, _iter_raw(upstream, head, raw)
+    except BaseException:
+        upstream.close()
+        raise
+    upstream.close()
+    return b''.join(head), None
+
+
+async def abuffer_raw(upstream, limit):
+    """buffer_raw for a streamed httpx response; chunks is an async iterator."""
+    declared = _declared_length(upstream)
+    if declared is not None and declared > limit:
+        return None, _aiter_raw(upstream)
+    raw = upstream.aiter_raw(STREAM_CHUNK_SIZE)
+    head = []
+    size = 0
+    try:
+        async for chunk in raw:
+            head.append(chunk)
+            size += len(chunk)
+            if size > limit:
+                return None, _aiter_raw(upstream, head, raw)
+    except BaseException:
+        await upstream.aclose()
+        raise
+    await upstream.aclose()
+    return b''.join(head), None
+
+
+def _copy_headers(upstream, response):
+    if 'Content-Type' not in upstream.headers:
+        del response['Content-Type']
+    for name in PASSTHROUGH_RESPONSE_HEADERS:
+        value = upstream.headers.get(name)
+        if value is not None:
+            response[name] = value
+    return response
+
+
+def passthrough_response(upstream, chunks=None):
+    """Stream a requests response back to the client byte for byte, from `chunks` if it was partly read."""
+    response = StreamingHttpResponse(_iter_raw(upstream) if chunks is None else chunks, status=upstream.status_code)
+    return _copy_headers(upstream, response)
+
+
+def async_passthrough_response(upstream, chunks=None):
+    """Stream an httpx response back to the client byte for byte, from `chunks` if it was partly read."""
+    response = StreamingHttpResponse(_aiter_raw(upstream) if chunks is None else chunks, status=upstream.status_code)
+    return _copy_headers(upstream, response)
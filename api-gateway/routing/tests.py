@@ -1,3 +1,1143 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import runpy
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import jwt
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import AsyncRequestFactory, Client, SimpleTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import VerifiedTokenCache
+from .balancer import upstream_balancers
+from .breaker import CircuitBreaker, CircuitOpenError, upstream_health
+from .hedging import hedging
+from .compression import compress, negotiate
+from .cache import BufferedResponse, LocMemLRUBackend, response_cache
+from .ratelimit import (
+    AdmissionController,
+    AdmissionRejected,
+    AsyncAdmissionController,
+    LocalTokenBuckets,
+    client_identity,
+    rate_limiter,
+)
+from .routes import Route, RouteTable, load_routes
+from .singleflight import single_flight
+from .upstream import _close_loser, async_upstream_pool, upstream_pool
+from .views import AsyncProxyView, ProxyView
+from shared.utils.tracing import RingBufferSink, parse_traceparent, tracer
+
+
+class StubUpstream:
+    """
+    A local HTTP server standing in for one upstream instance. It answers
+    every request with `status` after `delay` seconds, with `body` if one is
+    given and otherwise echoing the method, path and request body as JSON.
+    It logs each request's (method, path, body) and headers, and keeps the
+    last one's headers.
+    Subclasses override reply() to answer per path.
+    """
+
+    def __init__(self, delay=0.0, status=200, body=None, response_headers=None):
+        self.delay = delay
+        self.status = status
+        self.body = body
+        self.response_headers = response_headers or {}
+        self.hits = 0
+        self.requests = []
+        self.received_headers = []
+        self.headers = None
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionResetError:
+                    # The gateway dropped a kept-alive connection, e.g. after a timeout.
+                    pass
+
+            def do_GET(self):
+                stub.respond(self)
+
+            do_POST = do_PUT = do_PATCH = do_DELETE = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def read_body(handler):
+        if handler.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while size := int(handler.rfile.readline().split(b";")[0], 16):
+                chunks.append(handler.rfile.read(size))
+                handler.rfile.readline()
+            handler.rfile.readline()
+            return b"".join(chunks)
+        length = int(handler.headers.get("Content-Length") or 0)
+        return handler.rfile.read(length) if length else None
+
+    def reply(self, method, path, received):
+        """(status, headers, body) for one request, after the stub's delay."""
+        time.sleep(self.delay)
+        if self.body is not None:
+            return self.status, self.response_headers, self.body
+        echo = {"method": method, "path": path, "body": received.decode() if received is not None else None}
+        return self.status, {"Content-Type": "application/json", **self.response_headers}, json.dumps(echo).encode()
+
+    def respond(self, handler):
+        received = self.read_body(handler)
+        with self._lock:
+            self.hits += 1
+            self.requests.append((handler.command, handler.path, received))
+            self.headers = dict(handler.headers)
+            self.received_headers.append(self.headers)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            status, headers, body = self.reply(handler.command, handler.path, received)
+            handler.send_response(status)
+            for name, value in headers.items():
+                handler.send_header(name, value)
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The gateway gave up on this call, e.g. after a timeout.
+            pass
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubUpstreamTestCase(SimpleTestCase):
+    """
+    Points an upstream at local stub servers, with fresh balancers, pools and
+    breakers. Tests override settings with self.enterContext rather than a
+    method decorator: the decorator's override ends before use_stubs' own,
+    which would then restore the decorator's settings for later tests.
+    """
+
+    def use_stubs(self, *stubs, service="product", **load_balancer):
+        for stub in stubs:
+            self.addCleanup(stub.close)
+        self.enterContext(override_settings(
+            UPSTREAM_INSTANCES={**settings.UPSTREAM_INSTANCES, service: [stub.url for stub in stubs]},
+            GATEWAY_LOAD_BALANCER={**settings.GATEWAY_LOAD_BALANCER, **load_balancer},
+            GATEWAY_HEDGING={**settings.GATEWAY_HEDGING, "ENABLED": False},
+        ))
+        self.reset_upstreams()
+        self.addCleanup(self.reset_upstreams)
+
+    @staticmethod
+    def reset_upstreams():
+        upstream_pool.close()
+        async_upstream_pool.close()
+        upstream_balancers._balancers.clear()
+        upstream_health._breakers.clear()
+        upstream_health._bulkheads.clear()
+        # Entries stored and tokens taken by earlier tests would carry over.
+        response_cache._backend = None
+        rate_limiter._backend = None
+        hedging._budgets.clear()
+        hedging._latencies.clear()
+
+
+def access_token(lifetime=None):
+    token = AccessToken()
+    token["user_id"] = 1
+    if lifetime is not None:
+        token.set_exp(lifetime=lifetime)
+    return str(token)
+
+
+class RouteTests(StubUpstreamTestCase):
+    def test_longest_prefix_wins(self):
+        table = RouteTable([
+            Route("product", ["product"], "product"),
+            Route("featured", ["product/featured"], "product"),
+        ])
+
+        self.assertEqual(table.match("product/featured/lamp")[0].name, "featured")
+        self.assertEqual(table.match("product/featured/lamp")[1], "lamp")
+        self.assertEqual(table.match("product/lamp"), (table.routes[0], "lamp"))
+        self.assertEqual(table.match("product/featuredlamp/x")[0].name, "product")
+        self.assertEqual(table.match("products/lamp"), (None, None))
+
+    def test_unknown_upstream_is_improperly_configured(self):
+        with override_settings(GATEWAY_ROUTES=[{"prefix": "stock", "upstream": "inventory"}]):
+            with self.assertRaisesMessage(ImproperlyConfigured, "'inventory', which has no UPSTREAM_INSTANCES"):
+                load_routes()
+
+    def test_duplicate_prefix_is_improperly_configured(self):
+        routes = [
+            {"name": "product", "prefix": "product", "upstream": "product"},
+            {"name": "legacy", "prefix": "legacy", "aliases": ["/product/"], "upstream": "product"},
+        ]
+        with override_settings(GATEWAY_ROUTES=routes):
+            with self.assertRaisesMessage(ImproperlyConfigured, "'product' is routed to both 'product' and 'legacy'"):
+                load_routes()
+
+    def test_routes_file_replaces_the_routes(self):
+        routes = [{"prefix": "stock", "upstream": "inventory", "instances": ["http://inventory:8000"]}]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as routes_file:
+            json.dump(routes, routes_file)
+            routes_file.flush()
+            with mock.patch.dict("os.environ", {"GATEWAY_ROUTES_FILE": routes_file.name}):
+                configured = runpy.run_path(settings.BASE_DIR / "api_gateway" / "settings.py")
+
+        self.assertEqual(configured["GATEWAY_ROUTES"], routes)
+        self.assertEqual(configured["UPSTREAM_INSTANCES"]["inventory"], ["http://inventory:8000"])
+        with override_settings(
+            GATEWAY_ROUTES=configured["GATEWAY_ROUTES"], UPSTREAM_INSTANCES=configured["UPSTREAM_INSTANCES"]
+        ):
+            self.assertEqual([route.name for route in load_routes().routes], ["inventory"])
+
+    def test_unsafe_paths_are_rejected(self):
+        view = ProxyView()
+        for path in ("", "lamp", "id/12", "lamp-shade_2.json"):
+            with self.subTest(path=path):
+                self.assertTrue(view._is_safe_path(path))
+        for path in ("..", "a/../admin", "a/..", "http://evil", "a:b", "/etc/passwd", "a%2F..", "a?b"):
+            with self.subTest(path=path):
+                self.assertFalse(view._is_safe_path(path))
+
+    def test_anonymous_request_to_an_auth_required_route_is_401_without_an_upstream_call(self):
+        stub = StubUpstream()
+        self.use_stubs(stub, service="order")
+
+        response = self.client.get("/order/cart/")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(stub.hits, 0)
+        response = self.client.get("/order/cart/", headers={"Authorization": f"Bearer {access_token()}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stub.hits, 1)
+
+
+class UpstreamSlotTests(SimpleTestCase):
+    def test_slots_are_released_when_no_instance_can_be_picked(self):
+        balancer = upstream_balancers.get("product")
+        with mock.patch.object(balancer, "acquire", side_effect=IndexError("no instances")):
+            for _ in range(3):
+                with self.assertRaises(IndexError):
+                    upstream_pool.request("product", "POST", "/api/")
+
+        self.assertEqual(upstream_health.stats()["product"]["in_flight"], 0)
+        self.assertEqual(upstream_pool.stats()["product"]["in_flight"], 0)
+        self.assertEqual(upstream_health.stats()["product"]["window_requests"], 0)
+
+
+@override_settings(GATEWAY_BATCH={"MAX_SIZE": 4, "MAX_CONCURRENCY": 2})
+class BatchTests(StubUpstreamTestCase):
+    def batch(self, items):
+        return self.client.post("/batch", {"requests": items}, content_type="application/json")
+
+    def test_rejects_batches_over_the_size_limit(self):
+        response = self.batch([{"path": f"/product/p{i}"} for i in range(5)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "A batch may contain at most 4 requests"})
+
+    def test_rejects_malformed_items(self):
+        for items in ([], [{"method": "GET"}], [{"path": "/product/p", "method": "TRACE"}]):
+            with self.subTest(items=items):
+                self.assertEqual(self.batch(items).status_code, 400)
+
+    def test_runs_sub_requests_through_proxy_routes_in_order(self):
+        stub = StubUpstream(delay=0.1)
+        self.use_stubs(stub)
+
+        response = self.batch([
+            {"path": "/product/first?page=2"},
+            {"method": "POST", "path": "/product/", "body": {"name": "Lamp"}},
+            {"path": "/nowhere/else"},
+            {"path": "/product/last"},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["responses"]
+        self.assertEqual([result["status"] for result in results], [200, 200, 404, 200])
+        self.assertEqual(results[0]["body"]["path"], "/api/first?page=2")
+        self.assertEqual(results[1]["body"], {"method": "POST", "path": "/api/", "body": '{"name": "Lamp"}'})
+        self.assertEqual(results[2]["body"], {"error": "Unknown route"})
+        self.assertEqual(results[3]["body"]["path"], "/api/last")
+        self.assertEqual(stub.hits, 3)
+        self.assertEqual(stub.peak, 2)
+
+
+class RequestTimerTests(StubUpstreamTestCase):
+    def test_sync_proxy_reports_connect_time_for_new_connections_only(self):
+        self.use_stubs(StubUpstream())
+
+        first = self.client.get("/product/first")
+        second = self.client.get("/product/second")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertRegex(first["Server-Timing"], r"(^|, )connect;dur=\d+\.\d")
+        # The second call reuses the pooled keep-alive connection.
+        self.assertNotIn("connect;", second["Server-Timing"])
+
+
+class LoadBalancerTests(StubUpstreamTestCase):
+    def call(self, times):
+        for _ in range(times):
+            upstream_pool.request("product", "GET", "/api/").close()
+
+    def test_slow_instance_gets_less_traffic(self):
+        fast, slow = StubUpstream(), StubUpstream(delay=0.05)
+        self.use_stubs(fast, slow)
+
+        self.call(20)
+
+        # Each is tried once before the latency averages steer traffic.
+        self.assertEqual(slow.hits, 1)
+        self.assertEqual(fast.hits, 19)
+
+    def test_failing_instance_is_ejected_and_returns_after_eject_seconds(self):
+        # The failing instance answers fastest, so only ejection keeps traffic off it.
+        healthy, failing = StubUpstream(delay=0.01), StubUpstream(status=500)
+        self.use_stubs(healthy, failing, eject_after=3, eject_seconds=1)
+        balancer = upstream_balancers.get("product")
+
+        self.call(10)
+
+        self.assertEqual(failing.hits, 3)
+        self.assertEqual(healthy.hits, 7)
+        self.assertTrue(balancer.stats()[failing.url]["ejected"])
+
+        failing.status = 200
+        time.sleep(1.05)
+        self.call(5)
+
+        self.assertFalse(balancer.stats()[failing.url]["ejected"])
+        self.assertGreater(failing.hits, 3)
+
+
+class SingleFlightTests(StubUpstreamTestCase):
+    def test_conditional_reads_forward_their_preconditions(self):
+        stub = StubUpstream()
+        self.use_stubs(stub, service="user")
+
+        response = self.client.get("/user/profile", headers={"If-None-Match": '"v1"'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stub.headers["If-None-Match"], '"v1"')
+
+
+class SingleFlightConcurrencyTests(StubUpstreamTestCase):
+    def get_concurrently(self, path, count):
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(lambda _: Client().get(path), range(count)))
+
+    def test_concurrent_anonymous_reads_share_one_upstream_call(self):
+        stub = StubUpstream(delay=0.3)
+        self.use_stubs(stub, service="user")
+
+        responses = self.get_concurrently("/user/profile?a=1", 5)
+
+        self.assertEqual(stub.hits, 1)
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual({response.content for response in responses}, {responses[0].content})
+
+    def test_waiters_call_upstream_themselves_after_the_wait_timeout(self):
+        self.enterContext(override_settings(GATEWAY_SINGLE_FLIGHT={"ENABLED": True, "WAIT_TIMEOUT": 0.1}))
+        stub = StubUpstream(delay=0.4)
+        self.use_stubs(stub, service="user")
+        timeouts = single_flight.wait_timeouts
+
+        responses = self.get_concurrently("/user/profile", 3)
+
+        self.assertEqual([response.status_code for response in responses], [200] * 3)
+        self.assertEqual(stub.hits, 3)
+        self.assertEqual(single_flight.wait_timeouts - timeouts, 2)
+
+
+class LocMemLRUBackendTests(SimpleTestCase):
+    @staticmethod
+    def entry(size):
+        return BufferedResponse(200, {}, b"x" * size)
+
+    def test_entries_expire_after_their_ttl(self):
+        backend = LocMemLRUBackend()
+        with mock.patch("routing.cache.time.monotonic", return_value=100.0):
+            backend.set("a", self.entry(1), 30)
+        with mock.patch("routing.cache.time.monotonic", return_value=129.9):
+            self.assertIsNotNone(backend.get("a"))
+        with mock.patch("routing.cache.time.monotonic", return_value=130.0):
+            self.assertIsNone(backend.get("a"))
+        self.assertEqual(backend.stats()["bytes"], 0)
+
+    def test_least_recently_used_entry_is_evicted_past_max_entries(self):
+        backend = LocMemLRUBackend(max_entries=2)
+        backend.set("a", self.entry(1), 30)
+        backend.set("b", self.entry(1), 30)
+        backend.get("a")
+        backend.set("c", self.entry(1), 30)
+
+        self.assertIsNone(backend.get("b"))
+        self.assertIsNotNone(backend.get("a"))
+        self.assertIsNotNone(backend.get("c"))
+        self.assertEqual(backend.stats()["evictions"], 1)
+
+    def test_entries_are_evicted_until_the_total_fits_max_bytes(self):
+        backend = LocMemLRUBackend(max_bytes=100)
+        backend.set("a", self.entry(40), 30)
+        backend.set("b", self.entry(40), 30)
+        backend.set("c", self.entry(70), 30)
+
+        self.assertIsNone(backend.get("a"))
+        self.assertIsNone(backend.get("b"))
+        self.assertIsNotNone(backend.get("c"))
+        self.assertEqual(backend.stats(), {"entries": 1, "bytes": 70, "evictions": 2})
+
+
+class ResponseCacheTests(StubUpstreamTestCase):
+    def test_repeat_anonymous_reads_are_hits(self):
+        stub = StubUpstream()
+        self.use_stubs(stub)
+
+        first = self.client.get("/product/lamp?b=2&a=1")
+        second = self.client.get("/product/lamp?a=1&b=2")
+
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(stub.hits, 1)
+
+    def test_authorized_reads_are_never_cached(self):
+        stub = StubUpstream()
+        self.use_stubs(stub)
+        headers = {"Authorization": f"Bearer {access_token()}"}
+
+        self.client.get("/product/lamp")
+        for _ in range(2):
+            response = self.client.get("/product/lamp", headers=headers)
+            self.assertNotIn("X-Cache", response)
+
+        self.assertEqual(stub.hits, 3)
+
+    def test_writes_invalidate_the_resource_its_collection_and_id_entries(self):
+        stub = StubUpstream()
+        self.use_stubs(stub)
+        paths = ["/product/lamp", "/product/", "/product/id/7"]
+
+        for method in ("put", "delete"):
+            with self.subTest(method):
+                for path in paths:
+                    self.client.get(path)
+                    self.assertEqual(self.client.get(path)["X-Cache"], "HIT")
+
+                getattr(self.client, method)("/product/lamp", "{}", content_type="application/json")
+
+                for path in paths:
+                    self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+
+
+def in_order(population, k):
+    return list(population)[:k]
+
+
+# Instances are tried in the order they are listed.
+@mock.patch("routing.balancer.random.sample", in_order)
+class RetryAndHedgingTests(StubUpstreamTestCase):
+    def dead_and_alive(self):
+        dead, alive = StubUpstream(), StubUpstream()
+        dead.close()
+        self.use_stubs(dead, alive)
+        return alive
+
+    def slow_and_fast(self):
+        slow, fast = StubUpstream(delay=0.5), StubUpstream()
+        self.use_stubs(slow, fast)
+        self.enterContext(override_settings(GATEWAY_HEDGING={
+            **settings.GATEWAY_HEDGING, "ENABLED": True, "SERVICES": ["product"],
+            "PERCENTILE": 0.95, "MIN_SAMPLES": 50, "MIN_DELAY": 0.01,
+        }))
+        for _ in range(50):
+            hedging.record("product", 0.05)
+        return slow, fast
+
+    def test_idempotent_call_is_retried_on_another_instance_after_a_connect_error(self):
+        alive = self.dead_and_alive()
+
+        response = upstream_pool.request("product", "GET", "/api/lamp")
+
+        self.assertEqual(response.json()["path"], "/api/lamp")
+        self.assertEqual(alive.hits, 1)
+        self.assertEqual(hedging.budget("product").retries, 1)
+
+    def test_post_is_not_retried(self):
+        alive = self.dead_and_alive()
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            upstream_pool.request("product", "POST", "/api/", data=b"{}")
+
+        self.assertEqual(alive.hits, 0)
+
+    def test_hedge_is_sent_after_the_tail_latency_and_the_loser_closed(self):
+        slow, fast = self.slow_and_fast()
+
+        with mock.patch("routing.upstream._close_loser", wraps=_close_loser) as close_loser:
+            started = time.monotonic()
+            response = upstream_pool.request("product", "GET", "/api/lamp")
+            elapsed = time.monotonic() - started
+            self.assertEqual(response.status_code, 200)
+            self.assertGreaterEqual(elapsed, 0.05)
+            self.assertLess(elapsed, 0.4)
+            self.assertEqual((slow.hits, fast.hits), (1, 1))
+            self.assertEqual(hedging.budget("product").as_dict()["hedge_wins"], 1)
+
+            deadline = time.monotonic() + 2
+            while not close_loser.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+            loser = close_loser.call_args.args[0]
+        self.assertTrue(loser.result().raw.closed)
+
+    async def test_async_hedge_cancels_the_loser(self):
+        slow, fast = self.slow_and_fast()
+
+        try:
+            started = time.monotonic()
+            response = await async_upstream_pool.request("product", "GET", "/api/lamp")
+            self.assertLess(time.monotonic() - started, 0.4)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((slow.hits, fast.hits), (1, 1))
+            # The cancelled attempt gives its slot back long before the slow instance answers.
+            for _ in range(20):
+                if not upstream_health.stats()["product"]["in_flight"]:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(upstream_health.stats()["product"]["in_flight"], 0)
+        finally:
+            await async_upstream_pool.aclose()
+
+    def test_exhausted_budget_stops_retries_and_hedges(self):
+        self.enterContext(override_settings(
+            GATEWAY_RETRY_BUDGET={"RATIO": 0, "MIN_PER_SECOND": 0, "MAX_RETRIES": 2}
+        ))
+        alive = self.dead_and_alive()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            upstream_pool.request("product", "GET", "/api/lamp")
+        self.assertEqual(alive.hits, 0)
+
+        self.reset_upstreams()
+        slow, fast = self.slow_and_fast()
+        response = upstream_pool.request("product", "GET", "/api/lamp")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((slow.hits, fast.hits), (1, 0))
+        self.assertEqual(hedging.budget("product").as_dict()["budget_exhausted"], 1)
+
+
+class NegotiationTests(SimpleTestCase):
+    def test_encodings_refused_with_q_0_are_never_chosen(self):
+        with mock.patch("routing.compression.brotli", None):
+            self.assertEqual(negotiate("gzip, deflate"), "gzip")
+            self.assertEqual(negotiate("*;q=0.5"), "gzip")
+            self.assertIsNone(negotiate("gzip;q=0, deflate"))
+            self.assertIsNone(negotiate("*;q=1, gzip;q=0"))
+            self.assertIsNone(negotiate("identity"))
+            self.assertIsNone(negotiate(""))
+
+    def test_brotli_is_preferred_only_when_installed(self):
+        with mock.patch("routing.compression.brotli", None):
+            self.assertEqual(negotiate("br, gzip"), "gzip")
+            self.assertIsNone(negotiate("br"))
+        with mock.patch("routing.compression.brotli", mock.Mock()):
+            self.assertEqual(negotiate("gzip, br"), "br")
+            self.assertEqual(negotiate("br;q=0, gzip"), "gzip")
+            self.assertEqual(negotiate("br, gzip", available={"gzip": b""}), "gzip")
+
+
+@mock.patch("routing.compression.brotli", None)
+class CompressionTests(StubUpstreamTestCase):
+    body = json.dumps([{"name": f"Product {i}", "price": "9.99"} for i in range(100)]).encode()
+
+    def serve(self, body=None, content_type="application/json", service="user"):
+        stub = StubUpstream(body=body or self.body, response_headers={"Content-Type": content_type})
+        self.use_stubs(stub, service=service)
+        return stub
+
+    def test_buffered_and_streamed_responses_are_compressed(self):
+        self.serve()
+        headers = {"Accept-Encoding": "br;q=1, gzip;q=0.5"}
+
+        buffered = self.client.get("/user/profile", headers=headers)
+        streamed = self.client.post("/user/profile", headers=headers)
+
+        for response in (buffered, streamed):
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertIn("Accept-Encoding", response["Vary"].split(", "))
+            self.assertEqual(gzip.decompress(response.getvalue()), self.body)
+        self.assertNotIn("Content-Length", streamed)
+
+    def test_refused_encodings_get_the_identity_body(self):
+        self.serve()
+
+        response = self.client.get("/user/profile", headers={"Accept-Encoding": "gzip;q=0"})
+
+        self.assertNotIn("Content-Encoding", response)
+        self.assertIn("Accept-Encoding", response["Vary"].split(", "))
+        self.assertEqual(response.getvalue(), self.body)
+
+    def test_small_and_incompressible_bodies_pass_through(self):
+        for body, content_type in ((b'{"ok": true}', "application/json"), (self.body, "image/png")):
+            with self.subTest(content_type=content_type):
+                self.serve(body, content_type)
+                response = self.client.get("/user/profile", headers={"Accept-Encoding": "gzip"})
+                self.assertNotIn("Content-Encoding", response)
+                self.assertEqual(response.getvalue(), body)
+
+    def test_cache_hits_are_served_from_the_stored_variant(self):
+        self.serve(service="product")
+        headers = {"Accept-Encoding": "gzip"}
+        self.client.get("/product/", headers=headers)
+
+        with mock.patch("routing.compression.compress", wraps=compress) as compressed:
+            hit = self.client.get("/product/", headers=headers)
+            identity = self.client.get("/product/")
+
+        compressed.assert_not_called()
+        self.assertEqual(hit["X-Cache"], "HIT")
+        self.assertEqual(hit["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", hit["Vary"].split(", "))
+        self.assertEqual(gzip.decompress(hit.content), self.body)
+        self.assertNotIn("Content-Encoding", identity)
+        self.assertEqual(identity.content, self.body)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.enterContext(mock.patch("routing.breaker.time.monotonic", side_effect=lambda: self.now))
+        self.breaker = CircuitBreaker(
+            "product", min_requests=4, error_threshold=0.5, slow_call_seconds=1, slow_call_threshold=0.5,
+            open_seconds=10, half_open_probes=2,
+        )
+
+    def record(self, *outcomes):
+        for failed, latency in outcomes:
+            self.breaker.before_call()
+            self.breaker.record(failed, latency)
+
+    def trip(self):
+        self.record(*[(True, 0.1)] * 4)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_opens_at_the_error_threshold(self):
+        self.record((False, 0.1), (False, 0.1), (True, 0.1))
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.record((True, 0.1))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_opens_at_the_slow_call_threshold(self):
+        self.record((False, 0.1), (False, 2), (False, 0.1))
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.record((False, 1))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_open_circuit_rejects_until_open_seconds_pass(self):
+        self.trip()
+        self.now += 6.5
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 4)
+
+        self.now += 3.5
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_half_open_lets_a_limited_number_of_probes_through(self):
+        self.trip()
+        self.now += 10
+        self.breaker.before_call()
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        # A probe that was never sent frees its place.
+        self.breaker.cancel()
+        self.breaker.before_call()
+
+    def test_half_open_closes_when_every_probe_succeeds(self):
+        self.trip()
+        self.now += 10
+        self.record((False, 0.1))
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.record((False, 0.1))
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_reopens_on_a_failed_or_slow_probe(self):
+        for outcome in ((True, 0.1), (False, 2)):
+            with self.subTest(outcome=outcome):
+                self.trip()
+                self.now += 10
+                self.record((False, 0.1), outcome)
+                self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+                self.now += 10
+                self.record((False, 0.1), (False, 0.1))
+
+
+class UpstreamHealthTests(StubUpstreamTestCase):
+    def register(self):
+        return self.client.post("/user/register", "{}", content_type="application/json")
+
+    def test_open_circuit_answers_503_without_calling_upstream(self):
+        self.enterContext(override_settings(
+            GATEWAY_CIRCUIT_BREAKER={**settings.GATEWAY_CIRCUIT_BREAKER, "min_requests": 2}
+        ))
+        stub = StubUpstream(status=500)
+        self.use_stubs(stub, service="user")
+
+        self.assertEqual([self.register().status_code for _ in range(2)], [500, 500])
+        response = self.register()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], str(int(settings.GATEWAY_CIRCUIT_BREAKER["open_seconds"])))
+        self.assertEqual(stub.hits, 2)
+
+    def test_bulkhead_rejects_calls_past_the_concurrency_limit(self):
+        self.enterContext(override_settings(UPSTREAM_MAX_CONCURRENCY=2))
+        stub = StubUpstream(delay=0.3)
+        self.use_stubs(stub, service="user")
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            responses = list(executor.map(
+                lambda _: Client().post("/user/register", "{}", content_type="application/json"), range(4)
+            ))
+
+        self.assertEqual(sorted(response.status_code for response in responses), [200, 200, 503, 503])
+        self.assertEqual(stub.peak, 2)
+        self.assertEqual(upstream_health.stats()["user"]["bulkhead_rejected"], 2)
+
+
+class CacheInvalidationTests(StubUpstreamTestCase):
+    def test_import_drops_every_cached_product(self):
+        stub = StubUpstream()
+        self.use_stubs(stub)
+        paths = ["/product/", "/product/cached-lamp", "/product/id/7"]
+        for path in paths:
+            self.client.get(path)
+            self.client.get(path)
+        self.assertEqual(stub.hits, len(paths))
+
+        self.client.post("/product/import", "name,price\n", content_type="text/csv")
+        for path in paths:
+            self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+        self.assertEqual(stub.hits, 2 * len(paths) + 1)
+
+
+class PassthroughTests(StubUpstreamTestCase):
+    def test_body_and_its_headers_are_relayed_byte_for_byte(self):
+        body = gzip.compress(b'{"name": "Ada"}')
+        stub = StubUpstream(body=body, response_headers={
+            "Content-Type": "application/vnd.profile+json", "Content-Encoding": "gzip",
+        })
+        self.use_stubs(stub, service="user")
+
+        response = self.client.get("/user/profile?b=2&a=%20x&a=1&flag")
+
+        self.assertEqual(response["Content-Type"], "application/vnd.profile+json")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response.getvalue(), body)
+        self.assertEqual(stub.requests[0][1], "/api/profile?b=2&a=%20x&a=1&flag")
+
+    def test_chunked_request_body_is_forwarded(self):
+        stub = StubUpstream()
+        self.use_stubs(stub, service="user")
+
+        response = self.client.generic("POST", "/user/register", **{
+            "CONTENT_TYPE": "application/json",
+            "HTTP_TRANSFER_ENCODING": "chunked",
+            # What a server that decodes chunked framing, like gunicorn, passes on.
+            "wsgi.input": io.BytesIO(b'{"name": "Ada"}'),
+            "wsgi.input_terminated": True,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stub.requests[0][2], b'{"name": "Ada"}')
+        self.assertEqual(stub.headers["Content-Type"], "application/json")
+
+    def test_chunked_request_body_needs_a_terminated_input(self):
+        stub = StubUpstream()
+        self.use_stubs(stub, service="user")
+
+        response = self.client.generic("POST", "/user/register", **{
+            "HTTP_TRANSFER_ENCODING": "chunked", "wsgi.input": io.BytesIO(b"{}"),
+        })
+
+        self.assertEqual(response.status_code, 411)
+        self.assertEqual(stub.hits, 0)
+
+
+class EdgeAuthenticationTests(SimpleTestCase):
+    def forged_token(self):
+        payload = jwt.decode(access_token(), options={"verify_signature": False})
+        return jwt.encode(payload, "not-the-signing-key", algorithm="HS256")
+
+    def assertRejectedAtTheEdge(self, token):
+        with mock.patch.object(upstream_pool, "request") as request:
+            response = self.client.get("/product/lamp", headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(response["WWW-Authenticate"].startswith("Bearer"))
+        request.assert_not_called()
+
+    def test_forged_signature_is_rejected_without_an_upstream_call(self):
+        self.assertRejectedAtTheEdge(self.forged_token())
+
+    def test_expired_token_is_rejected(self):
+        self.assertRejectedAtTheEdge(access_token(lifetime=timedelta(seconds=-1)))
+
+    def test_async_proxy_rejects_the_same_tokens(self):
+        route = Route("product", ["product"], "product")
+        for token in (self.forged_token(), access_token(lifetime=timedelta(seconds=-1))):
+            with self.subTest(token=token):
+                request = AsyncRequestFactory().get("/product/lamp", headers={"Authorization": f"Bearer {token}"})
+                with mock.patch.object(async_upstream_pool, "request") as upstream:
+                    response = async_to_sync(AsyncProxyView.as_view())(request, route=route, path="lamp")
+                self.assertEqual(response.status_code, 401)
+                self.assertTrue(response["WWW-Authenticate"].startswith("Bearer"))
+                upstream.assert_not_called()
+
+
+class VerifiedTokenCacheTests(SimpleTestCase):
+    @staticmethod
+    def token(raw):
+        return raw.encode(), AccessToken(raw)
+
+    def test_cached_token_is_dropped_once_it_expires(self):
+        cache = VerifiedTokenCache()
+        raw, token = self.token(access_token(lifetime=timedelta(seconds=60)))
+        cache.set(raw, token)
+        self.assertIs(cache.get(raw), token)
+
+        with mock.patch("routing.authentication.time.time", return_value=token["exp"]):
+            self.assertIsNone(cache.get(raw))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    @override_settings(GATEWAY_JWT_CACHE_SIZE=2)
+    def test_least_recently_used_token_is_evicted_past_the_cache_size(self):
+        cache = VerifiedTokenCache()
+        first, second, third = (self.token(access_token()) for _ in range(3))
+        cache.set(*first)
+        cache.set(*second)
+        cache.get(first[0])
+        cache.set(*third)
+
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertIsNone(cache.get(second[0]))
+        self.assertIsNotNone(cache.get(first[0]))
+        self.assertIsNotNone(cache.get(third[0]))
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_bucket_refills_at_its_rate(self):
+        buckets = LocalTokenBuckets()
+        with mock.patch("routing.ratelimit.time.monotonic", return_value=100.0):
+            self.assertEqual([buckets.take("k", 2, 2) for _ in range(3)], [0, 0, 0.5])
+        with mock.patch("routing.ratelimit.time.monotonic", return_value=100.5):
+            self.assertEqual(buckets.take("k", 2, 2), 0)
+            self.assertEqual(buckets.take("k", 2, 2), 0.5)
+
+    def test_authenticated_callers_are_identified_by_their_subject(self):
+        token = AccessToken(access_token())
+        meta = {"REMOTE_ADDR": "10.0.0.1"}
+        self.assertEqual(client_identity(meta, token), "user:1")
+        self.assertEqual(client_identity(meta, None), "ip:10.0.0.1")
+
+
+@override_settings(GATEWAY_RATE_LIMITS={**settings.GATEWAY_RATE_LIMITS, "ROUTES": {"user": (1, 1)}})
+class RateLimitTests(StubUpstreamTestCase):
+    def test_over_the_limit_is_429_with_retry_after(self):
+        stub = StubUpstream()
+        self.use_stubs(stub, service="user")
+        limited = rate_limiter.stats()["limited"].get("user", 0)
+
+        self.assertEqual(self.client.post("/user/register").status_code, 200)
+        response = self.client.post("/user/register")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(stub.hits, 1)
+        self.assertEqual(rate_limiter.stats()["limited"]["user"] - limited, 1)
+
+    def test_authenticated_callers_get_their_own_bucket(self):
+        self.use_stubs(StubUpstream(), service="user")
+        headers = {"Authorization": f"Bearer {access_token()}"}
+
+        self.assertEqual(self.client.post("/user/register").status_code, 200)
+        self.assertEqual(self.client.post("/user/register").status_code, 429)
+        # Same client address, but limited by the token's subject instead.
+        self.assertEqual(self.client.post("/user/register", headers=headers).status_code, 200)
+        self.assertEqual(self.client.post("/user/register", headers=headers).status_code, 429)
+
+
+@override_settings(GATEWAY_ADMISSION={"MAX_CONCURRENCY": 1, "MAX_QUEUE": 1, "QUEUE_TIMEOUT": 0.1})
+class AdmissionTests(SimpleTestCase):
+    def test_sheds_when_the_queue_is_full(self):
+        controller = AdmissionController()
+        controller.acquire()
+        waiter = threading.Thread(target=lambda: self.assertRaises(AdmissionRejected, controller.acquire))
+        waiter.start()
+        while not controller.waiting:
+            time.sleep(0.001)
+
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire()
+        waiter.join()
+        self.assertEqual(controller.stats(), {"in_flight": 1, "waiting": 0, "rejected": 2})
+
+    def test_waiter_is_admitted_on_release_or_shed_after_the_queue_timeout(self):
+        controller = AdmissionController()
+        controller.acquire()
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire()
+
+        threading.Timer(0.05, controller.release).start()
+        controller.acquire()
+        self.assertEqual(controller.stats(), {"in_flight": 1, "waiting": 0, "rejected": 1})
+
+    async def test_async_sheds_when_the_queue_is_full_or_times_out(self):
+        controller = AsyncAdmissionController()
+        await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+
+        with self.assertRaises(AdmissionRejected):
+            await controller.acquire()
+        with self.assertRaises(AdmissionRejected):
+            await waiter
+        self.assertEqual(controller.stats(), {"in_flight": 1, "waiting": 0, "rejected": 2})
+
+        asyncio.get_running_loop().call_later(0.05, lambda: asyncio.ensure_future(controller.release()))
+        await controller.acquire()
+        self.assertEqual(controller.stats()["in_flight"], 1)
+
+    def test_async_slots_are_counted_per_event_loop(self):
+        controller = AsyncAdmissionController()
+        release = threading.Event()
+
+        async def hold():
+            await controller.acquire()
+            await asyncio.get_running_loop().run_in_executor(None, release.wait)
+            await controller.release()
+
+        holder = threading.Thread(target=asyncio.run, args=(hold(),))
+        holder.start()
+        while not controller.stats()["in_flight"]:
+            time.sleep(0.001)
+
+        async def call():
+            await controller.acquire()
+            await controller.release()
+
+        # A slot held on another loop neither blocks this one nor is released by it.
+        try:
+            asyncio.run(call())
+        finally:
+            release.set()
+            holder.join()
+        self.assertEqual(controller.stats(), {"in_flight": 0, "waiting": 0, "rejected": 0})
+
+
+class CatalogStub(StubUpstream):
+    """Serves /api/product/id/<pk>: 404 for missing ids, and slow ones after the others."""
+
+    def __init__(self, missing=(), slow=(), **kwargs):
+        super().__init__(**kwargs)
+        self.missing = missing
+        self.slow = slow
+
+    def reply(self, method, path, received):
+        product_id = int(path.rsplit("/", 1)[1])
+        if product_id in self.slow:
+            time.sleep(1)
+        if product_id in self.missing:
+            return 404, {"Content-Type": "application/json"}, b'{"detail": "Not found."}'
+        product = {"id": product_id, "name": f"Product {product_id}"}
+        return 200, {"Content-Type": "application/json"}, json.dumps(product).encode()
+
+
+@override_settings(GATEWAY_AGGREGATE_TIMEOUTS={**settings.GATEWAY_AGGREGATE_TIMEOUTS, "product": 0.3})
+class EnrichedCartTests(StubUpstreamTestCase):
+    def test_unavailable_products_leave_the_rest_of_the_cart_intact(self):
+        cart = {"id": 1, "items": [{"product_id": 1}, {"product_id": 2}, {"product_id": 3}]}
+        orders = StubUpstream(body=json.dumps(cart).encode(), response_headers={"Content-Type": "application/json"})
+        self.use_stubs(orders, service="order")
+        self.use_stubs(CatalogStub(slow={2}, missing={3}))
+        token = access_token()
+
+        started = time.monotonic()
+        response = self.client.get("/cart/", headers={"Authorization": f"Bearer {token}"})
+
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body["partial"])
+        first, slow, missing = body["items"]
+        self.assertEqual(first, {"product_id": 1, "product": {"id": 1, "name": "Product 1"}})
+        self.assertEqual(slow, {"product_id": 2, "product": None, "product_error": "timeout"})
+        self.assertEqual(missing, {"product_id": 3, "product": None, "product_error": "not_found"})
+        self.assertEqual(orders.headers["Authorization"], f"Bearer {token}")
+
+
+class JSONAsyncProxyView(AsyncProxyView):
+    passthrough = False
+
+
+class AsyncProxyViewTests(StubUpstreamTestCase):
+    route = Route("product", ["product"], "product", timeout=(0.5, 0.2))
+
+    async def call(self, method, path, view=AsyncProxyView):
+        request = AsyncRequestFactory().generic(method, f"/product/{path}", b"{}", content_type="application/json")
+        try:
+            return await view.as_view()(request, route=self.route, path=path)
+        finally:
+            await async_upstream_pool.aclose()
+
+    async def test_connect_failure_is_503(self):
+        stub = StubUpstream()
+        stub.close()
+        self.use_stubs(stub)
+
+        response = await self.call("GET", "lamp")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.content), {"error": "Service unavailable"})
+
+    async def test_read_timeout_is_504(self):
+        self.use_stubs(StubUpstream(delay=1))
+
+        response = await self.call("GET", "lamp")
+
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(json.loads(response.content), {"error": "Service timeout"})
+
+    async def test_invalid_json_is_502_when_the_body_is_parsed(self):
+        # Shared GETs are relayed as buffered bytes; a write's reply is parsed.
+        self.use_stubs(StubUpstream(body=b"<html>oops</html>", response_headers={"Content-Type": "text/html"}))
+
+        response = await self.call("POST", "", view=JSONAsyncProxyView)
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(json.loads(response.content), {"error": "Invalid response from service"})
+
+
+class TracingTests(StubUpstreamTestCase):
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    parent_id = "00f067aa0ba902b7"
+
+    def setUp(self):
+        self.sink = RingBufferSink()
+        self.enterContext(mock.patch.object(tracer, "_sink", self.sink))
+        self.enterContext(override_settings(TRACING={**settings.TRACING, "SAMPLE_RATE": 1.0}))
+
+    def traceparent(self, flags="01"):
+        return f"00-{self.trace_id}-{self.parent_id}-{flags}"
+
+    def test_sampled_traceparent_is_continued_with_a_new_parent_id(self):
+        stub = StubUpstream()
+        self.use_stubs(stub)
+
+        response = self.client.get("/product/lamp", headers={"traceparent": self.traceparent()})
+
+        trace_id, parent_id, sampled = parse_traceparent(stub.headers["traceparent"])
+        self.assertEqual(trace_id, self.trace_id)
+        self.assertNotEqual(parent_id, self.parent_id)
+        self.assertTrue(sampled)
+        self.assertEqual(parse_traceparent(response["traceresponse"])[0], self.trace_id)
+        spans = {span["kind"]: span for span in self.sink.query()}
+        self.assertEqual(spans["server"]["parent_id"], self.parent_id)
+        self.assertEqual(spans["client"]["parent_id"], spans["server"]["span_id"])
+        self.assertEqual(spans["client"]["span_id"], parent_id)
+
+    def test_malformed_traceparent_starts_a_new_trace(self):
+        stub = StubUpstream()
+        self.use_stubs(stub)
+
+        headers = ("00-xyz-00f067aa0ba902b7-01", f"00-{'0' * 32}-{self.parent_id}-01", "garbage")
+        for number, header in enumerate(headers):
+            with self.subTest(header=header):
+                # A path per request, so none is answered from the response cache.
+                response = self.client.get(f"/product/lamp-{number}", headers={"traceparent": header})
+
+                trace_id, _, sampled = parse_traceparent(response["traceresponse"])
+                self.assertNotIn(trace_id, header)
+                self.assertTrue(sampled)
+                self.assertEqual(parse_traceparent(stub.headers["traceparent"])[0], trace_id)
+                self.assertIsNone(self.sink.query(trace_id=trace_id)[-1]["parent_id"])
+
+    def test_unsampled_requests_record_no_spans_but_propagate_the_trace(self):
+        stub = StubUpstream()
+        self.use_stubs(stub)
+
+        self.client.get("/product/lamp", headers={"traceparent": self.traceparent("00")})
+        self.assertEqual(parse_traceparent(stub.headers["traceparent"])[:3:2], (self.trace_id, False))
+
+        self.enterContext(override_settings(TRACING={**settings.TRACING, "SAMPLE_RATE": 0.0}))
+        response = self.client.get("/product/desk")
+        trace_id, _, sampled = parse_traceparent(stub.headers["traceparent"])
+        self.assertFalse(sampled)
+        self.assertEqual(parse_traceparent(response["traceresponse"])[0], trace_id)
+
+        self.assertEqual(self.sink.query(), [])
+
+    def test_fan_out_calls_carry_the_trace(self):
+        cart = {"id": 1, "items": [{"product_id": 1}, {"product_id": 2}, {"product_id": 3}]}
+        orders = StubUpstream(body=json.dumps(cart).encode(), response_headers={"Content-Type": "application/json"})
+        catalog = CatalogStub()
+        self.use_stubs(orders, service="order")
+        self.use_stubs(catalog)
+
+        response = self.client.get(
+            "/cart/", headers={"Authorization": f"Bearer {access_token()}", "traceparent": self.traceparent()}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        contexts = [parse_traceparent(headers["traceparent"]) for headers in catalog.received_headers]
+        self.assertEqual(len(contexts), 3)
+        self.assertEqual({trace_id for trace_id, _, _ in contexts}, {self.trace_id})
+        # Each product call is its own client span.
+        self.assertEqual(len({parent_id for _, parent_id, _ in contexts}), 3)
+
+    @mock.patch("routing.balancer.random.sample", in_order)
+    def test_hedged_attempts_carry_the_trace(self):
+        slow, fast = StubUpstream(delay=0.5), StubUpstream()
+        self.use_stubs(slow, fast)
+        self.enterContext(override_settings(GATEWAY_HEDGING={
+            **settings.GATEWAY_HEDGING, "ENABLED": True, "SERVICES": ["product"],
+            "PERCENTILE": 0.95, "MIN_SAMPLES": 50, "MIN_DELAY": 0.01,
+        }))
+        for _ in range(50):
+            hedging.record("product", 0.05)
+
+        with tracer.start(self.traceparent(), "test"):
+            upstream_pool.request("product", "GET", "/api/lamp")
+
+        self.assertEqual((slow.hits, fast.hits), (1, 1))
+        for stub in (slow, fast):
+            self.assertEqual(parse_traceparent(stub.headers["traceparent"])[0], self.trace_id)
@@ -0,0 +1,44 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from shared.utils.tracing import tracer
+
+
+class TracingMiddleware:
+    """
+    Starts the trace for each gateway request, or continues the caller's
+    traceparent, and returns it in a traceresponse header. Upstream calls made
+    while handling the request get client spans and carry the traceparent on.
+    Unsampled requests still propagate the trace id, flagged as not sampled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        return tracer.start(
+            request.META.get("HTTP_TRACEPARENT"),
+            f"{request.method} {request.path}",
+            attributes={"http.method": request.method, "http.target": request.get_full_path()},
+        )
+
+    def _finish(self, root, response):
+        root.set("http.status_code", response.status_code)
+        response["traceresponse"] = root.traceparent
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        root = self._start(request)
+        with root:
+            return self._finish(root, self.get_response(request))
+
+    async def __acall__(self, request):
+        root = self._start(request)
+        with root:
+            return self._finish(root, await self.get_response(request))
@@ -0,0 +1,438 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http import cookiejar
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from django.conf import settings
+from shared.utils.tracing import inject, span
+
+from .balancer import upstream_balancers
+from .breaker import upstream_health
+from .hedging import IDEMPOTENT_METHODS, hedging
+from .metrics import current_timer
+from .ratelimit import admission, async_admission
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """
+    Counters for one upstream pool. A request is counted as saturated when it
+    starts while every pooled connection is already in use.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+        self.saturated = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            if self.in_flight > self.peak:
+                self.peak = self.in_flight
+            if self.in_flight > self.maxsize:
+                self.saturated += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "pool_size": self.maxsize,
+                "in_flight": self.in_flight,
+                "peak": self.peak,
+                "requests": self.requests,
+                "saturated": self.saturated,
+            }
+
+
+class _TimedConnect:
+    """Reports connection setup (TCP and TLS) to the request timer; reused connections report nothing."""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        timer = current_timer()
+        if timer is not None:
+            timer.connected(time.perf_counter() - started)
+
+
+class TimedHTTPConnection(_TimedConnect, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnect, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools time new connections, the sync counterpart of the httpx trace hook."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+class UpstreamPool:
+    """
+    Per-process registry of keep-alive sessions, one per upstream service.
+    Sessions are created lazily and shared by every proxy view in the process.
+    Callers pass a path; each call is sent to the service instance picked by
+    its load balancer. Every call is admitted by the gateway-wide admission
+    controller and by the service's circuit breaker and bulkhead, and its
+    outcome is fed back to the breaker and the balancer.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._stats = {}
+        self._hedge_executor = None
+        self._hedge_slots = None
+        self._lock = threading.Lock()
+
+    def _build_session(self, service):
+        size = settings.UPSTREAM_POOL_SIZE
+        session = requests.Session()
+        # Never carry cookies set by one client's upstream call into another's.
+        session.cookies.set_policy(cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        # Upstreams answer uncompressed; the gateway negotiates encoding with the client.
+        session.headers["Accept-Encoding"] = "identity"
+        # One connection pool per instance, so none is evicted while the others are in use.
+        instances = max(1, len(upstream_balancers.get(service).instances))
+        adapter = TimedHTTPAdapter(pool_connections=instances, pool_maxsize=size, pool_block=False)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session(self, service):
+        session = self._sessions.get(service)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(service)
+                if session is None:
+                    session = self._build_session(service)
+                    self._stats[service] = PoolStats(settings.UPSTREAM_POOL_SIZE)
+                    self._sessions[service] = session
+        return session
+
+    def timeout(self, service):
+        return settings.UPSTREAM_TIMEOUTS.get(service, settings.UPSTREAM_DEFAULT_TIMEOUT)
+
+    def request(self, service, method, path, timeout=None, **kwargs):
+        """
+        Send one call to `service`. Idempotent calls that fail to connect are
+        retried on another instance. For services with hedging enabled, a
+        duplicate is sent to another instance once the call has run past the
+        service's recent tail latency, and the first response wins.
+        """
+        if method not in IDEMPOTENT_METHODS:
+            return self._send(service, method, path, timeout, set(), **kwargs)
+        hedging.budget(service).deposit()
+        delay = hedging.hedge_delay(service)
+        if delay is not None:
+            executor, slots = self._hedge_pool()
+            if slots.acquire(blocking=False):
+                return self._hedged(executor, slots, delay, service, method, path, timeout, **kwargs)
+        return self._send_retrying(service, method, path, timeout, set(), **kwargs)
+
+    def _send(self, service, method, path, timeout, tried, **kwargs):
+        session = self.session(service)
+        stats = self._stats[service]
+        balancer = upstream_balancers.get(service)
+        admission.acquire()
+        try:
+            upstream_health.admit(service)
+            # Set once the call is made; a slot freed without one records no outcome.
+            failed = latency = None
+            try:
+                stats.acquire()
+                try:
+                    instance = balancer.acquire(exclude=tried)
+                    tried.add(instance.url)
+                    started = time.monotonic()
+                    failed = True
+                    client_span = span(
+                        f"{method} {service}", kind="client", attributes={"upstream.instance": instance.url}
+                    )
+                    try:
+                        with client_span:
+                            headers = inject(dict(kwargs.pop("headers", None) or {}), client_span)
+                            response = session.request(
+                                method, f"{instance.url}{path}",
+                                headers=headers, timeout=timeout or self.timeout(service), **kwargs
+                            )
+                            client_span.set("http.status_code", response.status_code)
+                        failed = response.status_code >= 500
+                        return response
+                    finally:
+                        latency = time.monotonic() - started
+                        balancer.release(instance, failed, latency)
+                        if not failed:
+                            hedging.record(service, latency)
+                finally:
+                    stats.release()
+            finally:
+                upstream_health.release(service, failed, latency)
+        finally:
+            admission.release()
+
+    def _send_retrying(self, service, method, path, timeout, tried, **kwargs):
+        for _ in range(settings.GATEWAY_RETRY_BUDGET["MAX_RETRIES"]):
+            try:
+                return self._send(service, method, path, timeout, tried, **kwargs)
+            except requests.exceptions.ConnectionError:
+                if not hedging.budget(service).try_spend("retries"):
+                    raise
+                logger.info(f"Retrying {method} {service}{path} after a connection error")
+        return self._send(service, method, path, timeout, tried, **kwargs)
+
+    def _hedge_pool(self):
+        if self._hedge_executor is None:
+            with self._lock:
+                if self._hedge_executor is None:
+                    workers = settings.GATEWAY_HEDGING["WORKERS"]
+                    self._hedge_slots = threading.BoundedSemaphore(workers)
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=workers, thread_name_prefix="gateway-hedge"
+                    )
+        return self._hedge_executor, self._hedge_slots
+
+    def _hedged(self, executor, slots, delay, service, method, path, timeout, **kwargs):
+        # Both attempts run on the hedge pool so this thread can take whichever
+        # answers first. A losing attempt cannot be interrupted mid-read with
+        # requests; its response is closed as soon as it arrives.
+        tried = set()
+        budget = hedging.budget(service)
+
+        def attempt():
+            try:
+                return self._send_retrying(service, method, path, timeout, tried, **kwargs)
+            finally:
+                slots.release()
+
+        primary = executor.submit(contextvars.copy_context().run, attempt)
+        pending = {primary}
+        done, _ = wait(pending, timeout=delay)
+        if not done and slots.acquire(blocking=False):
+            if budget.try_spend("hedges"):
+                pending.add(executor.submit(contextvars.copy_context().run, attempt))
+            else:
+                slots.release()
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.exception() is None), None)
+            if winner is not None:
+                if winner is not primary:
+                    budget.hedge_wins += 1
+                for loser in (done | pending) - {winner}:
+                    loser.add_done_callback(_close_loser)
+                return winner.result()
+        return primary.result()
+
+    def stats(self):
+        return {service: stats.as_dict() for service, stats in list(self._stats.items())}
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._stats.clear()
+
+
+class AsyncUpstreamPool:
+    """
+    Async counterpart of UpstreamPool backed by httpx. Clients are bound to the
+    event loop that created them, so one client is kept per service per loop.
+    Sync callers run async views on the shared fan-out loop rather than on a
+    loop of their own, so the set of loops, and of clients, stays small.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _build_client(self, service):
+        connect, read = self.timeout(service)
+        return httpx.AsyncClient(
+            headers={"Accept-Encoding": "identity"},
+            timeout=httpx.Timeout(read, connect=connect, pool=connect),
+            limits=httpx.Limits(
+                max_connections=settings.UPSTREAM_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.UPSTREAM_POOL_SIZE,
+            ),
+        )
+
+    def client(self, service):
+        loop = asyncio.get_running_loop()
+        clients = self._clients.get(loop)
+        if clients is None:
+            with self._lock:
+                clients = self._clients.setdefault(loop, {})
+        client = clients.get(service)
+        if client is None:
+            client = clients[service] = self._build_client(service)
+            with self._lock:
+                self._stats.setdefault(service, PoolStats(settings.UPSTREAM_ASYNC_MAX_CONNECTIONS))
+        return client
+
+    def timeout(self, service):
+        return settings.UPSTREAM_TIMEOUTS.get(service, settings.UPSTREAM_DEFAULT_TIMEOUT)
+
+    async def request(self, service, method, path, stream=False, **kwargs):
+        """Same retry and hedging rules as UpstreamPool.request; the losing attempt is cancelled."""
+        if method not in IDEMPOTENT_METHODS:
+            return await self._send(service, method, path, stream, set(), **kwargs)
+        hedging.budget(service).deposit()
+        delay = hedging.hedge_delay(service)
+        if delay is None:
+            return await self._send_retrying(service, method, path, stream, set(), **kwargs)
+        return await self._hedged(delay, service, method, path, stream, **kwargs)
+
+    async def _send(self, service, method, path, stream, tried, **kwargs):
+        client = self.client(service)
+        stats = self._stats[service]
+        balancer = upstream_balancers.get(service)
+        await async_admission.acquire()
+        try:
+            upstream_health.admit(service)
+            failed = latency = None
+            try:
+                stats.acquire()
+                try:
+                    instance = balancer.acquire(exclude=tried)
+                    tried.add(instance.url)
+                    started = time.monotonic()
+                    failed = True
+                    cancelled = False
+                    client_span = span(
+                        f"{method} {service}", kind="client", attributes={"upstream.instance": instance.url}
+                    )
+                    try:
+                        with client_span:
+                            headers = inject(dict(kwargs.pop("headers", None) or {}), client_span)
+                            request = client.build_request(method, f"{instance.url}{path}", headers=headers, **kwargs)
+                            response = await client.send(request, stream=stream)
+                            client_span.set("http.status_code", response.status_code)
+                        failed = response.status_code >= 500
+                        return response
+                    except asyncio.CancelledError:
+                        # A cancelled hedge says nothing about the instance's health.
+                        failed = False
+                        cancelled = True
+                        raise
+                    finally:
+                        latency = time.monotonic() - started
+                        balancer.release(instance, failed, latency)
+                        if not failed and not cancelled:
+                            hedging.record(service, latency)
+                finally:
+                    stats.release()
+            finally:
+                upstream_health.release(service, failed, latency)
+        finally:
+            await async_admission.release()
+
+    async def _send_retrying(self, service, method, path, stream, tried, **kwargs):
+        for _ in range(settings.GATEWAY_RETRY_BUDGET["MAX_RETRIES"]):
+            try:
+                return await self._send(service, method, path, stream, tried, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if not hedging.budget(service).try_spend("retries"):
+                    raise
+                logger.info(f"Retrying {method} {service}{path} after a connection error")
+        return await self._send(service, method, path, stream, tried, **kwargs)
+
+    async def _hedged(self, delay, service, method, path, stream, **kwargs):
+        tried = set()
+        budget = hedging.budget(service)
+        primary = asyncio.ensure_future(self._send_retrying(service, method, path, stream, tried, **kwargs))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and budget.try_spend("hedges"):
+                pending.add(asyncio.ensure_future(
+                    self._send_retrying(service, method, path, stream, tried, **kwargs)
+                ))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if winner is not primary:
+                        budget.hedge_wins += 1
+                    for loser in done - {winner}:
+                        if loser.exception() is None:
+                            await loser.result().aclose()
+                    return winner.result()
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        return {service: stats.as_dict() for service, stats in list(self._stats.items())}
+
+    async def aclose(self):
+        """Close the running loop's clients."""
+        with self._lock:
+            clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+    def close(self):
+        """
+        Close every loop's clients on the loop they belong to. Must not be
+        called from a running loop; use aclose() there. Clients of loops that
+        are already closed can no longer be shut down cleanly and are dropped.
+        """
+        with self._lock:
+            loops = list(self._clients.keys())
+        for loop in loops:
+            if loop.is_closed():
+                with self._lock:
+                    self._clients.pop(loop, None)
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+            else:
+                loop.run_until_complete(self.aclose())
+        with self._lock:
+            self._stats.clear()
+
+
+def _close_loser(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+upstream_pool = UpstreamPool()
+async_upstream_pool = AsyncUpstreamPool()
@@ -1,10 +1,25 @@
+from django.conf import settings
 from django.urls import path, re_path
-from .views import UserServiceProxy, ProductServiceProxy, OrderServiceProxy, HealthCheckView
+from shared.utils.tracing import TraceView
+from .routes import load_routes, proxy_routes
+from .views import (
+    AsyncProxyView,
+    ProxyView,
+    BatchView,
+    EnrichedCartView,
+    HealthCheckView,
+    MetricsView,
+)
+
+proxy_view = AsyncProxyView if settings.GATEWAY_ASYNC_PROXY else ProxyView
 
 urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='health-check'),
+    re_path(r'^metrics/?$', MetricsView.as_view(), name='metrics'),
+    path('traces/', TraceView.as_view(), name='traces'),
+    path('cart/', EnrichedCartView.as_view(), name='enriched-cart'),
+    path('batch', BatchView.as_view(), name='batch'),
 
-    re_path(r'^user/(?P<path>.*)$', UserServiceProxy.as_view(), name='user-service'),
-    re_path(r'^product(?:s)?/(?P<path>.*)$', ProductServiceProxy.as_view(), name='product-service'),
-    re_path(r'^order/(?P<path>.*)$', OrderServiceProxy.as_view(), name='order-service'),
+    # Every route in settings.GATEWAY_ROUTES, matched through one prefix trie.
+    proxy_routes(load_routes(), proxy_view.as_view(), name='proxy'),
 ]
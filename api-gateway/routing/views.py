@@ -1,36 +1,179 @@
 import requests
+import httpx
 import re
 import logging
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
 from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from .aggregation import enriched_cart
+from .balancer import upstream_balancers
+from .batch import BatchItemError, run_batch, validate_items
+from .authentication import (
+    EdgeJWTAuthentication,
+    authenticate_header,
+    edge_authentication,
+    verified_tokens,
+)
+from .breaker import UpstreamUnavailable, upstream_health
+from .cache import BufferedResponse, is_storable, response_cache
+from .hedging import hedging
+from .metrics import RequestTimer, gauge_lines, metrics
+from .ratelimit import admission, async_admission, client_identity, rate_limiter
+from .singleflight import single_flight, async_single_flight
+from .upstream import upstream_pool, async_upstream_pool
+from .streaming import (
+    RequestBodyStream,
+    abuffer_raw,
+    aiter_request_body,
+    async_passthrough_response,
+    body_headers,
+    buffer_raw,
+    conditional_headers,
+    content_length,
+    is_chunked,
+    iter_unsized_body,
+    passthrough_response,
+)
 
 logger = logging.getLogger(__name__)
 
+# Characters allowed in a forwarded path; anything else, including the ':'
+# of an absolute URL, is rejected.
+SAFE_PATH = re.compile(r'[a-zA-Z0-9/_.-]*')
 
-class ProxyView(APIView):
+
+def is_buffered(entry):
+    return isinstance(entry, BufferedResponse)
+
+
+class ProxyMixin:
     """
-    Base class that forwards HTTP requests to backend microservices.
-    Each subclass sets its own service_url to route to different services.
+    Routing state and path validation shared by the sync and async proxies.
+    Every proxied request is resolved to a Route from settings.GATEWAY_ROUTES,
+    which supplies the upstream service and the route's timeout, auth, cache
+    and rate limit policies.
+    With passthrough enabled, bodies are streamed as raw bytes in both
+    directions; subclasses that need to inspect the payload turn it off to
+    get parsed JSON instead. Cacheable routes answer anonymous GETs from
+    the gateway response cache and invalidate it on writes. Identical
+    concurrent GETs share a single upstream call.
     """
-    service_url = None
-    permission_classes = [AllowAny]
+    route = None
+    service_name = None
+    passthrough = True
+    cacheable = False
+
+    FORWARDED_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+    def _set_route(self, kwargs):
+        self.route = kwargs.pop('route')
+        self.service_name = self.route.upstream
+        self.cacheable = self.route.cacheable
+
+    def _target_path(self, request, path):
+        target_path = f"/api/{path}"
+        query_string = request.META.get('QUERY_STRING')
+        if self.passthrough and request.method == 'GET' and query_string:
+            target_path = f"{target_path}?{query_string}"
+        return target_path
+
+    def _is_configured(self):
+        return bool(upstream_balancers.get(self.service_name).instances)
+
+    def _cache_key(self, request, path):
+        if not self.cacheable or request.method != 'GET' or request.META.get('HTTP_AUTHORIZATION'):
+            return None
+        return response_cache.key_for(self.service_name, path, request.META.get('QUERY_STRING', ''))
+
+    def _flight_key(self, request, path):
+        # Only anonymous reads are coalesced: those are the ones many clients
+        # repeat, while an authenticated response is private to its caller
+        # and is streamed instead of buffered. Conditional reads are sent on
+        # their own, so the upstream sees the client's preconditions.
+        config = settings.GATEWAY_SINGLE_FLIGHT
+        if not config["ENABLED"] or request.method != 'GET' or request.META.get('HTTP_AUTHORIZATION'):
+            return None
+        if conditional_headers(request.META):
+            return None
+        query = response_cache.normalize_query(request.META.get('QUERY_STRING', ''))
+        return f"{self.service_name}:{path}?{query}"
+
+    def _buffer(self, cache_key, status_code, headers, body):
+        entry = BufferedResponse.from_upstream(status_code, headers, body)
+        if cache_key and is_storable(status_code, headers):
+            response_cache.set(cache_key, entry)
+        return entry
+
+    def _from_buffer(self, request, entry, cache_status):
+        """
+        Build the client response for a cached or shared upstream result, or
+        pass on the streamed response a fetch returned for a body too large
+        to buffer. The shared call is made unconditionally, so the client's
+        own If-None-Match / If-Modified-Since are evaluated here against the
+        response's validators.
+        """
+        if isinstance(entry, BufferedResponse):
+            response = entry.as_response(
+                cache_status=cache_status, accept_encoding=request.META.get('HTTP_ACCEPT_ENCODING')
+            )
+        else:
+            response = entry
+        conditional = get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(response.get('Last-Modified')),
+            response=response,
+        )
+        if conditional is not response:
+            response.close()
+        return conditional
+
+    def _cache_invalidate(self, request, path):
+        if self.cacheable and request.method in ('POST', 'PUT', 'PATCH', 'DELETE'):
+            collections = self.route.invalidates
+            if path.strip('/') in self.route.bulk_writes:
+                # Any resource of the route may have changed; "" drops everything under it.
+                collections = (*collections, "")
+            response_cache.invalidate(self.service_name, path, collections)
 
     def _is_safe_path(self, path):
-        if not path:
-            return True
-        if '..' in path or path.startswith('/'):
-            return False
-        if any(prefix in path.lower() for prefix in ['http://', 'https://', 'ftp://']):
-            return False
-        if not re.match(r'^[a-zA-Z0-9/_.-]+$', path):
-            return False
-        return True
+        return not path or (
+            SAFE_PATH.fullmatch(path) is not None and '..' not in path and not path.startswith('/')
+        )
+
+
+class ProxyView(ProxyMixin, APIView):
+    """
+    Forwards HTTP requests to backend microservices, one view for every
+    configured route. Bearer tokens are verified at the edge, so invalid ones
+    never reach a backend service, and routes with auth_required reject
+    anonymous callers here.
+    """
+    authentication_classes = [EdgeJWTAuthentication]
+    permission_classes = [AllowAny]
+
+    def get_permissions(self):
+        if self.route.auth_required:
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
+    def dispatch(self, request, *args, **kwargs):
+        self._set_route(kwargs)
+        self.timer = RequestTimer(self.route.name, self.service_name)
+        with self.timer:
+            response = super().dispatch(request, *args, **kwargs)
+        return self.timer.finish(response)
 
     def forward_request(self, request, path=""):
-        if not self.service_url:
+        if not self._is_configured():
             return Response(
                 {"error": "Service URL not configured"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -43,55 +186,111 @@ class ProxyView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        target_url = f"{self.service_url}/api/{path}"
+        target_path = self._target_path(request, path)
 
         headers = {}
         if request.auth:
             headers['Authorization'] = request.META.get('HTTP_AUTHORIZATION', '')
 
+        retry_after = rate_limiter.check(
+            self.route.name, client_identity(request.META, request.auth), self.route.rate_limit
+        )
+        if retry_after:
+            return Response(
+                {"error": "Too many requests"},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(retry_after)}
+            )
+
+        if request.method not in self.FORWARDED_METHODS:
+            return Response(
+                {"error": "Method not allowed"},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED
+            )
+
+        kwargs = {'headers': headers}
+        if self.passthrough:
+            if request.method in ('POST', 'PUT', 'PATCH'):
+                length = content_length(request.META)
+                headers.update(body_headers(request.META))
+                if length:
+                    kwargs['data'] = RequestBodyStream(request.stream, length)
+                elif is_chunked(request.META):
+                    if not request.META.get('wsgi.input_terminated'):
+                        return Response(
+                            {"error": "Length required"},
+                            status=status.HTTP_411_LENGTH_REQUIRED
+                        )
+                    # Forwarded with chunked framing, as it arrived.
+                    kwargs['data'] = iter_unsized_body(request.META)
+                else:
+                    kwargs['data'] = b''
+        elif request.method == 'GET':
+            kwargs['params'] = request.query_params
+        elif request.method in ('POST', 'PUT', 'PATCH'):
+            kwargs['data'] = request.data
+
+        cache_key = self._cache_key(request, path)
+        if cache_key:
+            cached = response_cache.get(cache_key)
+            if cached:
+                self.timer.cache = "hit"
+                return self._from_buffer(request, cached, "HIT")
+            self.timer.cache = "miss"
+
+        flight_key = self._flight_key(request, path)
+
         try:
-            if request.method == 'GET':
-                response = requests.get(
-                    target_url,
-                    params=request.query_params,
-                    headers=headers,
-                    timeout=30
-                )
-            elif request.method == 'POST':
-                response = requests.post(
-                    target_url,
-                    data=request.data,
-                    headers=headers,
-                    timeout=30
-                )
-            elif request.method == 'PUT':
-                response = requests.put(
-                    target_url,
-                    data=request.data,
-                    headers=headers,
-                    timeout=30
-                )
-            elif request.method == 'DELETE':
-                response = requests.delete(
-                    target_url,
-                    headers=headers,
-                    timeout=30
-                )
-            else:
-                return Response(
-                    {"error": "Method not allowed"},
-                    status=status.HTTP_405_METHOD_NOT_ALLOWED
-                )
+            if cache_key or flight_key:
+                def fetch():
+                    self.timer.upstream_start()
+                    response = upstream_pool.request(
+                        self.service_name, request.method, target_path,
+                        timeout=self.route.timeout, stream=True, **kwargs
+                    )
+                    self.timer.headers_received()
+                    body, chunks = buffer_raw(response, settings.GATEWAY_CACHE["MAX_ENTRY_BYTES"])
+                    if body is None:
+                        # Too large to cache or share; only this caller gets it, streamed.
+                        return passthrough_response(response, chunks)
+                    self.timer.body_received()
+                    return self._buffer(cache_key, response.status_code, response.headers, body)
+
+                if flight_key:
+                    entry = single_flight.do(
+                        flight_key, fetch, settings.GATEWAY_SINGLE_FLIGHT["WAIT_TIMEOUT"], shareable=is_buffered
+                    )
+                else:
+                    entry = fetch()
+                return self._from_buffer(request, entry, "MISS" if cache_key else None)
+
+            headers.update(conditional_headers(request.META))
+            self.timer.upstream_start()
+            response = upstream_pool.request(
+                self.service_name, request.method, target_path,
+                timeout=self.route.timeout, stream=self.passthrough, **kwargs
+            )
+            self.timer.headers_received()
+            self._cache_invalidate(request, path)
+
+            if self.passthrough:
+                return passthrough_response(response)
 
             try:
                 data = response.json() if response.content else {}
             except ValueError:
-                logger.error(f"Invalid JSON from {target_url}")
+                logger.error(f"Invalid JSON from {self.service_name} {target_path}")
                 data = {"error": "Invalid response from service"}
                 return Response(data, status=status.HTTP_502_BAD_GATEWAY)
 
             return Response(data, status=response.status_code)
 
+        except UpstreamUnavailable as e:
+            return Response(
+                {"error": "Service unavailable"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(e.retry_after)}
+            )
         except requests.exceptions.ConnectionError:
             return Response(
                 {"error": "Service unavailable"},
@@ -117,29 +316,247 @@ class ProxyView(APIView):
     def put(self, request, path=""):
         return self.forward_request(request, path)
 
+    def patch(self, request, path=""):
+        return self.forward_request(request, path)
+
     def delete(self, request, path=""):
         return self.forward_request(request, path)
 
 
-class UserServiceProxy(ProxyView):
-    """Routes requests to the User Authentication Service"""
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.service_url = settings.USER_SERVICE_URL
+class AsyncProxyView(ProxyMixin, View):
+    """
+    Non-blocking counterpart of ProxyView for ASGI deployments. Upstream calls
+    are awaited on a shared httpx client, so a slow service does not hold a
+    worker thread while it responds. Bearer tokens are verified, and
+    auth_required enforced, the same way as in ProxyView.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self._set_route(kwargs)
+        self.timer = RequestTimer(self.route.name, self.service_name)
+        response = await super().dispatch(request, *args, **kwargs)
+        return self.timer.finish(response)
+
+    async def forward_request(self, request, path=""):
+        if not self._is_configured():
+            return JsonResponse(
+                {"error": "Service URL not configured"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        if not self._is_safe_path(path):
+            logger.warning(f"Blocked unsafe path: {path}")
+            return JsonResponse(
+                {"error": "Invalid request path"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        target_path = self._target_path(request, path)
+
+        headers = {}
+        try:
+            token = authenticate_header(request.headers.get('Authorization'))
+        except AuthenticationFailed as e:
+            detail = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+            response = JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED)
+            response['WWW-Authenticate'] = edge_authentication.authenticate_header(request)
+            return response
+        if token is not None:
+            headers['Authorization'] = request.headers['Authorization']
+        elif self.route.auth_required:
+            response = JsonResponse(
+                {"detail": NotAuthenticated.default_detail},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+            response['WWW-Authenticate'] = edge_authentication.authenticate_header(request)
+            return response
+
+        retry_after = rate_limiter.check(
+            self.route.name, client_identity(request.META, token), self.route.rate_limit
+        )
+        if retry_after:
+            response = JsonResponse(
+                {"error": "Too many requests"},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response["Retry-After"] = str(retry_after)
+            return response
+
+        if request.method not in self.FORWARDED_METHODS:
+            return JsonResponse(
+                {"error": "Method not allowed"},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED
+            )
+
+        kwargs = {'headers': headers, 'extensions': {'trace': self.timer.trace}}
+        if self.route.timeout:
+            connect, read = self.route.timeout
+            kwargs['timeout'] = httpx.Timeout(read, connect=connect, pool=connect)
+        if request.method == 'GET' and not self.passthrough:
+            kwargs['params'] = [(key, value) for key, values in request.GET.lists() for value in values]
+        elif request.method in ('POST', 'PUT', 'PATCH'):
+            length = content_length(request.META)
+            headers.update(body_headers(request.META))
+            if self.passthrough and length:
+                headers['Content-Length'] = str(length)
+                kwargs['content'] = aiter_request_body(request)
+            else:
+                kwargs['content'] = request.body
+
+        cache_key = self._cache_key(request, path)
+        if cache_key:
+            cached = response_cache.get(cache_key)
+            if cached:
+                self.timer.cache = "hit"
+                return self._from_buffer(request, cached, "HIT")
+            self.timer.cache = "miss"
+
+        flight_key = self._flight_key(request, path)
+
+        try:
+            if cache_key or flight_key:
+                async def fetch():
+                    self.timer.upstream_start()
+                    response = await async_upstream_pool.request(
+                        self.service_name, request.method, target_path, stream=True, **kwargs
+                    )
+                    self.timer.headers_received()
+                    body, chunks = await abuffer_raw(response, settings.GATEWAY_CACHE["MAX_ENTRY_BYTES"])
+                    if body is None:
+                        # Too large to cache or share; only this caller gets it, streamed.
+                        return async_passthrough_response(response, chunks)
+                    self.timer.body_received()
+                    return self._buffer(cache_key, response.status_code, response.headers, body)
+
+                if flight_key:
+                    entry = await async_single_flight.do(
+                        flight_key, fetch, settings.GATEWAY_SINGLE_FLIGHT["WAIT_TIMEOUT"], shareable=is_buffered
+                    )
+                else:
+                    entry = await fetch()
+                return self._from_buffer(request, entry, "MISS" if cache_key else None)
+
+            headers.update(conditional_headers(request.META))
+            self.timer.upstream_start()
+            response = await async_upstream_pool.request(
+                self.service_name, request.method, target_path, stream=self.passthrough, **kwargs
+            )
+            self.timer.headers_received()
+            self._cache_invalidate(request, path)
+
+            if self.passthrough:
+                return async_passthrough_response(response)
+
+            try:
+                data = response.json() if response.content else {}
+            except ValueError:
+                logger.error(f"Invalid JSON from {self.service_name} {target_path}")
+                data = {"error": "Invalid response from service"}
+                return JsonResponse(data, status=status.HTTP_502_BAD_GATEWAY)
+
+            return JsonResponse(data, status=response.status_code, safe=False)
+
+        except UpstreamUnavailable as e:
+            response = JsonResponse(
+                {"error": "Service unavailable"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response["Retry-After"] = str(e.retry_after)
+            return response
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            return JsonResponse(
+                {"error": "Service unavailable"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except httpx.TimeoutException:
+            return JsonResponse(
+                {"error": "Service timeout"},
+                status=status.HTTP_504_GATEWAY_TIMEOUT
+            )
+        except Exception as e:
+            return JsonResponse(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    async def get(self, request, path=""):
+        return await self.forward_request(request, path)
+
+    async def post(self, request, path=""):
+        return await self.forward_request(request, path)
 
+    async def put(self, request, path=""):
+        return await self.forward_request(request, path)
 
-class ProductServiceProxy(ProxyView):
-    """Routes requests to the Product Catalog Service"""
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.service_url = settings.PRODUCT_SERVICE_URL
+    async def patch(self, request, path=""):
+        return await self.forward_request(request, path)
+
+    async def delete(self, request, path=""):
+        return await self.forward_request(request, path)
+
+
+class EnrichedCartView(APIView):
+    """
+    The caller's cart with catalog details for every line item, fetched
+    concurrently so the page needs one gateway round-trip instead of N+1.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        status_code, data = enriched_cart(request.META['HTTP_AUTHORIZATION'])
+        return Response(data, status=status_code)
 
 
-class OrderServiceProxy(ProxyView):
-    """Routes requests to the Order Management Service"""
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.service_url = settings.ORDER_SERVICE_URL
+class BatchView(APIView):
+    """
+    Runs a list of sub-requests concurrently through the regular proxy routes
+    and returns their statuses and bodies in order, so a client on a slow
+    link can replace many round-trips with one.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        config = settings.GATEWAY_BATCH
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        try:
+            validate_items(items, ProxyMixin.FORWARDED_METHODS, config["MAX_SIZE"])
+        except BatchItemError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = run_batch(request, items, ProxyMixin, config["MAX_CONCURRENCY"])
+        return Response({"responses": results})
+
+
+class MetricsView(APIView):
+    """Prometheus text exposition of gateway histograms, counters and component gauges."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        lines = metrics.render()
+        lines += gauge_lines("gateway_upstream_pool", upstream_pool.stats())
+        lines += gauge_lines("gateway_async_upstream_pool", async_upstream_pool.stats())
+        for service, instances in upstream_balancers.stats().items():
+            lines += gauge_lines("gateway_upstream_instance", instances, label="instance", service=service)
+        lines += gauge_lines("gateway_circuit_breaker", upstream_health.stats())
+        lines += gauge_lines("gateway_hedging", hedging.stats())
+        lines += gauge_lines("gateway_cache", {"product": response_cache.stats()})
+        lines += gauge_lines("gateway_single_flight", {
+            "sync": single_flight.stats(),
+            "async": async_single_flight.stats(),
+        })
+        lines += gauge_lines("gateway_admission", {
+            "sync": admission.stats(),
+            "async": async_admission.stats(),
+        })
+        lines += gauge_lines("gateway_rate_limited", {
+            route: {"requests": count} for route, count in rate_limiter.stats()["limited"].items()
+        })
+        lines += gauge_lines("gateway_verified_tokens", {"edge": verified_tokens.stats()})
+        return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
 
 
 class HealthCheckView(APIView):
@@ -147,7 +564,23 @@ class HealthCheckView(APIView):
 
     def get(self, request):
         return Response({
-            "status": "healthy",
+            "status": "degraded" if upstream_health.is_open() else "healthy",
             "service": "api-gateway",
-            "version": "1.0.0"
+            "version": "1.0.0",
+            "upstreams": upstream_pool.stats(),
+            "instances": upstream_balancers.stats(),
+            "hedging": hedging.stats(),
+            "async_upstreams": async_upstream_pool.stats(),
+            "circuit_breakers": upstream_health.stats(),
+            "cache": response_cache.stats(),
+            "verified_tokens": verified_tokens.stats(),
+            "rate_limits": rate_limiter.stats(),
+            "admission": {
+                "sync": admission.stats(),
+                "async": async_admission.stats(),
+            },
+            "single_flight": {
+                "sync": single_flight.stats(),
+                "async": async_single_flight.stats(),
+            },
         })
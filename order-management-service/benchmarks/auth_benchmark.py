@@ -0,0 +1,90 @@
+"""
+Authenticated cart reads with simplejwt's JWTAuthentication, which loads the
+user row on every request, and with StatelessJWTAuthentication, which builds
+the user from the token's claims. Prints queries per request and latency.
+Uses a throwaway test database.
+
+    DEBUG=False DB_ENGINE=sqlite python benchmarks/auth_benchmark.py --requests 5000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def run(label, authentication_class, authorization, requests):
+    from django.db import connection, reset_queries
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+
+    from orders.views import CartView
+
+    view = CartView.as_view(authentication_classes=[authentication_class])
+    factory = RequestFactory()
+
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        response = view(factory.get("/api/order/", HTTP_AUTHORIZATION=authorization))
+        response.render()
+    assert response.status_code == 200, response.data
+    user_queries = sum("auth_user" in query["sql"] for query in queries)
+
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        view(factory.get("/api/order/", HTTP_AUTHORIZATION=authorization)).render()
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    print(
+        f"{label:>9}: {len(queries)} queries/request ({user_queries} on auth_user)  "
+        f"p50 {statistics.median(latencies) * 1000:6.3f} ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.3f} ms  "
+        f"{len(latencies) / sum(latencies):7.0f} req/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=5, help="line items in the cart")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "order_management_service.settings")
+    import django
+
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from orders.models import Order, OrderItem
+    from shared.auth.authentication import StatelessJWTAuthentication
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        # The stateful class needs a local user row to find; the order
+        # service has none in production.
+        user = User.objects.create(username="benchmark")
+        order = Order.objects.create(user_id=user.id)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product_id=i, quantity=1, price="9.99") for i in range(args.items)
+        )
+        authorization = f"Bearer {AccessToken.for_user(user)}"
+        print(f"{args.requests} cart reads, {args.items} items, on {connection.vendor}")
+
+        run("database", JWTAuthentication, authorization, args.requests)
+        run("claims", StatelessJWTAuthentication, authorization, args.requests)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
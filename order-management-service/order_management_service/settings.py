@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -20,6 +21,10 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Code shared by the services (the "shared" package) lives next to them.
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.append(str(BASE_DIR.parent))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -61,6 +66,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "orders.tracing.TracingMiddleware",
 ]
 
 ROOT_URLCONF = "order_management_service.urls"
@@ -97,6 +103,13 @@ DATABASES = {
     }
 }
 
+# Local development and tests without PostgreSQL
+if os.getenv("DB_ENGINE") == "sqlite":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("SQLITE_PATH", str(BASE_DIR / "db.sqlite3")),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -138,7 +151,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "shared.auth.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -164,3 +177,19 @@ SPECTACULAR_SETTINGS = {
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Request tracing. Requests arriving with a W3C traceparent keep its sampling
+# decision; others are sampled at SAMPLE_RATE. Spans go to an in-memory ring
+# buffer (read it at /api/traces/) or, with
+# "shared.utils.tracing.JsonlSink", to a rotating JSON lines file.
+TRACING = {
+    "SERVICE_NAME": "order-management",
+    "SAMPLE_RATE": float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+    "SINK": os.getenv("TRACE_SINK", "shared.utils.tracing.RingBufferSink"),
+    "OPTIONS": {"size": int(os.getenv("TRACE_RING_SIZE", "10000"))},
+}
+if TRACING["SINK"] == "shared.utils.tracing.JsonlSink":
+    TRACING["OPTIONS"] = {
+        "path": os.getenv("TRACE_JSONL_PATH", str(BASE_DIR / "traces.jsonl")),
+        "max_bytes": int(os.getenv("TRACE_JSONL_MAX_BYTES", str(50 * 1024 * 1024))),
+    }
@@ -1,3 +1,63 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .models import Order, OrderItem
+
+
+def bearer(user_id):
+    token = AccessToken()
+    token[api_settings.USER_ID_CLAIM] = user_id
+    return f"Bearer {token}"
+
+
+class StatelessAuthenticationTests(TestCase):
+    def test_cart_request_does_not_load_the_user(self):
+        # No auth_user row exists for this id; the token's claims are enough.
+        Order.objects.create(user_id=42)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/order/", HTTP_AUTHORIZATION=bearer(42))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user_id"], 42)
+        self.assertFalse([query["sql"] for query in queries if "auth_user" in query["sql"]])
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.get("/api/order/", HTTP_AUTHORIZATION=bearer(42) + "x")
+        self.assertEqual(response.status_code, 401)
+
+
+class CartRevalidationTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(user_id=42)
+        OrderItem.objects.create(order=self.order, product_id=1, price="9.99")
+
+    def get_cart(self, **headers):
+        return self.client.get("/api/order/", HTTP_AUTHORIZATION=bearer(42), **headers)
+
+    def test_unchanged_cart_is_304_after_only_the_version_query(self):
+        first = self.get_cart()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Cache-Control"], "private, no-cache")
+
+        with self.assertNumQueries(1):
+            response = self.get_cart(HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+    def test_changed_cart_is_sent_with_a_new_etag(self):
+        etag = self.get_cart()["ETag"]
+        OrderItem.objects.create(order=self.order, product_id=2, price="5.00")
+        # Item changes save the order, which moves its updated_at.
+        self.order.save()
+
+        response = self.get_cart(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["items"]), 2)
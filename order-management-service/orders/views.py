@@ -4,6 +4,8 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from decimal import Decimal
+from shared.utils.conditional import make_etag, not_modified, set_validators
+from shared.utils.tracing import serialized
 from .models import Order, OrderItem
 from .serializers import (
     OrderSerializer,
@@ -17,11 +19,20 @@ class CartView(APIView):
 
     def get(self, request):
         user_id = request.user.id
-        order = Order.objects.filter(user_id=user_id, status='cart').first()
-        if not order:
+        version = Order.objects.filter(user_id=user_id, status='cart').values_list('pk', 'updated_at').first()
+        if not version:
             return Response({"message": "Cart is empty"}, status=status.HTTP_200_OK)
-        serializer = OrderSerializer(order)
-        return Response(serializer.data)
+
+        # Every item change saves the order, so updated_at versions the whole cart.
+        pk, updated_at = version
+        etag = make_etag(pk, updated_at)
+        response = not_modified(request, etag, updated_at)
+        if response is None:
+            order = Order.objects.prefetch_related('items').get(pk=pk)
+            response = Response(serialized(OrderSerializer(order)))
+            set_validators(response, etag, updated_at)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
 class OrderItemView(APIView):
@@ -55,7 +66,7 @@ class OrderItemView(APIView):
         order.total = sum(item.price * item.quantity for item in order.items.all())
         order.save()
 
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        return Response(serialized(OrderSerializer(order)), status=status.HTTP_201_CREATED)
 
     def put(self, request, item_id):
         serializer = UpdateOrderSerializer(data=request.data)
@@ -76,7 +87,7 @@ class OrderItemView(APIView):
         order.total = sum(item.price * item.quantity for item in order.items.all())
         order.save()
 
-        return Response(OrderSerializer(order).data)
+        return Response(serialized(OrderSerializer(order)))
 
     def delete(self, request, item_id):
         user_id = request.user.id
@@ -91,7 +102,7 @@ class OrderItemView(APIView):
         order.total = sum(item.price * item.quantity for item in order.items.all())
         order.save()
 
-        return Response(OrderSerializer(order).data)
+        return Response(serialized(OrderSerializer(order)))
 
 
 class CheckoutView(APIView):
@@ -107,7 +118,7 @@ class CheckoutView(APIView):
         order.status = 'completed'
         order.save()
 
-        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+        return Response(serialized(OrderSerializer(order)), status=status.HTTP_200_OK)
 
 
 class OrderHistoryView(APIView):
@@ -116,5 +127,4 @@ class OrderHistoryView(APIView):
     def get(self, request):
         user_id = request.user.id
         orders = Order.objects.filter(user_id=user_id, status='completed')
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        return Response(serialized(OrderSerializer(orders, many=True)))
@@ -0,0 +1,93 @@
+"""
+Price and stock changes per second, sent as one PUT /api/product/<slug> per
+product and as a single bulk PATCH /api/product/ carrying the same changes,
+with the share of inventory deltas set by --delta-ratio. Uses a throwaway
+test database.
+
+    python benchmarks/bulk_update_benchmark.py --products 20000 --updates 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search_benchmark import fill  # noqa: E402
+
+
+def patches(rng, products, updates, delta_ratio):
+    items = []
+    for i in rng.sample(range(products), updates):
+        item = {"slug": f"product-{i}", "price": f"{rng.randint(100, 100000) / 100:.2f}"}
+        if rng.random() < delta_ratio:
+            item["inventory_delta"] = rng.randint(-5, 5)
+        else:
+            item["inventory"] = rng.randint(0, 100)
+        items.append(item)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--delta-ratio", type=float, default=0.5, help="share of items that adjust stock by a delta")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "product_catalog_service.settings")
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from products.models import Product
+    from products.views import ProductDetailUpdateDeleteView, ProductListCreateView
+
+    settings.PRODUCT_BULK_UPDATE["MAX_ITEMS"] = max(settings.PRODUCT_BULK_UPDATE["MAX_ITEMS"], args.updates)
+    factory = APIRequestFactory()
+    user = User(username="benchmark")
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        rng = random.Random(42)
+        fill(rng, 0, args.products)
+        items = patches(rng, args.products, args.updates, args.delta_ratio)
+        print(f"{args.products} products, {args.updates} updates, on {connection.vendor}")
+
+        detail = ProductDetailUpdateDeleteView.as_view()
+        started = time.perf_counter()
+        for item in items:
+            slug = item["slug"]
+            data = {"price": item["price"]}
+            if "inventory_delta" in item:
+                # What a sync job does without the bulk endpoint: read, then write back.
+                data["inventory"] = Product.objects.get(slug=slug).inventory + item["inventory_delta"]
+            else:
+                data["inventory"] = item["inventory"]
+            request = factory.put(f"/api/product/{slug}", data, format="json")
+            force_authenticate(request, user)
+            detail(request, slug=slug).render()
+        elapsed = time.perf_counter() - started
+        print(f"    put: {len(items) / elapsed:9.0f} updates/s  ({elapsed:.2f} s)")
+
+        request = factory.patch("/api/product/", items, format="json")
+        force_authenticate(request, user)
+        started = time.perf_counter()
+        response = ProductListCreateView.as_view()(request)
+        response.render()
+        elapsed = time.perf_counter() - started
+        print(f"  patch: {len(items) / elapsed:9.0f} updates/s  ({elapsed:.2f} s, {response.data['updated']} products)")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
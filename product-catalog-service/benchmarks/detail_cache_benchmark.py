@@ -0,0 +1,92 @@
+"""
+Product detail latency and cache hit ratio under a Zipf-distributed request
+mix, where a few hot products take most of the traffic, with the detail
+cache off and on. --write-ratio mixes in updates, each of which invalidates
+its product. Uses a throwaway test database and the configured cache.
+
+    python benchmarks/detail_cache_benchmark.py --products 10000 --requests 20000 --zipf 1.1
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search_benchmark import fill  # noqa: E402
+
+
+def run(label, requests, write_ratio, rng):
+    from django.conf import settings
+    from django.test import RequestFactory
+
+    from products.cache import product_detail_cache
+    from products.models import Product
+    from products.views import ProductDetailUpdateDeleteView
+
+    view = ProductDetailUpdateDeleteView.as_view()
+    factory = RequestFactory()
+    # Start cold without clearing what may be a shared cache.
+    product_detail_cache.invalidate(*set(requests))
+    product_detail_cache.hits = product_detail_cache.misses = product_detail_cache.shared = 0
+
+    latencies = []
+    writes = 0
+    for slug in requests:
+        if rng.random() < write_ratio:
+            Product.objects.get(slug=slug).save()
+            writes += 1
+            continue
+        started = time.perf_counter()
+        response = view(factory.get(f"/api/product/{slug}"), slug=slug)
+        response.render()
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    stats = product_detail_cache.stats() if settings.PRODUCT_DETAIL_CACHE["ENABLED"] else {}
+    print(
+        f"{label:>10}: p50 {statistics.median(latencies) * 1000:7.3f} ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.3f} ms  "
+        f"hit ratio {stats.get('hit_ratio', '-')}  ({len(latencies)} reads, {writes} writes)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent; higher is more skewed")
+    parser.add_argument("--write-ratio", type=float, default=0.0, help="share of requests that update the product")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "product_catalog_service.settings")
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        rng = random.Random(42)
+        fill(rng, 0, args.products)
+        slugs = [f"product-{i}" for i in range(args.products)]
+        weights = list(itertools.accumulate(1 / rank ** args.zipf for rank in range(1, args.products + 1)))
+        requests = rng.choices(slugs, cum_weights=weights, k=args.requests)
+        print(f"{args.products} products, {args.requests} requests, zipf {args.zipf}, on {connection.vendor}")
+
+        for enabled in (False, True):
+            settings.PRODUCT_DETAIL_CACHE["ENABLED"] = enabled
+            run("cached" if enabled else "uncached", requests, args.write_ratio, random.Random(7))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
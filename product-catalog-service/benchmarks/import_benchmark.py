@@ -0,0 +1,81 @@
+"""
+Rows per second through the bulk product importer, for a generated CSV or
+JSON lines feed, importing it once into an empty table and again as an
+update of every row. Uses a throwaway test database.
+
+    DB_ENGINE=sqlite python benchmarks/import_benchmark.py --rows 500000 --format csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search_benchmark import WORDS  # noqa: E402
+
+COLUMNS = ["slug", "name", "description", "price", "inventory"]
+
+
+def feed(rows, file_format, rng):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if file_format == "csv" else None
+    if writer:
+        writer.writerow(COLUMNS)
+    for i in range(rows):
+        row = [
+            f"product-{i}",
+            " ".join(rng.choices(WORDS, k=3)).title(),
+            " ".join(rng.choices(WORDS, k=40)),
+            f"{rng.randint(100, 100000) / 100:.2f}",
+            rng.randint(0, 100),
+        ]
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(COLUMNS, row))) + "\n")
+    return buffer.getvalue().encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "product_catalog_service.settings")
+    import django
+
+    django.setup()
+    from django.db import connection
+
+    from products.importer import READERS, ProductImporter
+
+    data = feed(args.rows, args.format, random.Random(42))
+    print(f"{args.rows} rows, {len(data) / 1e6:.1f} MB of {args.format}, on {connection.vendor}")
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        for label in ("insert", "update"):
+            importer = ProductImporter(batch_size=args.batch_size)
+            started = time.perf_counter()
+            summary = importer.run(READERS[args.format](io.BytesIO(data)))
+            elapsed = time.perf_counter() - started
+            print(
+                f"{label:>7}: {summary['imported'] / elapsed:9.0f} rows/s  ({elapsed:.1f} s, "
+                f"{summary['error_count']} errors)"
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
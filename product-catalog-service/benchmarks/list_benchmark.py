@@ -0,0 +1,105 @@
+"""
+Product list latency for each ProductFilter combination, on the first page
+and on a page deep in the listing, with the model's indexes and again after
+dropping them. Runs against a throwaway test database on the configured
+backend, filled with generated products.
+
+    python benchmarks/list_benchmark.py --size 1000000 --repeat 20
+    python benchmarks/list_benchmark.py --filters min_price,max_price,in_stock
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search_benchmark import fill  # noqa: E402
+
+FILTERS = {
+    "min_price": "10",
+    "max_price": "50",
+    "in_stock": "true",
+    "search": "leather",
+}
+
+
+def measure(view, factory, params, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = view(factory.get("/api/product/", params))
+        response.render()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000
+
+
+def run(label, filters, repeat):
+    from django.test import RequestFactory
+
+    from products.models import Product
+    from products.pagination import KeysetPagination
+    from products.search import search
+    from products.views import ProductListCreateView
+
+    view = ProductListCreateView.as_view()
+    factory = RequestFactory()
+    # Ten rows from the oldest end of the listing: a deep page under OFFSET.
+    deep = Product.objects.order_by("created_at", "id").values_list("created_at", "id")[10]
+    # Likewise ten rows from the lowest-ranked end of the search results.
+    deep_search = search(Product.objects.all(), FILTERS["search"]).order_by("search_rank", "id")
+    deep_search = deep_search.values_list("search_rank", "id")[10]
+    print(label)
+    for count in range(len(filters) + 1):
+        for names in itertools.combinations(filters, count):
+            params = {name: FILTERS[name] for name in names}
+            first = measure(view, factory, params, repeat)
+            params["cursor"] = KeysetPagination.make_cursor(list(deep_search if "search" in params else deep))
+            deep_page = measure(view, factory, params, repeat)
+            print(f"  {'+'.join(names) or 'no filters':>36}: first {first:9.2f} ms  deep {deep_page:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20, help="requests per combination; the median is shown")
+    parser.add_argument("--filters", default=",".join(FILTERS), help="comma-separated filters to combine")
+    args = parser.parse_args()
+    filters = [name for name in args.filters.split(",") if name]
+    if unknown := set(filters) - set(FILTERS):
+        parser.error(f"unknown filters: {', '.join(sorted(unknown))}")
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "product_catalog_service.settings")
+    import django
+
+    django.setup()
+    from django.db import connection
+
+    from products.models import Product
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        elapsed = fill(random.Random(42), 0, args.size)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        print(f"{args.size} products on {connection.vendor} (inserted in {elapsed:.1f} s)")
+        run("with indexes", filters, args.repeat)
+
+        with connection.schema_editor() as schema_editor:
+            for index in Product._meta.indexes:
+                schema_editor.remove_index(Product, index)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        run("without indexes", filters, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Latency of the product search filter at several catalog sizes, comparing the
+old icontains scan over name and description with the full-text index. Runs
+against a throwaway test database on the configured backend (PostgreSQL, or
+SQLite FTS5 with DB_ENGINE=sqlite), which it fills with generated products.
+
+    python benchmarks/search_benchmark.py --sizes 100000,1000000 --queries 50
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WORDS = (
+    "red blue green black white silver wooden steel leather cotton wireless portable compact "
+    "premium classic modern vintage organic waterproof lightweight ergonomic adjustable smart "
+    "running hiking kitchen office garden travel gaming outdoor winter summer shoes jacket lamp "
+    "chair desk table bottle backpack headphones speaker keyboard mouse monitor charger cable "
+    "watch camera tent blanket pillow mug kettle knife pan shirt scarf gloves boots sofa shelf"
+).split()
+
+
+def generate(rng, start, count):
+    from products.models import Product
+
+    for i in range(start, start + count):
+        name = " ".join(rng.choices(WORDS, k=3)).title()
+        yield Product(
+            name=name,
+            slug=f"product-{i}",
+            description=" ".join(rng.choices(WORDS, k=40)),
+            price=rng.randint(100, 100000) / 100,
+            inventory=rng.randint(0, 100),
+        )
+
+
+def fill(rng, start, count, batch_size=5000):
+    from products.models import Product
+
+    products = generate(rng, start, count)
+    started = time.perf_counter()
+    while batch := [product for _, product in zip(range(batch_size), products)]:
+        Product.objects.bulk_create(batch)
+    return time.perf_counter() - started
+
+
+def measure(label, run, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        run(query)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(
+        f"{label:>10}: p50 {statistics.median(latencies) * 1000:8.2f} ms  "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000", help="comma-separated catalog sizes")
+    parser.add_argument("--queries", type=int, default=50, help="searches per size and method")
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "product_catalog_service.settings")
+    import django
+
+    django.setup()
+    from django.db import connection
+
+    from products.models import Product
+    from products.search import search
+
+    rng = random.Random(42)
+    queries = [" ".join(rng.choices(WORDS, k=rng.randint(1, 2))) for _ in range(args.queries)]
+    queries += [word[:rng.randint(2, 4)] for word in rng.choices(WORDS, k=args.queries // 5)]
+
+    def icontains(query):
+        products = Product.objects.filter(name__icontains=query) | Product.objects.filter(description__icontains=query)
+        return list(products.order_by("-created_at", "-id")[:args.page_size])
+
+    def full_text(query):
+        return list(search(Product.objects.all(), query)[:args.page_size])
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        total = 0
+        for size in sorted(int(n) for n in args.sizes.split(",")):
+            elapsed = fill(rng, total, size - total)
+            print(f"{size} products on {connection.vendor} ({size - total} inserted in {elapsed:.1f} s)")
+            total = size
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            measure("icontains", icontains, queries)
+            measure("full-text", full_text, queries)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
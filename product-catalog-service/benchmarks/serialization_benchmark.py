@@ -0,0 +1,75 @@
+"""
+Time to serialize and render a page of products with ProductSerializer and
+JSONRenderer, against the values_list fast path and ProductJSONRenderer,
+checking the two produce identical bytes. Uses a throwaway test database.
+
+    python benchmarks/serialization_benchmark.py --page-size 500 --repeat 50
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search_benchmark import fill  # noqa: E402
+
+
+def measure(label, run, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = run()
+        latencies.append(time.perf_counter() - started)
+    print(f"{label:>28}: {statistics.median(latencies) * 1000:8.2f} ms  ({len(body)} bytes)")
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--fields", default="id,name,slug,price", help="sparse fieldset to time as well")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "product_catalog_service.settings")
+    import django
+
+    django.setup()
+    from django.db import connection
+    from rest_framework.renderers import JSONRenderer
+
+    from products.models import Product
+    from products.renderers import ProductJSONRenderer, orjson
+    from products.serializers import ProductRowSerializer, ProductSerializer
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        fill(random.Random(42), 0, args.page_size)
+        products = Product.objects.order_by("-created_at", "-id")[:args.page_size]
+        print(f"{args.page_size} products, orjson {'installed' if orjson else 'not installed'}")
+
+        def model_serializer():
+            return JSONRenderer().render(ProductSerializer(list(products), many=True).data)
+
+        def fast_path(fields=None):
+            serializer = ProductRowSerializer(fields)
+            return ProductJSONRenderer().render(serializer.serialize(list(serializer.select(products))))
+
+        expected = measure("ProductSerializer", model_serializer, args.repeat)
+        actual = measure("values_list fast path", fast_path, args.repeat)
+        measure(f"fast path, fields={args.fields}", lambda: fast_path(args.fields), args.repeat)
+        if actual != expected:
+            sys.exit("The fast path's output differs from ProductSerializer's")
+        print("Output is byte-identical")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -20,6 +21,10 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Code shared by the services (the "shared" package) lives next to them.
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.append(str(BASE_DIR.parent))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -62,6 +67,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "products.tracing.TracingMiddleware",
 ]
 
 ROOT_URLCONF = "product_catalog_service.urls"
@@ -98,6 +104,14 @@ DATABASES = {
     }
 }
 
+# Local development and tests without PostgreSQL; product search then uses
+# an SQLite FTS5 index instead of a tsvector column
+if os.getenv("DB_ENGINE") == "sqlite":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("SQLITE_PATH", str(BASE_DIR / "db.sqlite3")),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -139,7 +153,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "shared.auth.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -165,3 +179,64 @@ SPECTACULAR_SETTINGS = {
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Keyset pagination of the product list: rows per page, and the largest
+# ?page_size= a client may ask for
+PRODUCT_PAGINATION = {
+    "PAGE_SIZE": int(os.getenv("PRODUCT_PAGE_SIZE", "50")),
+    "MAX_PAGE_SIZE": int(os.getenv("PRODUCT_MAX_PAGE_SIZE", "500")),
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+if os.getenv("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
+
+# Serialized product detail payloads, per slug, in the CACHES alias below.
+# Use a shared backend (REDIS_URL) with several workers so an update
+# invalidates every worker's view of the product. On a miss one caller
+# loads the product while the others poll for up to WAIT_TIMEOUT seconds.
+PRODUCT_DETAIL_CACHE = {
+    "ENABLED": os.getenv("PRODUCT_CACHE_ENABLED", "True") == "True",
+    "ALIAS": "default",
+    "TIMEOUT": int(os.getenv("PRODUCT_CACHE_TIMEOUT", "300")),
+    "LOCK_TIMEOUT": int(os.getenv("PRODUCT_CACHE_LOCK_TIMEOUT", "5")),
+    "WAIT_TIMEOUT": float(os.getenv("PRODUCT_CACHE_WAIT_TIMEOUT", "2")),
+    "POLL_INTERVAL": 0.01,
+}
+
+# Bulk product import (manage.py import_products and POST /api/product/import):
+# rows upserted per INSERT, and how many row errors are reported in full
+PRODUCT_IMPORT = {
+    "BATCH_SIZE": int(os.getenv("PRODUCT_IMPORT_BATCH_SIZE", "1000")),
+    "MAX_ERRORS": int(os.getenv("PRODUCT_IMPORT_MAX_ERRORS", "1000")),
+}
+
+# Bulk price / inventory updates (PATCH /api/product/): patches accepted per
+# request, and products written per UPDATE statement
+PRODUCT_BULK_UPDATE = {
+    "MAX_ITEMS": int(os.getenv("PRODUCT_BULK_UPDATE_MAX_ITEMS", "5000")),
+    "CHUNK_SIZE": int(os.getenv("PRODUCT_BULK_UPDATE_CHUNK_SIZE", "500")),
+}
+
+# Request tracing. Requests arriving with a W3C traceparent keep its sampling
+# decision; others are sampled at SAMPLE_RATE. Spans go to an in-memory ring
+# buffer (read it at /api/traces/) or, with
+# "shared.utils.tracing.JsonlSink", to a rotating JSON lines file.
+TRACING = {
+    "SERVICE_NAME": "product-catalog",
+    "SAMPLE_RATE": float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+    "SINK": os.getenv("TRACE_SINK", "shared.utils.tracing.RingBufferSink"),
+    "OPTIONS": {"size": int(os.getenv("TRACE_RING_SIZE", "10000"))},
+}
+if TRACING["SINK"] == "shared.utils.tracing.JsonlSink":
+    TRACING["OPTIONS"] = {
+        "path": os.getenv("TRACE_JSONL_PATH", str(BASE_DIR / "traces.jsonl")),
+        "max_bytes": int(os.getenv("TRACE_JSONL_MAX_BYTES", str(50 * 1024 * 1024))),
+    }
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import product_detail_cache
+from .models import Product
+from .serializers import ProductPatchSerializer, ProductRowSerializer
+
+
+class ProductBulkUpdater:
+    """
+    Applies a list of price / inventory patches in one transaction. Targets
+    are resolved with a single lookup, and each chunk of products is written
+    with one UPDATE whose CASE expressions carry every product's new values;
+    deltas are added in the database (inventory = inventory + n), so
+    concurrent stock syncs do not overwrite each other. Several items for
+    the same product are applied in order. Results come back per item, in
+    the order given.
+    """
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or settings.PRODUCT_BULK_UPDATE["CHUNK_SIZE"]
+        self.serializer = ProductPatchSerializer()
+        self.price_field = ProductRowSerializer.declared_fields()["price"]
+
+    def validate(self, items):
+        """(valid (index, values) pairs, result list with the invalid items filled in)."""
+        valid = []
+        results = [None] * len(items)
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, self.serializer.run_validation(item)))
+            except serializers.ValidationError as e:
+                results[index] = {"index": index, "status": 400, "errors": e.detail}
+        return valid, results
+
+    @staticmethod
+    def merge(changes, pk, values):
+        change = changes.setdefault(pk, {"delta": 0})
+        if "price" in values:
+            change["price"] = values["price"]
+        if "inventory" in values:
+            # A stock level supersedes the deltas before it.
+            change["inventory"] = values["inventory"]
+            change["delta"] = 0
+        change["delta"] += values.get("inventory_delta", 0)
+
+    @staticmethod
+    def assignments(changes, pks):
+        prices = [When(pk=pk, then=Value(changes[pk]["price"])) for pk in pks if "price" in changes[pk]]
+        stock = []
+        for pk in pks:
+            change = changes[pk]
+            if "inventory" in change:
+                stock.append(When(pk=pk, then=Value(change["inventory"] + change["delta"])))
+            elif change["delta"]:
+                stock.append(When(pk=pk, then=F("inventory") + change["delta"]))
+
+        values = {"updated_at": timezone.now()}
+        if prices:
+            values["price"] = Case(*prices, default=F("price"), output_field=Product._meta.get_field("price"))
+        if stock:
+            values["inventory"] = Case(*stock, default=F("inventory"), output_field=Product._meta.get_field("inventory"))
+        return values
+
+    def run(self, items):
+        valid, results = self.validate(items)
+        ids = {values["id"] for _, values in valid if "id" in values}
+        slugs = {values["slug"] for _, values in valid if "slug" in values}
+
+        with transaction.atomic():
+            by_id = dict(Product.objects.filter(Q(id__in=ids) | Q(slug__in=slugs)).values_list("id", "slug"))
+            by_slug = {slug: pk for pk, slug in by_id.items()}
+
+            changes = {}
+            targets = []
+            for index, values in valid:
+                pk = values["id"] if values.get("id") in by_id else by_slug.get(values.get("slug"))
+                if pk is None:
+                    results[index] = {"index": index, "status": 404, "errors": {"detail": "No such product."}}
+                    continue
+                self.merge(changes, pk, values)
+                targets.append((index, pk))
+
+            pks = list(changes)
+            current = {}
+            for start in range(0, len(pks), self.chunk_size):
+                chunk = pks[start:start + self.chunk_size]
+                Product.objects.filter(pk__in=chunk).update(**self.assignments(changes, chunk))
+                current.update(
+                    (pk, (price, inventory))
+                    for pk, price, inventory in Product.objects.filter(pk__in=chunk).values_list("pk", "price", "inventory")
+                )
+
+            # update() sends no post_save, so invalidate the whole batch at once.
+            if pks:
+                updated_slugs = [by_id[pk] for pk in pks]
+                transaction.on_commit(lambda: product_detail_cache.invalidate(*updated_slugs))
+
+        for index, pk in targets:
+            price, inventory = current[pk]
+            results[index] = {
+                "index": index,
+                "status": 200,
+                "id": pk,
+                "slug": by_id[pk],
+                "price": self.price_field.to_representation(price),
+                "inventory": inventory,
+            }
+        return {"updated": len(pks), "results": results}
@@ -0,0 +1,87 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ProductDetailCache:
+    """
+    Serialized product detail payloads with their validators, keyed by slug,
+    in the Django cache named by PRODUCT_DETAIL_CACHE["ALIAS"].
+
+    Entries live under a per-slug generation token that invalidate()
+    replaces, so a reader that loaded a product just before it changed
+    cannot put the stale payload back. On a miss only one caller per slug
+    loads from the database; the others poll briefly for its result.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    @property
+    def cache(self):
+        return caches[settings.PRODUCT_DETAIL_CACHE["ALIAS"]]
+
+    def _generation(self, slug):
+        key = f"product:generation:{slug}"
+        generation = self.cache.get(key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not self.cache.add(key, generation, None):
+                generation = self.cache.get(key, generation)
+        return generation
+
+    def get(self, slug, load):
+        """
+        The entry for `slug`, calling load() to build and store it on a miss.
+        Exceptions from load(), such as Http404, propagate and nothing is stored.
+        """
+        config = settings.PRODUCT_DETAIL_CACHE
+        if not config["ENABLED"]:
+            return load()
+        key = f"product:detail:{slug}:{self._generation(slug)}"
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+
+        lock = f"{key}:lock"
+        if not self.cache.add(lock, 1, config["LOCK_TIMEOUT"]):
+            deadline = time.monotonic() + config["WAIT_TIMEOUT"]
+            while time.monotonic() < deadline:
+                time.sleep(config["POLL_INTERVAL"])
+                found = self.cache.get_many([key, lock])
+                if key in found:
+                    self.shared += 1
+                    return found[key]
+                if lock not in found:
+                    break
+            # The loader failed, or is too slow to wait for: read the database.
+            return load()
+        try:
+            entry = load()
+            self.cache.set(key, entry, config["TIMEOUT"])
+            return entry
+        finally:
+            self.cache.delete(lock)
+
+    def invalidate(self, *slugs):
+        """Drop the entries for `slugs` in one cache round-trip."""
+        if slugs:
+            self.cache.set_many({f"product:generation:{slug}": uuid.uuid4().hex for slug in slugs}, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_loads": self.shared,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+product_detail_cache = ProductDetailCache()
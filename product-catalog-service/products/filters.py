@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
 from .models import Product
+from .search import search
 
 
 class ProductFilter(filters.FilterSet):
@@ -13,7 +14,7 @@ class ProductFilter(filters.FilterSet):
         fields = ['search', 'min_price', 'max_price', 'in_stock']
 
     def filter_search(self, queryset, name, value):
-        return queryset.filter(name__icontains=value) | queryset.filter(description__icontains=value)
+        return search(queryset, value)
 
     def filter_in_stock(self, queryset, name, value):
         if value:
@@ -0,0 +1,148 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils.text import slugify
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+
+from .cache import product_detail_cache
+from .models import Product
+from .serializers import ProductCreateUpdateSerializer
+
+FORMATS = ("csv", "jsonl")
+
+# Request content types accepted by the import endpoint.
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/jsonl": "jsonl",
+    "application/x-ndjson": "jsonl",
+    "application/x-jsonlines": "jsonl",
+}
+
+
+def _lines(stream):
+    """Decoded lines from a binary file-like object, read one at a time."""
+    return codecs.iterdecode(iter(stream.readline, b""), "utf-8-sig")
+
+
+def read_csv(stream):
+    reader = csv.DictReader(_lines(stream))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+class ProductImporter:
+    """
+    Upserts products by slug from a stream of rows in bounded memory. Rows
+    are validated with ProductCreateUpdateSerializer's fields, a slug is
+    taken from the row or derived from the name as Product.save does, and
+    each batch is written with one bulk INSERT ... ON CONFLICT (slug) DO
+    UPDATE in its own transaction. Within a batch the last row for a slug
+    wins; later batches overwrite earlier ones the same way.
+    """
+    UPDATE_FIELDS = ["name", "description", "price", "inventory", "updated_at"]
+
+    def __init__(self, batch_size=None, max_errors=None):
+        config = settings.PRODUCT_IMPORT
+        self.batch_size = batch_size or config["BATCH_SIZE"]
+        self.max_errors = max_errors if max_errors is not None else config["MAX_ERRORS"]
+        self.fields = ProductCreateUpdateSerializer().fields
+        self.slug_field = serializers.SlugField(max_length=Product._meta.get_field("slug").max_length)
+        self.imported = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": errors})
+
+    def validate(self, row):
+        """(slug, validated values) for one row, or raises ValidationError."""
+        values = {}
+        errors = {}
+        for name, field in self.fields.items():
+            value = row.get(name, empty)
+            if value == "" and not field.required:
+                value = empty
+            try:
+                value = field.run_validation(value)
+            except SkipField:
+                # An optional field left out; the model default applies.
+                continue
+            except serializers.ValidationError as e:
+                errors[name] = e.detail
+                continue
+            values[name] = value
+        slug = row.get("slug") or slugify(values.get("name", ""))
+        try:
+            slug = self.slug_field.run_validation(slug)
+        except serializers.ValidationError as e:
+            errors["slug"] = e.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return slug, values
+
+    def run(self, rows):
+        batch = {}
+        for line, row in rows:
+            if not isinstance(row, dict):
+                self.error(line, {"non_field_errors": ["Expected an object with product fields"]})
+                continue
+            try:
+                slug, values = self.validate(row)
+            except serializers.ValidationError as e:
+                self.error(line, e.detail)
+                continue
+            if batch.pop(slug, None) is not None:
+                self.duplicates += 1
+            batch[slug] = (line, Product(slug=slug, **values))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = {}
+        if batch:
+            self.flush(batch)
+        return self.summary()
+
+    def flush(self, batch):
+        products = [product for _, product in batch.values()]
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    products,
+                    update_conflicts=True,
+                    unique_fields=["slug"],
+                    update_fields=self.UPDATE_FIELDS,
+                )
+                # bulk_create sends no post_save, so invalidate the batch at once.
+                transaction.on_commit(lambda: product_detail_cache.invalidate(*batch))
+        except DatabaseError as e:
+            lines = [line for line, _ in batch.values()]
+            self.error(min(lines), {"non_field_errors": [f"Batch of lines {min(lines)}-{max(lines)} failed: {e}"]})
+            return
+        self.imported += len(products)
+
+    def summary(self):
+        return {
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from products.query_plans import SUPPORTED_VENDORS, explain, list_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the product list's queries for every ProductFilter combination, first and later "
+        "pages, and fail if any scans the product table or sorts it without an index narrowing it first."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SUPPORTED_VENDORS:
+            raise CommandError("check_query_plans supports PostgreSQL and SQLite")
+        checked = failed = 0
+
+        for label, status_code, queries in list_queries():
+            if status_code != 200:
+                raise CommandError(f"{label}: the list view returned {status_code}")
+            for sql in queries:
+                checked += 1
+                problems, plan = explain(sql)
+                if problems:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"FAIL {label}: {'; '.join(problems)}"))
+                    self.stdout.write(f"  {sql}\n  {plan}")
+                else:
+                    self.stdout.write(f"ok   {label}")
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"  {plan}")
+
+        if failed:
+            raise CommandError(f"{failed} of {checked} product list queries scan or sort the table")
+        self.stdout.write(self.style.SUCCESS(f"All {checked} product list queries are index-backed"))
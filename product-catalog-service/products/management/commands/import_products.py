@@ -0,0 +1,50 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import FORMATS, READERS, ProductImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert products by slug from a CSV or JSON lines file ('-' for stdin), streamed in "
+        "batches. Rows that fail validation are listed by line number and make the command fail."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or Path(path).suffix.lstrip(".").lower()
+        if file_format == "ndjson":
+            file_format = "jsonl"
+        if file_format not in FORMATS:
+            raise CommandError(f"Cannot tell the format of {path}; pass --format {' or '.join(FORMATS)}")
+
+        importer = ProductImporter(batch_size=options["batch_size"])
+        started = time.perf_counter()
+        if path == "-":
+            summary = importer.run(READERS[file_format](sys.stdin.buffer))
+        else:
+            try:
+                with open(path, "rb") as stream:
+                    summary = importer.run(READERS[file_format](stream))
+            except FileNotFoundError:
+                raise CommandError(f"No such file: {path}")
+        elapsed = time.perf_counter() - started
+
+        for error in summary["errors"]:
+            self.stderr.write(json.dumps(error, default=str))
+        rate = summary["imported"] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Imported {summary['imported']} products in {elapsed:.1f} s ({rate:.0f} rows/s), "
+            f"{summary['duplicates']} duplicate slugs, {summary['error_count']} rejected rows"
+        )
+        if summary["error_count"]:
+            raise CommandError(f"{summary['error_count']} rows were not imported")
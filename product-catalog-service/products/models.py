@@ -21,3 +21,18 @@ class Product(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        # Checked against the list view's real queries by QueryPlanTests and
+        # `manage.py check_query_plans`.
+        indexes = [
+            # Keyset pagination seeks and sorts on (created_at, id).
+            models.Index(fields=["-created_at", "-id"], name="product_created_id_idx"),
+            # in_stock=true listings, in the same order, without visiting sold-out rows.
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(inventory__gt=0),
+                name="product_in_stock_created_idx",
+            ),
+            # Narrow min_price / max_price ranges, where sorting the few matches
+            # beats walking the created_at index past every non-match.
+            models.Index(fields=["price"], name="product_price_idx"),
+        ]
@@ -0,0 +1,167 @@
+import base64
+import binascii
+import json
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _seek(ordering, position):
+    """
+    Rows strictly after `position` in `ordering`: (a < x) OR (a = x AND b < y)
+    for descending fields, with a plain bound on the first field so the
+    database can start an index range scan there.
+    """
+    clauses = []
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip("-")
+        clauses.append(Q(**equal, **{f"{name}__{'lt' if field.startswith('-') else 'gt'}": value}))
+        equal[name] = value
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+    return bound & reduce(operator.or_, clauses)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks past the last row's ordering values instead
+    of using OFFSET, so a deep page costs the same as the first. A queryset
+    with an explicit order_by, such as ranked search results, is paged in
+    that order instead of `ordering`; either must end in a unique field to
+    break ties. Cursors are opaque tokens holding the position and the
+    direction of travel.
+    """
+    ordering = ("-created_at", "-id")
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        config = settings.PRODUCT_PAGINATION
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return config["PAGE_SIZE"]
+        return max(1, min(page_size, config["MAX_PAGE_SIZE"]))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(queryset.query.order_by) or self.ordering
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = [_flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        if position is not None:
+            queryset = queryset.filter(_seek(ordering, position))
+        page = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        del page[self.page_size:]
+
+        if reverse:
+            page.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+        self.page = page
+        return page
+
+    def position(self, item):
+        return [getattr(item, field.lstrip("-")) for field in self.ordering]
+
+    @staticmethod
+    def make_cursor(position, reverse=False):
+        # str() keeps full microsecond precision, which DjangoJSONEncoder truncates.
+        payload = json.dumps({"p": position, "r": int(reverse)}, default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def encode_cursor(self, position, reverse=False):
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.make_cursor(position, reverse)
+        )
+
+    def decode_cursor(self, request, model):
+        """(position, reverse) from the request's cursor, or (None, False) for the first page."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            values = payload["p"]
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self._to_python(model, field.lstrip("-"), value) for field, value in zip(self.ordering, values)
+            ]
+            return position, bool(payload.get("r"))
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _to_python(model, name, value):
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # An annotation such as search_rank; JSON already restored its type.
+            if not isinstance(value, (int, float)):
+                raise ValueError(name)
+            return value
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
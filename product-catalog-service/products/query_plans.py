@@ -0,0 +1,107 @@
+"""
+EXPLAIN checks for the product list's queries, run by the test suite and
+by `manage.py check_query_plans` against a real database.
+"""
+
+import itertools
+import json
+import re
+
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import Product
+from .pagination import KeysetPagination
+from .views import ProductListCreateView
+
+SUPPORTED_VENDORS = ("postgresql", "sqlite")
+
+# One value per ProductFilter parameter; every combination of them is checked.
+FILTERS = {
+    "search": "shoe",
+    "min_price": "10",
+    "max_price": "50",
+    "in_stock": "true",
+}
+
+
+def _postgresql_plan(cursor, sql):
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def _postgresql_problems(node, table):
+    """Seq scans of `table`, and sorts of rows that no index condition narrowed first."""
+    problems = []
+    if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == table:
+        problems.append(f"sequential scan on {table}")
+    if node["Node Type"] in ("Sort", "Incremental Sort") and not _narrowed(node):
+        problems.append(f"sort on {', '.join(node.get('Sort Key', []))}")
+    for child in node.get("Plans", []):
+        problems += _postgresql_problems(child, table)
+    return problems
+
+
+def _narrowed(node):
+    return "Index Cond" in node or "Recheck Cond" in node or any(_narrowed(child) for child in node.get("Plans", []))
+
+
+def _sqlite_problems(cursor, sql, table):
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+    details = [row[3] for row in cursor.fetchall()]
+    problems = [
+        f"full scan: {detail}" for detail in details
+        if re.match(rf"SCAN {table}(?: |$)", detail) and "USING" not in detail
+    ]
+    narrowed = any(detail.startswith("SEARCH") or "VIRTUAL TABLE" in detail for detail in details)
+    if not narrowed:
+        problems += [f"sort: {detail}" for detail in details if "TEMP B-TREE FOR ORDER BY" in detail]
+    return problems, details
+
+
+def list_queries():
+    """
+    Call the list view for every ProductFilter combination, on the first
+    page and on a later one, and yield (label, status code, SELECTs on the
+    product table it ran).
+    """
+    view = ProductListCreateView.as_view()
+    factory = RequestFactory()
+    table = Product._meta.db_table
+    for count in range(len(FILTERS) + 1):
+        for names in itertools.combinations(FILTERS, count):
+            for page in ("first", "later"):
+                params = {name: FILTERS[name] for name in names}
+                if page == "later":
+                    # A position partway through the listing, in the order these filters produce.
+                    position = [1.0, 2 ** 62] if "search" in params else [timezone.now(), 2 ** 62]
+                    params["cursor"] = KeysetPagination.make_cursor(position)
+                label = f"{'+'.join(names) or 'no filters'}, {page} page"
+
+                with CaptureQueriesContext(connection) as captured:
+                    response = view(factory.get("/api/product/", params))
+                queries = [
+                    query["sql"] for query in captured.captured_queries
+                    if query["sql"].startswith("SELECT") and f'"{table}"' in query["sql"]
+                ]
+                yield label, response.status_code, queries
+
+
+def explain(sql):
+    """(problems, plan): the scans and sorts of the product table in `sql`'s plan."""
+    table = Product._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            return _sqlite_problems(cursor, sql, table)
+        # A nearly empty table is always cheapest to scan, so ask the planner
+        # to avoid scans and sorts: any that remain have no index to use.
+        with transaction.atomic():
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            plan = _postgresql_plan(cursor, sql)
+        return _postgresql_problems(plan, table), json.dumps(plan)
@@ -0,0 +1,35 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ProductJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed. For the
+    strings, ints, lists and dicts of product payloads the bytes are the
+    same as JSONRenderer's; anything orjson would encode differently
+    (datetimes, Decimals, big ints), an indented response, or non-default
+    UNICODE_JSON / COMPACT_JSON settings fall back to JSONRenderer. Floats
+    are left to orjson, whose exponent format can differ; product payloads
+    have none.
+    """
+    OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, option=self.OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # As JSONRenderer does, escape the line separators JavaScript rejects in strings.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
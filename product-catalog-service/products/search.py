@@ -0,0 +1,138 @@
+import logging
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration for the stored vector and for queries on PostgreSQL.
+SEARCH_CONFIG = "english"
+
+# Terms beyond this are ignored, so one request cannot build an unbounded query.
+MAX_TERMS = 16
+
+TERM = re.compile(r"[^\W_]+")
+
+POSTGRESQL_SETUP = [
+    'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "search_vector" tsvector',
+    """
+    CREATE OR REPLACE FUNCTION "{table}_search_vector"() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{config}', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('{config}', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS "{table}_search_vector" ON "{table}"',
+    """
+    CREATE TRIGGER "{table}_search_vector"
+    BEFORE INSERT OR UPDATE OF name, description ON "{table}"
+    FOR EACH ROW EXECUTE FUNCTION "{table}_search_vector"()
+    """,
+    """
+    UPDATE "{table}" SET search_vector =
+        setweight(to_tsvector('{config}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{config}', coalesce(description, '')), 'B')
+    WHERE search_vector IS NULL
+    """,
+    'CREATE INDEX IF NOT EXISTS "{table}_search_idx" ON "{table}" USING gin ("search_vector")',
+]
+
+SQLITE_SETUP = [
+    """
+    CREATE VIRTUAL TABLE "{table}_fts" USING fts5(
+        name, description, content='{table}', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER "{table}_fts_insert" AFTER INSERT ON "{table}" BEGIN
+        INSERT INTO "{table}_fts"(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER "{table}_fts_delete" AFTER DELETE ON "{table}" BEGIN
+        INSERT INTO "{table}_fts"("{table}_fts", rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER "{table}_fts_update" AFTER UPDATE OF name, description ON "{table}" BEGIN
+        INSERT INTO "{table}_fts"("{table}_fts", rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO "{table}_fts"(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """INSERT INTO "{table}_fts"("{table}_fts") VALUES ('rebuild')""",
+]
+
+
+def install_search(sender, using="default", **kwargs):
+    """
+    post_migrate handler that maintains the search index outside the model:
+    a weighted tsvector column kept current by a trigger and a GIN index on
+    PostgreSQL, or an FTS5 table kept current by triggers on SQLite. Safe to
+    run after every migrate.
+    """
+    from .models import Product
+
+    connection = connections[using]
+    table = Product._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            statements = POSTGRESQL_SETUP
+        elif connection.vendor == "sqlite":
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [f"{table}_fts"])
+            if cursor.fetchone():
+                return
+            statements = SQLITE_SETUP
+        else:
+            return
+        for statement in statements:
+            cursor.execute(statement.format(table=table, config=SEARCH_CONFIG))
+    logger.info(f"Installed {connection.vendor} full-text search on {table}")
+
+
+def search_terms(value):
+    return TERM.findall(value.lower())[:MAX_TERMS]
+
+
+def search(queryset, value):
+    """
+    Products matching every term of `value`, the last one as a prefix so
+    partial words match while typing, annotated with search_rank (higher is
+    better) and ordered by it. Databases without a full-text index, and
+    PostgreSQL queries made only of stop words, fall back to substring
+    matching, ordered as before.
+    """
+    terms = search_terms(value)
+    if not terms:
+        return queryset.none()
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+
+    if connection.vendor == "postgresql":
+        query = " & ".join([*terms[:-1], f"{terms[-1]}:*"])
+        with connection.cursor() as cursor:
+            # to_tsquery drops stop words; with nothing left it would match no row.
+            cursor.execute("SELECT numnode(to_tsquery(%s, %s))", [SEARCH_CONFIG, query])
+            if cursor.fetchone()[0]:
+                vector = f'"{table}"."search_vector"'
+                rank = RawSQL(f"ts_rank({vector}, to_tsquery(%s, %s))", [SEARCH_CONFIG, query], FloatField())
+                match = RawSQL(f"{vector} @@ to_tsquery(%s, %s)", [SEARCH_CONFIG, query], BooleanField())
+                return queryset.filter(match).annotate(search_rank=rank).order_by("-search_rank", "-id")
+    elif connection.vendor == "sqlite":
+        query = " ".join([*(f'"{term}"' for term in terms[:-1]), f'"{terms[-1]}"*'])
+        fts = f"{table}_fts"
+        # Join the FTS table in, so one MATCH both selects the rows and scores them.
+        queryset = queryset.extra(
+            tables=[fts], where=[f'"{fts}" MATCH %s', f'"{fts}"."rowid" = "{table}"."id"'], params=[query]
+        )
+        rank = RawSQL(f'-bm25("{fts}", 4.0, 1.0)', [], FloatField())
+        return queryset.annotate(search_rank=rank).order_by("-search_rank", "-id")
+
+    return queryset.filter(name__icontains=value) | queryset.filter(description__icontains=value)
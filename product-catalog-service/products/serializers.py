@@ -22,3 +22,81 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ["name", "description", "price", "inventory"]
+
+
+class ProductPatchSerializer(serializers.ModelSerializer):
+    """
+    One item of a bulk price / inventory patch, addressed by id or slug.
+    inventory sets the stock level; inventory_delta adjusts it.
+    """
+    id = serializers.IntegerField(required=False)
+    # Declared so ModelSerializer does not add the unique validator.
+    slug = serializers.SlugField(required=False, max_length=255)
+    inventory_delta = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = Product
+        fields = ["id", "slug", "price", "inventory", "inventory_delta"]
+        extra_kwargs = {"price": {"required": False}, "inventory": {"required": False}}
+
+    def validate(self, attrs):
+        if ("id" in attrs) == ("slug" in attrs):
+            raise serializers.ValidationError("Give exactly one of id or slug.")
+        if not attrs.keys() & {"price", "inventory", "inventory_delta"}:
+            raise serializers.ValidationError("Give at least one of price, inventory or inventory_delta.")
+        if "inventory" in attrs and "inventory_delta" in attrs:
+            raise serializers.ValidationError("Give inventory or inventory_delta, not both.")
+        return attrs
+
+
+class ProductRowSerializer:
+    """
+    Produces exactly ProductSerializer's representation from
+    values_list(..., named=True) rows, without building model instances or
+    running the serializer field by field. `fields`, a comma-separated
+    sparse fieldset, narrows both the output and the columns selected.
+    """
+    # Serializer fields whose database value is already its representation.
+    PASSTHROUGH = (serializers.CharField, serializers.IntegerField)
+    _declared = None
+
+    @classmethod
+    def declared_fields(cls):
+        # Building a ModelSerializer's fields introspects the model; do it once.
+        if cls._declared is None:
+            cls._declared = ProductSerializer().fields
+        return cls._declared
+
+    def __init__(self, fields=None):
+        declared = self.declared_fields()
+        requested = [name.strip() for name in (fields or "").split(",") if name.strip()]
+        unknown = [name for name in requested if name not in declared]
+        if unknown:
+            raise serializers.ValidationError({"fields": [f"Unknown field: {name}" for name in unknown]})
+        self.fields = [name for name in declared if not requested or name in requested]
+        self._converters = [
+            (name, None if isinstance(declared[name], self.PASSTHROUGH) else declared[name].to_representation)
+            for name in self.fields
+        ]
+
+    def select(self, queryset):
+        """
+        `queryset` narrowed to the fieldset's columns, plus those pagination
+        and validators need, and any annotations such as search_rank.
+        """
+        columns = dict.fromkeys([*self.fields, "id", "created_at", "updated_at", *queryset.query.annotations])
+        return queryset.values_list(*columns, named=True)
+
+    def serialize(self, rows):
+        if not rows:
+            return []
+        positions = {name: index for index, name in enumerate(rows[0]._fields)}
+        converters = [(name, positions[name], convert) for name, convert in self._converters]
+        data = []
+        for row in rows:
+            item = {}
+            for name, index, convert in converters:
+                value = row[index]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
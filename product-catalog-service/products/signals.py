@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import product_detail_cache
+from .models import Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_detail(sender, instance, using, **kwargs):
+    # After commit, so a reader cannot cache the old row under the new generation.
+    transaction.on_commit(lambda: product_detail_cache.invalidate(instance.slug), using=using)
@@ -1,3 +1,447 @@
-from django.test import TestCase
+import io
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from shared.auth.authentication import TokenClaimsUser
+from shared.utils.tracing import RingBufferSink, tracer
+
+from .bulk import ProductBulkUpdater
+from .cache import ProductDetailCache, product_detail_cache
+from .importer import ProductImporter, read_csv, read_jsonl
+from .models import Product
+from .renderers import ProductJSONRenderer, orjson
+from .serializers import ProductRowSerializer, ProductSerializer
+from .query_plans import SUPPORTED_VENDORS, explain, list_queries
+from .search import search
+
+
+def make_products(count, **fields):
+    return Product.objects.bulk_create(
+        Product(name=f"Product {i}", slug=f"product-{i}", price="9.99", **fields) for i in range(count)
+    )
+
+
+def bearer(user_id):
+    token = AccessToken()
+    token[api_settings.USER_ID_CLAIM] = user_id
+    return f"Bearer {token}"
+
+
+class StatelessAuthenticationTests(TestCase):
+    def test_writes_do_not_load_the_user(self):
+        # No auth_user row exists for this id; the token's claims are enough.
+        Product.objects.create(name="Lamp", price="9.99")
+        client = APIClient(HTTP_AUTHORIZATION=bearer(42))
+        writes = [
+            ("POST", "/api/product/", '{"name": "Desk", "price": "120.00"}', "application/json", 201),
+            ("PATCH", "/api/product/", '[{"slug": "desk", "inventory_delta": 1}]', "application/json", 200),
+            ("PUT", "/api/product/lamp", '{"price": "11.00"}', "application/json", 200),
+            ("POST", "/api/product/import", "name,price\nChair,30.00\n", "text/csv", 200),
+            ("DELETE", "/api/product/lamp", "", "", 204),
+        ]
+
+        for method, path, body, content_type, status_code in writes:
+            with self.subTest(method=method, path=path):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.generic(method, path, body, content_type=content_type)
+
+                self.assertEqual(response.status_code, status_code)
+                self.assertFalse([query["sql"] for query in queries if "auth_user" in query["sql"]])
+
+    def test_writes_need_a_valid_token(self):
+        response = APIClient().post("/api/product/", {"name": "Desk", "price": "1.00"}, format="json")
+        self.assertEqual(response.status_code, 401)
+        response = self.client.delete("/api/product/lamp", HTTP_AUTHORIZATION=bearer(42) + "x")
+        self.assertEqual(response.status_code, 401)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        products = make_products(8)
+        # Ties on created_at are broken by id.
+        now = timezone.now()
+        for i, product in enumerate(products):
+            Product.objects.filter(pk=product.pk).update(created_at=now - timedelta(seconds=i // 3))
+        self.ordered = list(Product.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [product["id"] for product in body["results"]], body["next"], body["previous"]
+
+    def test_next_and_previous_links_round_trip(self):
+        pages = []
+        url = "/api/product/?page_size=3"
+        while url:
+            ids, url, previous = self.page(url)
+            pages.append(ids)
+        self.assertEqual(pages, [self.ordered[0:3], self.ordered[3:6], self.ordered[6:8]])
+
+        back = []
+        while previous:
+            ids, _, previous = self.page(previous)
+            back.append(ids)
+        self.assertEqual(back, [self.ordered[3:6], self.ordered[0:3]])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get("/api/product/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.lamp = Product.objects.create(name="Desk lamp", slug="desk-lamp", price="9.99")
+        self.shade = Product.objects.create(
+            name="Shade", slug="shade", price="4.99", description="A linen shade for any lamp"
+        )
+        self.desk = Product.objects.create(name="The desk", slug="desk", price="120.00", description="Oak")
+
+    def search(self, value):
+        return list(search(Product.objects.all(), value).values_list("id", flat=True))
+
+    def test_last_term_matches_as_a_prefix(self):
+        self.assertEqual(self.search("desk la"), [self.lamp.id])
+        self.assertEqual(self.search("la desk"), [])
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("lamp"), [self.lamp.id, self.shade.id])
+        response = self.client.get("/api/product/", {"search": "lamp"})
+        self.assertEqual([product["id"] for product in response.json()["results"]], [self.lamp.id, self.shade.id])
+
+    @skipUnless(connection.vendor == "sqlite", "the FTS5 table is SQLite's")
+    def test_one_match_selects_and_ranks(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.search("lamp")
+        self.assertEqual(captured.captured_queries[-1]["sql"].count("MATCH"), 1)
+
+    def test_query_without_terms_matches_nothing(self):
+        for value in ("", "  ", "!?-"):
+            with self.subTest(value=value):
+                self.assertEqual(self.search(value), [])
+
+    def test_stop_word_only_query_still_matches(self):
+        self.assertEqual(self.search("the"), [self.desk.id])
+
+    def test_install_search_is_idempotent(self):
+        call_command("migrate", verbosity=0)
+        call_command("migrate", verbosity=0)
+
+        chair = Product.objects.create(name="Lamp chair", slug="lamp-chair", price="30.00")
+        self.assertEqual(sorted(self.search("lamp")), sorted([self.lamp.id, self.shade.id, chair.id]))
+        chair.name = "Chair"
+        chair.save()
+        self.assertEqual(self.search("chair"), [chair.id])
+        self.assertEqual(sorted(self.search("lamp")), sorted([self.lamp.id, self.shade.id]))
+
+
+class ProductRowSerializerTests(TestCase):
+    def setUp(self):
+        Product.objects.create(
+            name="Lampe à poser ☃", slug="lampe", price="1234.50", inventory=3,
+            description="Ligne\u2028séparée, \"citée\" et <b>grasse</b>",
+        )
+        Product.objects.create(name="Desk", slug="desk", price="0.10")
+        Product.objects.update(created_at=timezone.now() - timedelta(days=3, microseconds=123457))
+
+    def expected(self, fields=None):
+        data = ProductSerializer(Product.objects.order_by("-created_at", "-id"), many=True).data
+        if fields:
+            data = [{name: item[name] for name in item if name in fields.split(",")} for item in data]
+        return JSONRenderer().render(data)
+
+    def rendered(self, fields=None):
+        serializer = ProductRowSerializer(fields=fields)
+        rows = list(serializer.select(Product.objects.order_by("-created_at", "-id")))
+        return ProductJSONRenderer().render(serializer.serialize(rows))
+
+    def assertSameBytes(self):
+        for fields in (None, "price,name", "created_at,id,description"):
+            with self.subTest(fields=fields):
+                self.assertEqual(self.rendered(fields), self.expected(fields))
+
+    def test_matches_product_serializer_and_json_renderer(self):
+        with mock.patch("products.renderers.orjson", None):
+            self.assertSameBytes()
+
+    @skipUnless(orjson, "orjson is not installed")
+    def test_matches_product_serializer_and_json_renderer_with_orjson(self):
+        with mock.patch.object(orjson, "dumps", wraps=orjson.dumps) as dumps:
+            self.assertSameBytes()
+        self.assertEqual(dumps.call_count, 3)
+
+    def test_null_values_match_product_serializer(self):
+        product = Product(id=7, name="Draft", slug="draft", price=None, inventory=None)
+        serializer = ProductRowSerializer()
+        Row = namedtuple("Row", serializer.fields)
+        row = Row(*(getattr(product, name) for name in serializer.fields))
+
+        self.assertEqual(serializer.serialize([row]), [ProductSerializer(product).data])
+
+    def test_unknown_field_is_400(self):
+        response = self.client.get("/api/product/", {"fields": "name,secret"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"fields": ["Unknown field: secret"]})
+
+    def test_only_the_requested_columns_are_selected(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/product/", {"fields": "name,price"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()["results"][0]), {"name", "price"})
+        table = Product._meta.db_table
+        sql = next(query["sql"] for query in captured.captured_queries if f'FROM "{table}"' in query["sql"])
+        selected = sql.split(" FROM ")[0]
+        self.assertIn(f'"{table}"."name"', selected)
+        self.assertIn(f'"{table}"."price"', selected)
+        self.assertNotIn(f'"{table}"."description"', selected)
+        self.assertNotIn(f'"{table}"."inventory"', selected)
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        product_detail_cache.cache.clear()
+        self.lamp = Product.objects.create(name="Lamp", price="9.99")
+        Product.objects.create(name="Desk", price="120.00")
+
+    def assertRevalidates(self, url, queries):
+        etag = self.client.get(url)["ETag"]
+
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lamp.price = "11.00"
+            self.lamp.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_product_list(self):
+        # The page query is the only one; no serialization follows it.
+        self.assertRevalidates("/api/product/", queries=1)
+
+    @override_settings(PRODUCT_DETAIL_CACHE={**settings.PRODUCT_DETAIL_CACHE, "ENABLED": False})
+    def test_product_detail(self):
+        self.assertRevalidates("/api/product/lamp", queries=1)
+
+    @override_settings(PRODUCT_DETAIL_CACHE={**settings.PRODUCT_DETAIL_CACHE, "ENABLED": True})
+    def test_cached_product_detail(self):
+        self.assertRevalidates("/api/product/lamp", queries=0)
+
+
+@override_settings(
+    TRACING={**settings.TRACING, "SAMPLE_RATE": 1.0},
+    PRODUCT_DETAIL_CACHE={**settings.PRODUCT_DETAIL_CACHE, "ENABLED": False},
+)
+class TracingTests(TestCase):
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+    def setUp(self):
+        self.sink = RingBufferSink()
+        self.enterContext(mock.patch.object(tracer, "_sink", self.sink))
+        self.lamp = Product.objects.create(name="Lamp", price="9.99")
+
+    def test_sampled_request_records_view_sql_serializer_and_render_spans(self):
+        response = self.client.get(
+            f"/api/product/id/{self.lamp.pk}", HTTP_TRACEPARENT=f"00-{self.trace_id}-00f067aa0ba902b7-01"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        spans = self.sink.query()
+        self.assertEqual({span["trace_id"] for span in spans}, {self.trace_id})
+        by_name = {span["name"]: span for span in spans}
+        server = by_name[f"GET /api/product/id/{self.lamp.pk}"]
+        view = by_name["view ProductByIdView"]
+        self.assertEqual(server["parent_id"], "00f067aa0ba902b7")
+        self.assertEqual(view["parent_id"], server["span_id"])
+        self.assertEqual(by_name["sql"]["parent_id"], view["span_id"])
+        self.assertEqual(by_name["serialize ProductSerializer"]["parent_id"], view["span_id"])
+        self.assertEqual(by_name["render Response"]["parent_id"], server["span_id"])
+
+    def test_unsampled_request_records_nothing(self):
+        self.client.get(f"/api/product/id/{self.lamp.pk}", HTTP_TRACEPARENT=f"00-{self.trace_id}-00f067aa0ba902b7-00")
+
+        self.assertEqual(self.sink.query(), [])
+
+    def test_serializers_are_not_patched(self):
+        self.assertEqual(serializers.Serializer.data.fget.__module__, "rest_framework.serializers")
+
+
+@skipUnless(connection.vendor in SUPPORTED_VENDORS, "query plans are checked on PostgreSQL and SQLite")
+class QueryPlanTests(TestCase):
+    def test_product_list_queries_are_index_backed(self):
+        make_products(20, inventory=5)
+        for label, status_code, queries in list_queries():
+            with self.subTest(label):
+                self.assertEqual(status_code, 200)
+                self.assertTrue(queries)
+                for sql in queries:
+                    problems, plan = explain(sql)
+                    self.assertEqual(problems, [], f"{sql}\n{plan}")
+
+
+@override_settings(PRODUCT_DETAIL_CACHE={**settings.PRODUCT_DETAIL_CACHE, "ENABLED": True})
+class ProductDetailCacheTests(TestCase):
+    def setUp(self):
+        product_detail_cache.cache.clear()
+        self.cache = ProductDetailCache()
+
+    def test_concurrent_misses_load_once(self):
+        loads = []
+
+        def load():
+            loads.append(1)
+            time.sleep(0.2)
+            return {"name": "Lamp"}
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            entries = list(executor.map(lambda _: self.cache.get("lamp", load), range(5)))
+
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(entries, [{"name": "Lamp"}] * 5)
+        self.assertEqual(self.cache.stats()["shared_loads"], 4)
+
+    def test_invalidate_starts_a_new_generation(self):
+        self.cache.get("lamp", lambda: {"name": "Lamp"})
+        self.assertEqual(self.cache.get("lamp", lambda: {"name": "Stale"}), {"name": "Lamp"})
+
+        self.cache.invalidate("lamp")
+
+        self.assertEqual(self.cache.get("lamp", lambda: {"name": "Desk lamp"}), {"name": "Desk lamp"})
+
+    def test_saving_a_product_invalidates_its_detail(self):
+        product = Product.objects.create(name="Lamp", price="9.99")
+        self.assertEqual(self.client.get("/api/product/lamp").json()["name"], "Lamp")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Desk lamp"
+            product.save()
+
+        self.assertEqual(self.client.get("/api/product/lamp").json()["name"], "Desk lamp")
+
+
+class ProductImporterTests(TestCase):
+    def test_csv_rows_are_deduplicated_and_errors_carry_line_numbers(self):
+        feed = io.BytesIO(
+            b"name,slug,price,inventory\n"
+            b"Lamp,lamp,9.99,3\n"
+            b"Chair,chair,not-a-price,1\n"
+            b"Lamp,lamp,12.50,4\n"
+            b"Desk,,120.00,\n"
+        )
+
+        summary = ProductImporter().run(read_csv(feed))
+
+        self.assertEqual(summary["imported"], 2)
+        self.assertEqual(summary["duplicates"], 1)
+        self.assertEqual(summary["error_count"], 1)
+        self.assertEqual([error["line"] for error in summary["errors"]], [3])
+        self.assertIn("price", summary["errors"][0]["errors"])
+        self.assertEqual(
+            set(Product.objects.values_list("slug", "price", "inventory")),
+            {("lamp", Decimal("12.50"), 4), ("desk", Decimal("120.00"), 0)},
+        )
+
+    def test_jsonl_reports_the_line_of_each_bad_row(self):
+        feed = io.BytesIO(
+            b'{"name": "Lamp", "price": "9.99"}\n'
+            b"\n"
+            b"not json\n"
+            b'["a list"]\n'
+            b'{"name": "Desk"}\n'
+        )
+
+        summary = ProductImporter().run(read_jsonl(feed))
+
+        self.assertEqual(summary["imported"], 1)
+        self.assertEqual([error["line"] for error in summary["errors"]], [3, 4, 5])
+        self.assertIn("price", summary["errors"][2]["errors"])
+
+    def test_existing_products_are_updated_and_their_details_invalidated(self):
+        Product.objects.create(name="Lamp", price="9.99")
+        product_detail_cache.get("lamp", lambda: {"price": "9.99"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = ProductImporter(batch_size=1).run(read_csv(io.BytesIO(b"name,price\nLamp,11.00\n")))
+
+        self.assertEqual(summary["imported"], 1)
+        self.assertEqual(Product.objects.get(slug="lamp").price, Decimal("11.00"))
+        self.assertEqual(product_detail_cache.get("lamp", lambda: {"price": "11.00"}), {"price": "11.00"})
+
+
+class ProductBulkUpdateTests(TestCase):
+    def setUp(self):
+        self.lamp = Product.objects.create(name="Lamp", price="9.99", inventory=10)
+        self.desk = Product.objects.create(name="Desk", price="120.00", inventory=2)
+
+    def test_items_for_one_product_apply_in_order(self):
+        result = ProductBulkUpdater().run([
+            {"slug": "lamp", "inventory_delta": 5},
+            {"slug": "lamp", "inventory": 3},
+            {"id": self.lamp.id, "inventory_delta": -1, "price": "8.50"},
+            {"slug": "desk", "inventory_delta": -2},
+        ])
+
+        self.assertEqual(result["updated"], 2)
+        self.assertEqual([item["index"] for item in result["results"]], [0, 1, 2, 3])
+        self.assertEqual(
+            [(item["slug"], item["price"], item["inventory"]) for item in result["results"]],
+            [("lamp", "8.50", 2)] * 3 + [("desk", "120.00", 0)],
+        )
+        self.lamp.refresh_from_db()
+        self.assertEqual((self.lamp.price, self.lamp.inventory), (Decimal("8.50"), 2))
+
+    def test_delta_is_added_in_the_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            ProductBulkUpdater().run([{"slug": "lamp", "inventory_delta": -4}])
+
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertRegex(updates[0], r'"inventory" [+-] ')
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.inventory, 6)
+
+    def test_unknown_and_invalid_items_get_their_own_results(self):
+        result = ProductBulkUpdater().run([
+            {"slug": "missing", "price": "1.00"},
+            {"slug": "lamp"},
+            {"id": self.lamp.id, "slug": "lamp", "price": "1.00"},
+            {"slug": "lamp", "inventory": 1, "inventory_delta": 1},
+            {"slug": "desk", "price": "99.00"},
+        ])
+
+        self.assertEqual([item["status"] for item in result["results"]], [404, 400, 400, 400, 200])
+        self.assertEqual(result["updated"], 1)
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.price, Decimal("9.99"))
+
+    @override_settings(PRODUCT_BULK_UPDATE={**settings.PRODUCT_BULK_UPDATE, "MAX_ITEMS": 2})
+    def test_patch_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(TokenClaimsUser(1))
+
+        self.assertEqual(client.patch("/api/product/", {"slug": "lamp"}, format="json").status_code, 400)
+        too_many = [{"slug": "lamp", "inventory_delta": 1}] * 3
+        self.assertEqual(client.patch("/api/product/", too_many, format="json").status_code, 400)
+        response = client.patch("/api/product/", [{"slug": "lamp", "inventory_delta": 1}], format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["inventory"], 11)
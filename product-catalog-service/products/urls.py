@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import ProductListCreateView, ProductDetailUpdateDeleteView
+from .views import ProductListCreateView, ProductDetailUpdateDeleteView, ProductByIdView, ProductImportView
 
 urlpatterns = [
     path("", ProductListCreateView.as_view(), name="product-list-create"),
+    path("import", ProductImportView.as_view(), name="product-import"),
+    path("id/<int:pk>", ProductByIdView.as_view(), name="product-detail-by-id"),
     path("<slug:slug>", ProductDetailUpdateDeleteView.as_view(), name="product-detail-update-delete"),
 ]
@@ -2,36 +2,89 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.renderers import BrowsableAPIRenderer
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from shared.utils.conditional import make_etag, not_modified, set_validators
+from shared.utils.tracing import serialized, span
+from .bulk import ProductBulkUpdater
+from .cache import product_detail_cache
 from .models import Product
-from .serializers import ProductSerializer, ProductCreateUpdateSerializer
+from .pagination import KeysetPagination
+from .renderers import ProductJSONRenderer
+from .serializers import ProductSerializer, ProductCreateUpdateSerializer, ProductRowSerializer
 from .filters import ProductFilter
+from .importer import CONTENT_TYPES, READERS, ProductImporter
 
 
 class ProductListCreateView(APIView):
+    renderer_classes = [ProductJSONRenderer, BrowsableAPIRenderer]
+
     def get_permissions(self):
-        if self.request.method == "POST":
+        if self.request.method in ["POST", "PATCH"]:
             return [IsAuthenticated()]
         return [AllowAny()]
 
     def get(self, request):
+        # Listings are read as tuples of only the requested ?fields= columns
+        # and serialized without model instances.
+        serializer = ProductRowSerializer(fields=request.query_params.get("fields"))
         products = Product.objects.all()
         filterset = ProductFilter(request.GET, queryset=products)
         if filterset.is_valid():
             products = filterset.qs
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(serializer.select(products), request, view=self)
+
+        # A page changes when one of its rows is updated or replaced, or when
+        # a neighbouring page appears or disappears; its rows' ids and
+        # updated_at plus the two links capture that without counting the
+        # whole listing.
+        last_modified = max((product.updated_at for product in page), default=None)
+        etag = make_etag(
+            "list",
+            paginator.has_previous,
+            paginator.has_next,
+            *serializer.fields,
+            *(f"{product.id}@{product.updated_at}" for product in page),
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        with span(f"serialize {type(serializer).__name__}"):
+            data = serializer.serialize(page)
+        return set_validators(paginator.get_paginated_response(data), etag, last_modified)
 
     def post(self, request):
         serializer = ProductCreateUpdateSerializer(data=request.data)
         if serializer.is_valid():
             product = serializer.save()
             return Response(
-                ProductSerializer(product).data,
+                serialized(ProductSerializer(product)),
                 status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def patch(self, request):
+        # Bulk price / inventory update: a list of {id or slug, price?,
+        # inventory?, inventory_delta?}, applied together, with a result per item.
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"non_field_errors": ["Expected a list of product patches"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_items = settings.PRODUCT_BULK_UPDATE["MAX_ITEMS"]
+        if len(items) > max_items:
+            return Response(
+                {"non_field_errors": [f"At most {max_items} patches per request"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(ProductBulkUpdater().run(items))
+
 
 class ProductDetailUpdateDeleteView(APIView):
     def get_permissions(self):
@@ -40,19 +93,57 @@ class ProductDetailUpdateDeleteView(APIView):
         return [AllowAny()]
 
     def get(self, request, slug):
+        entry = product_detail_cache.get(slug, lambda: self.load(slug))
+        response = not_modified(request, entry["etag"], entry["last_modified"])
+        if response is not None:
+            return response
+        return set_validators(Response(entry["data"]), entry["etag"], entry["last_modified"])
+
+    @staticmethod
+    def load(slug):
         product = get_object_or_404(Product, slug=slug)
-        serializer = ProductSerializer(product)
-        return Response(serializer.data)
+        return {
+            "etag": make_etag(product.pk, product.updated_at),
+            "last_modified": product.updated_at,
+            "data": dict(serialized(ProductSerializer(product))),
+        }
 
     def put(self, request, slug):
         product = get_object_or_404(Product, slug=slug)
         serializer = ProductCreateUpdateSerializer(product, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            return Response(ProductSerializer(product).data)
+            return Response(serialized(ProductSerializer(product)))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, slug):
         product = get_object_or_404(Product, slug=slug)
         product.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProductByIdView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        product = get_object_or_404(Product, pk=pk)
+        return Response(serialized(ProductSerializer(product)))
+
+
+class ProductImportView(APIView):
+    """
+    Bulk upsert of products from a CSV (text/csv) or JSON lines
+    (application/x-ndjson) request body. The body is streamed through the
+    importer rather than parsed up front, so feeds of any size are read in
+    bounded memory. Rows that fail validation are reported by line number.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        media_type = request.content_type.split(";")[0].strip().lower()
+        if media_type not in CONTENT_TYPES:
+            raise UnsupportedMediaType(media_type)
+        if request.stream is None:
+            raise ParseError("Request body is empty")
+        rows = READERS[CONTENT_TYPES[media_type]](request.stream)
+        return Response(ProductImporter().run(rows))
@@ -0,0 +1,30 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Strong ETag from the values that identify one version of a representation."""
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode(), usedforsecurity=False)
+    return quote_etag(digest.hexdigest())
+
+
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Evaluate If-None-Match / If-Modified-Since against the given validators.
+    Returns a 304 (or 412 for a failed If-Match) carrying the validators, or
+    None when the full response should be sent.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        return None
+    return set_validators(response, etag, last_modified)
@@ -0,0 +1,246 @@
+"""
+W3C trace context, sampling, spans and span sinks shared by the services.
+Each service wires them into requests with its own TracingMiddleware.
+"""
+
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value):
+    """(trace_id, parent_id, sampled) from a W3C traceparent header, or None if it is malformed."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    if len(trace_id) != 32 or len(parent_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        if not int(trace_id, 16) or not int(parent_id, 16):
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id.lower(), parent_id.lower(), sampled
+
+
+def _new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """A timed operation in a sampled trace. Entering it makes it the parent of new spans."""
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start", "_started", "_token")
+    recording = True
+
+    def __init__(self, trace_id, parent_id, name, kind="internal", attributes=None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        tracer.sink.record({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": settings.TRACING["SERVICE_NAME"],
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": round(duration * 1000, 3),
+            "attributes": self.attributes,
+        })
+        return False
+
+
+class NonRecordingSpan:
+    """Root of an unsampled request: carries the trace id downstream and records nothing."""
+    __slots__ = ("trace_id", "span_id", "_token")
+    recording = False
+
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-00"
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+    recording = False
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    return _current.get()
+
+
+def span(name, kind="internal", attributes=None):
+    """Child span of the current one; a shared no-op when the request is not sampled."""
+    parent = _current.get()
+    if parent is None or not parent.recording:
+        return NOOP_SPAN
+    return Span(parent.trace_id, parent.span_id, name, kind, attributes)
+
+
+class RingBufferSink:
+    """Keeps the most recent spans in memory, queryable through TraceView."""
+
+    def __init__(self, size=10000):
+        self._spans = deque(maxlen=size)
+
+    def record(self, span):
+        self._spans.append(span)
+
+    def query(self, trace_id=None, limit=100):
+        spans = list(self._spans)
+        if trace_id:
+            spans = [span for span in spans if span["trace_id"] == trace_id]
+        return spans[-limit:]
+
+
+class JsonlSink:
+    """Appends spans as JSON lines to a file that rotates at max_bytes."""
+
+    def __init__(self, path="traces.jsonl", max_bytes=50 * 1024 * 1024, backups=3):
+        self.path = Path(path)
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, delay=True)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def record(self, span):
+        self._handler.handle(logging.makeLogRecord({"msg": json.dumps(span, default=str)}))
+
+    def query(self, trace_id=None, limit=100):
+        if not self.path.exists():
+            return []
+        spans = deque(maxlen=limit)
+        with self.path.open() as lines:
+            for line in lines:
+                if trace_id and trace_id not in line:
+                    continue
+                spans.append(json.loads(line))
+        return list(spans)
+
+
+class Tracer:
+    """Sampling decisions and the span sink configured in settings.TRACING."""
+
+    def __init__(self):
+        self._sink = None
+        self._lock = threading.Lock()
+
+    @property
+    def sink(self):
+        if self._sink is None:
+            with self._lock:
+                if self._sink is None:
+                    config = settings.TRACING
+                    self._sink = import_string(config["SINK"])(**config.get("OPTIONS", {}))
+        return self._sink
+
+    def start(self, traceparent, name, kind="server", attributes=None):
+        """
+        Root span for an incoming request. An incoming traceparent is continued
+        with its sampling decision; otherwise a new trace is sampled at SAMPLE_RATE.
+        """
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = _new_id(128), None
+            sampled = random.random() < settings.TRACING["SAMPLE_RATE"]
+        if not sampled:
+            return NonRecordingSpan(trace_id, parent_id or _new_id(64))
+        return Span(trace_id, parent_id, name, kind, attributes)
+
+
+tracer = Tracer()
+
+
+def inject(headers, client_span):
+    """Add the traceparent for an outgoing call made under `client_span` to `headers`."""
+    carrier = client_span if client_span.recording else _current.get()
+    if carrier is not None:
+        headers["traceparent"] = carrier.traceparent
+    return headers
+
+
+def serialized(serializer):
+    """A serializer's .data, in a span named after it."""
+    name = type(getattr(serializer, "child", serializer)).__name__
+    with span(f"serialize {name}"):
+        return serializer.data
+
+
+class TraceView(APIView):
+    """Recent spans from this service's sink, optionally for one trace_id. Staff only."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", 100)), 1000)
+        except ValueError:
+            limit = 100
+        spans = tracer.sink.query(trace_id=request.query_params.get("trace_id"), limit=limit)
+        return Response({"spans": spans})
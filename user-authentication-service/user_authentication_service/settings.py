@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -19,6 +20,10 @@ load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Code shared by the services (the "shared" package) lives next to them.
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.append(str(BASE_DIR.parent))
+
 SECRET_KEY = os.getenv(
     "SECRET_KEY", "django-insecure-bpy#t(3=g7ph-ld5g!so=4a+jg1zit74#we#5_)tg39trt6u+g"
 )
@@ -52,6 +57,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "users.tracing.TracingMiddleware",
 ]
 
 ROOT_URLCONF = "user_authentication_service.urls"
@@ -155,3 +161,19 @@ SPECTACULAR_SETTINGS = {
 }
 
 AUTH_USER_MODEL = "users.User"
+
+# Request tracing. Requests arriving with a W3C traceparent keep its sampling
+# decision; others are sampled at SAMPLE_RATE. Spans go to an in-memory ring
+# buffer (read it at /api/traces/) or, with
+# "shared.utils.tracing.JsonlSink", to a rotating JSON lines file.
+TRACING = {
+    "SERVICE_NAME": "user-authentication",
+    "SAMPLE_RATE": float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+    "SINK": os.getenv("TRACE_SINK", "shared.utils.tracing.RingBufferSink"),
+    "OPTIONS": {"size": int(os.getenv("TRACE_RING_SIZE", "10000"))},
+}
+if TRACING["SINK"] == "shared.utils.tracing.JsonlSink":
+    TRACING["OPTIONS"] = {
+        "path": os.getenv("TRACE_JSONL_PATH", str(BASE_DIR / "traces.jsonl")),
+        "max_bytes": int(os.getenv("TRACE_JSONL_MAX_BYTES", str(50 * 1024 * 1024))),
+    }
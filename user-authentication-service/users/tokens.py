@@ -0,0 +1,16 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token that also carries the username and staff flag, so services
+    can authenticate the user from the token alone. Access tokens derived from
+    it inherit both claims.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["username"] = user.username
+        token["is_staff"] = user.is_staff
+        return token
@@ -0,0 +1,63 @@
+from django.db import connection
+
+from shared.utils.tracing import span, tracer
+
+
+def _sql_span(execute, sql, params, many, context):
+    with span("sql", kind="client", attributes={"db.statement": sql[:1000], "db.many": many}):
+        return execute(sql, params, many, context)
+
+
+class TracingMiddleware:
+    """
+    Opens a server span for each request and a view span around the view,
+    with child spans for SQL queries and for rendering the response. Views
+    time their serializers with shared.utils.tracing.serialized. Unsampled
+    requests only parse the traceparent header. Put it last in MIDDLEWARE so
+    the view span covers the view alone.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        root = tracer.start(
+            request.META.get("HTTP_TRACEPARENT"),
+            f"{request.method} {request.path}",
+            attributes={"http.method": request.method, "http.target": request.get_full_path()},
+        )
+        with root:
+            if not root.recording:
+                return self.get_response(request)
+            with connection.execute_wrapper(_sql_span):
+                response = self.get_response(request)
+            self._end_view(request)
+            root.set("http.status_code", response.status_code)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, "view_class", view_func)
+        view_span = span(f"view {view.__name__}")
+        if view_span.recording:
+            request._view_span = view_span.__enter__()
+        return None
+
+    @staticmethod
+    def _end_view(request):
+        view_span = request.__dict__.pop("_view_span", None)
+        if view_span is not None:
+            view_span.__exit__(None, None, None)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that too.
+        self._end_view(request)
+        render_span = span(f"render {type(response).__name__}")
+        if render_span.recording:
+            render_span.__enter__()
+            response.add_post_render_callback(lambda rendered: self._end_render(render_span))
+        return response
+
+    @staticmethod
+    def _end_render(render_span):
+        # A post-render callback's return value replaces the response, so return None.
+        render_span.__exit__(None, None, None)
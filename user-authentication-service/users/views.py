@@ -2,10 +2,11 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from shared.utils.tracing import serialized
 from .models import User
 from .serializers import UserSerializer, UserRegistrationSerializer, UserLoginSerializer
+from .tokens import ClaimsRefreshToken
 
 
 class RegisterView(APIView):
@@ -16,7 +17,7 @@ class RegisterView(APIView):
         if serializer.is_valid():
             user = serializer.save()
             return Response({
-                "result": UserSerializer(user).data,
+                "result": serialized(UserSerializer(user)),
                 "message": "User created successfully"
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -33,11 +34,11 @@ class LoginView(APIView):
                 password=serializer.validated_data['password']
             )
             if user:
-                refresh = RefreshToken.for_user(user)
+                refresh = ClaimsRefreshToken.for_user(user)
                 return Response({
                     "access": str(refresh.access_token),
                     "refresh": str(refresh),
-                    "user": UserSerializer(user).data
+                    "user": serialized(UserSerializer(user))
                 })
             return Response(
                 {"error": "Invalid credentials"},
@@ -50,8 +51,7 @@ class UserDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response({"result": serializer.data})
+        return Response({"result": serialized(UserSerializer(request.user))})
 
 
 class CheckUsernameView(APIView):